@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Add summary_through_sequence column to conversations table.
+"""
+import asyncio
+from sqlalchemy import text
+from backend.app.core.database import engine
+
+
+async def main():
+    print("Adding summary_through_sequence column to conversations table...")
+
+    async with engine.begin() as conn:
+        # Check if column exists
+        result = await conn.execute(
+            text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name='conversations'
+            AND column_name='summary_through_sequence';
+            """)
+        )
+        rows = result.fetchall()
+        if len(rows) > 0:
+            print("Column already exists!")
+            return
+
+        # Add column; existing conversations start with nothing summarized
+        await conn.execute(
+            text("""
+            ALTER TABLE conversations
+            ADD COLUMN summary_through_sequence INTEGER NOT NULL DEFAULT 0;
+            """)
+        )
+        print("✅ Added summary_through_sequence column successfully!")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Enable pgvector and add vector columns + HNSW index to document_embeddings.
+
+pgvector is only needed when semantic indexing is on with
+VECTOR_INDEX=pgvector (settings.use_pgvector); otherwise the vectors are
+stored as float arrays and searched by the in-process index. The HNSW index
+also needs pgvector >= 0.5.
+"""
+import asyncio
+from sqlalchemy import text
+from backend.app.core.config import settings
+from backend.app.core.database import engine, Base
+from backend.app.models.knowledge_base import DocumentEmbedding, EMBEDDING_DIMENSION
+
+# First pgvector release with HNSW indexes
+HNSW_MIN_VERSION = (0, 5)
+
+
+def parse_version(version: str) -> tuple:
+    """'0.5.1' -> (0, 5, 1)"""
+    return tuple(int(part) for part in version.split(".") if part.isdigit())
+
+
+async def create_hnsw_index(conn) -> None:
+    """Create the HNSW index if it is wanted and pgvector supports it."""
+    if not settings.use_pgvector:
+        print("pgvector not in use (VECTOR_INDEX=memory or semantic indexing disabled), skipping the HNSW index.")
+        return
+
+    result = await conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector';"))
+    version = result.scalar()
+    if parse_version(version) < HNSW_MIN_VERSION:
+        print(f"⚠️  pgvector {version} has no HNSW indexes (needs >= 0.5); upgrade it or set VECTOR_INDEX=memory.")
+        return
+
+    await conn.execute(
+        text("""
+        CREATE INDEX IF NOT EXISTS ix_document_embeddings_embedding_hnsw
+        ON document_embeddings USING hnsw (embedding vector_cosine_ops)
+        WITH (m = 16, ef_construction = 64);
+        """)
+    )
+    print("✅ HNSW index ready!")
+
+
+async def main():
+    if settings.use_pgvector:
+        embedding_type = f"vector({EMBEDDING_DIMENSION})"
+    else:
+        embedding_type = "double precision[]"
+
+    async with engine.begin() as conn:
+        if settings.use_pgvector:
+            print("Enabling pgvector extension...")
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector;"))
+
+        # Check if table exists
+        result = await conn.execute(
+            text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name='document_embeddings';
+            """)
+        )
+        columns = {row[0] for row in result.fetchall()}
+
+        if not columns:
+            await conn.run_sync(Base.metadata.create_all, tables=[DocumentEmbedding.__table__])
+            print("✅ Created document_embeddings table!")
+        elif "embedding" in columns:
+            print("Column already exists!")
+        else:
+            # Nothing wrote to the old table (it had no vector column), so start clean
+            await conn.execute(text("DELETE FROM document_embeddings;"))
+            await conn.execute(
+                text(f"""
+                ALTER TABLE document_embeddings
+                ALTER COLUMN knowledge_base_id DROP NOT NULL,
+                ADD COLUMN project_id UUID NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+                ADD COLUMN file_id UUID NULL REFERENCES uploaded_files(id) ON DELETE CASCADE,
+                ADD COLUMN content_hash VARCHAR(64) NULL,
+                ADD COLUMN embedding {embedding_type} NOT NULL,
+                ADD COLUMN embedding_model VARCHAR(100) NOT NULL;
+                """)
+            )
+            for column in ("project_id", "file_id", "content_hash"):
+                await conn.execute(
+                    text(f"""
+                    CREATE INDEX IF NOT EXISTS ix_document_embeddings_{column}
+                    ON document_embeddings ({column});
+                    """)
+                )
+            print("✅ Added vector columns successfully!")
+
+        await create_hnsw_index(conn)
+
+    await engine.dispose()
+    print("Run POST /api/search/semantic/{project_id}/reindex to embed already analyzed files.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
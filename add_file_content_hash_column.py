@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Add content_hash column to uploaded_files table and create file_analyses table.
+"""
+import asyncio
+from sqlalchemy import text
+from backend.app.core.database import engine, Base
+from backend.app.models.file import FileAnalysis
+
+
+async def main():
+    print("Adding content_hash column to uploaded_files table...")
+
+    async with engine.begin() as conn:
+        # Check if column exists
+        result = await conn.execute(
+            text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name='uploaded_files'
+            AND column_name='content_hash';
+            """)
+        )
+        rows = result.fetchall()
+        if len(rows) > 0:
+            print("Column already exists!")
+        else:
+            # Add column
+            await conn.execute(
+                text("""
+                ALTER TABLE uploaded_files
+                ADD COLUMN content_hash VARCHAR(64) NULL;
+                """)
+            )
+            await conn.execute(
+                text("""
+                CREATE INDEX IF NOT EXISTS ix_uploaded_files_content_hash
+                ON uploaded_files (content_hash);
+                """)
+            )
+            print("✅ Added content_hash column successfully!")
+
+        # Create file_analyses table if missing
+        await conn.run_sync(Base.metadata.create_all, tables=[FileAnalysis.__table__])
+        print("✅ file_analyses table is ready!")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,6 +5,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Dict, Any, List, Literal
 from backend.app.services.ai_service_factory import ai_factory
+from backend.app.core.metrics import metrics
+from backend.app.services.llm_cache import llm_cache
 
 router = APIRouter()
 
@@ -184,6 +186,19 @@ async def clear_usage_stats():
         raise HTTPException(status_code=500, detail=f"Failed to clear stats: {str(e)}")
 
 
+@router.get("/metrics")
+async def get_ai_metrics():
+    """
+    Get rolling latency and throughput metrics for AI calls.
+
+    Includes streaming chat TTFT, tokens/sec and stall counts, chat latency
+    and estimated prompt tokens per turn (p50/p95/max over the most recent
+    responses of this worker process), and the LLM response cache's size
+    and hit rate.
+    """
+    return {**metrics.snapshot(), "llm_cache": llm_cache.stats()}
+
+
 @router.get("/models/compare")
 async def compare_models():
     """
@@ -1,14 +1,18 @@
 """
 API endpoints for conversation management.
 """
+import asyncio
 import logging
 import json
+import time
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc
+from backend.app.core.config import settings
 from backend.app.core.database import get_db
+from backend.app.core.metrics import metrics, StreamMetrics
 from backend.app.models.conversation import Conversation, Message
 from backend.app.models.project import Project
 from backend.app.schemas.conversation import (
@@ -22,8 +26,10 @@ from backend.app.schemas.conversation import (
     ConversationStatusUpdate,
     ConversationTitleUpdate,
 )
+from backend.app.services.conversation_memory import conversation_summarizer
 from backend.app.services.conversation_service import ConversationService
-from backend.app.services.gemini_service import GeminiService
+from backend.app.services.prd_render_store import prd_render_store
+from backend.app.services.ai_service_factory import get_gemini_service
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +38,7 @@ router = APIRouter()
 
 def get_conversation_service() -> ConversationService:
     """Dependency to get conversation service."""
-    gemini_service = GeminiService()
+    gemini_service = get_gemini_service()
     return ConversationService(gemini_service)
 
 
@@ -212,6 +218,8 @@ async def chat(
     Returns:
         User message and AI response
     """
+    started = time.perf_counter()
+
     # Get conversation
     result = await db.execute(
         select(Conversation).where(Conversation.id == conversation_id)
@@ -286,6 +294,10 @@ async def chat(
     await db.commit()
     await db.refresh(user_message)
     await db.refresh(ai_message)
+
+    # Fold older turns into the running summary once the history outgrows its budget
+    conversation_summarizer.schedule(conversation_id)
+    metrics.observe("chat.duration_ms", (time.perf_counter() - started) * 1000)
     
     logger.info(f"Chat exchange completed for conversation {conversation_id}")
     
@@ -316,6 +328,9 @@ async def chat_stream(
     Returns:
         StreamingResponse with SSE events
     """
+    # Measure TTFT from the moment the request reaches us
+    stream_metrics = StreamMetrics(stall_threshold_ms=settings.STREAM_STALL_THRESHOLD_MS)
+
     # Get conversation
     result = await db.execute(
         select(Conversation).where(Conversation.id == conversation_id)
@@ -346,11 +361,6 @@ async def chat_stream(
     await db.flush()
     await db.refresh(user_message)
 
-    # Generate title if this is the first message
-    if not conversation.title:
-        title = await conv_service.generate_conversation_title(chat_request.message)
-        conversation.title = title
-
     # Get image file paths if provided
     image_paths = None
     if chat_request.image_file_ids:
@@ -371,6 +381,14 @@ async def chat_stream(
     # Stream AI response
     async def generate_stream():
         """Generate SSE stream."""
+        # Generate title if this is the first message. It runs alongside the
+        # answer so it never delays the first streamed chunk.
+        title_task = None
+        if not conversation.title:
+            title_task = asyncio.create_task(
+                conv_service.generate_conversation_title(chat_request.message)
+            )
+
         try:
             # Send user message event
             user_msg_data = {
@@ -384,7 +402,7 @@ async def chat_stream(
             yield f"event: user_message\ndata: {json.dumps(user_msg_data)}\n\n"
 
             # Accumulate AI response
-            ai_response_text = ""
+            ai_response_parts = []
 
             # Stream AI response chunks
             async for chunk in conv_service.generate_ai_response_stream(
@@ -394,21 +412,32 @@ async def chat_stream(
                 user_message=chat_request.message,
                 image_paths=image_paths
             ):
-                ai_response_text += chunk
+                ai_response_parts.append(chunk)
+                stream_metrics.record_chunk(chunk)
                 # Send chunk event
                 yield f"event: chunk\ndata: {json.dumps({'text': chunk})}\n\n"
 
+            stream_metrics.finish()
+            stream_metrics.record_to(metrics, "chat_stream")
+
+            if title_task:
+                conversation.title = await title_task
+
             # Save complete AI message to database
             ai_message = Message(
                 conversation_id=conversation_id,
                 role="assistant",
-                content=ai_response_text,
-                sequence=next_sequence + 1
+                content="".join(ai_response_parts),
+                sequence=next_sequence + 1,
+                meta_data={"stream": stream_metrics.to_dict()},
             )
             db.add(ai_message)
             await db.commit()
             await db.refresh(ai_message)
 
+            # Fold older turns into the running summary once the history outgrows its budget
+            conversation_summarizer.schedule(conversation_id)
+
             # Send complete message event
             ai_msg_data = {
                 "id": str(ai_message.id),
@@ -421,11 +450,21 @@ async def chat_stream(
             yield f"event: assistant_message\ndata: {json.dumps(ai_msg_data)}\n\n"
 
             # Send done event
-            yield f"event: done\ndata: {json.dumps({'conversation_id': str(conversation_id)})}\n\n"
+            done_data = {
+                "conversation_id": str(conversation_id),
+                "title": conversation.title,
+                "metrics": stream_metrics.to_dict(),
+            }
+            yield f"event: done\ndata: {json.dumps(done_data)}\n\n"
 
-            logger.info(f"Streaming chat completed for conversation {conversation_id}")
+            logger.info(
+                f"Streaming chat completed for conversation {conversation_id} "
+                f"(ttft={stream_metrics.ttft_ms}ms, stalls={stream_metrics.stall_count})"
+            )
 
         except Exception as e:
+            if title_task and not title_task.done():
+                title_task.cancel()
             logger.error(f"Error in chat stream: {e}")
             error_data = {"error": str(e)}
             yield f"event: error\ndata: {json.dumps(error_data)}\n\n"
@@ -548,7 +587,7 @@ async def update_conversation_status(
 
         # Evolve knowledge base structure
         from backend.app.services.knowledge_evolution_service import KnowledgeEvolutionService
-        gemini_service = GeminiService()
+        gemini_service = get_gemini_service()
         evolution_service = KnowledgeEvolutionService(gemini_service)
         await evolution_service.evolve_knowledge_base(
             db=db,
@@ -613,5 +652,8 @@ async def delete_conversation(
     await db.delete(conversation)
     await db.commit()
 
+    # Stored PRD exports of the conversation
+    prd_render_store.invalidate(conversation_id)
+
     logger.info(f"Deleted conversation {conversation_id}")
 
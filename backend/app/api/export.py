@@ -2,15 +2,16 @@
 API endpoints for PRD export.
 """
 import logging
+from typing import Optional
 from uuid import UUID
 from urllib.parse import quote
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from fastapi.responses import Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.app.core.database import get_db
 from backend.app.schemas.export import ExportRequest, ExportResponse
 from backend.app.services.export_service import ExportService
-from backend.app.services.gemini_service import GeminiService
+from backend.app.services.ai_service_factory import get_gemini_service
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,7 @@ router = APIRouter()
 
 def get_export_service() -> ExportService:
     """Dependency to get export service."""
-    gemini_service = GeminiService()
+    gemini_service = get_gemini_service()
     return ExportService(gemini_service)
 
 
@@ -75,16 +76,22 @@ async def download_conversation(
     conversation_id: UUID,
     format: str = 'markdown',
     include_knowledge_base: bool = True,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     export_service: ExportService = Depends(get_export_service)
 ):
     """
     Download a conversation in various formats.
 
+    The PRD is generated once per conversation state and every format is
+    converted from it. Responses carry an ETag; a request whose
+    If-None-Match matches it gets 304 Not Modified without a conversion.
+
     Args:
         conversation_id: Conversation ID
         format: Export format (markdown, word, html, pdf)
         include_knowledge_base: Whether to include knowledge base
+        if_none_match: ETags the client already has
         db: Database session
         export_service: Export service
 
@@ -100,14 +107,29 @@ async def download_conversation(
                 detail=f"Invalid format. Must be one of: {', '.join(valid_formats)}"
             )
 
-        # 导出为请求的格式
-        content, filename, content_type = await export_service.export_conversation(
+        # 生成（或读取已保存的）PRD Markdown
+        rendered, conversation = await export_service.render_markdown(
             db=db,
             conversation_id=conversation_id,
-            format=format,
             include_knowledge_base=include_knowledge_base
         )
 
+        # Browsers revalidate every time; unchanged PRDs cost a 304
+        etag = rendered.etag(format)
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if if_none_match:
+            # If-None-Match uses the weak comparison
+            client_etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if etag.removeprefix("W/") in client_etags or "*" in client_etags:
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
+        # 导出为请求的格式
+        content, filename, content_type = export_service.convert(
+            rendered.markdown,
+            export_service.make_filename(conversation),
+            format
+        )
+
         logger.info(f"Downloaded conversation {conversation_id} as {filename} ({format})")
 
         # URL encode filename for proper handling of non-ASCII characters
@@ -124,7 +146,8 @@ async def download_conversation(
             media_type=content_type,
             headers={
                 "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
-                "Content-Type": content_type
+                "Content-Type": content_type,
+                **cache_headers
             }
         )
 
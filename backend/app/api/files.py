@@ -1,13 +1,15 @@
 """
 File upload and analysis API endpoints.
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List
+from sqlalchemy import select, func, update
+from typing import List, Optional
 from uuid import UUID
 import os
-import aiofiles
+import json
+import time
 from pathlib import Path
 import logging
 
@@ -19,9 +21,17 @@ from backend.app.schemas.file import (
     FileUploadResponse,
     FileListResponse,
     FileAnalysisResponse,
+    BatchAnalysisItem,
+    BatchAnalysisResponse,
+    UploadSessionCreate,
+    UploadSessionResponse,
 )
 from backend.app.services.file_processor import file_processor
-from backend.app.services.gemini_service import gemini_service
+from backend.app.services.file_analysis_service import file_analysis_service
+from backend.app.services.semantic_search import semantic_search_service
+from backend.app.services.blob_store import blob_store, UploadTooLargeError
+from backend.app.services.upload_sessions import upload_sessions, UploadSessionError
+from backend.app.tasks.file_analysis import analyze_file_task, schedule_knowledge_base_build_task
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -31,20 +41,12 @@ router = APIRouter()
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
 
-@router.post("/upload", response_model=FileUploadResponse, status_code=status.HTTP_201_CREATED)
-async def upload_file(
-    project_id: UUID = Form(...),
-    file: UploadFile = File(...),
-    db: AsyncSession = Depends(get_db),
-):
+async def _check_upload_allowed(db: AsyncSession, project_id: UUID, filename: str) -> str:
     """
-    Upload a file to a project.
-    
-    Supported file types:
-    - Documents: .pdf, .docx, .doc, .txt, .md
-    - Images: .png, .jpg, .jpeg, .gif, .webp
-    
-    File size limit: 10MB (configurable)
+    Validate that a file may be uploaded to a project.
+
+    Returns:
+        Detected file type
     """
     # Verify project exists
     query = select(Project).where(Project.id == project_id)
@@ -68,18 +70,8 @@ async def upload_file(
             detail=f"Project has reached maximum file limit ({settings.MAX_FILES_PER_PROJECT})",
         )
     
-    # Check file size
-    file_content = await file.read()
-    file_size = len(file_content)
-    
-    if file_size > settings.max_file_size_bytes:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File size exceeds limit ({settings.MAX_FILE_SIZE_MB}MB)",
-        )
-    
     # Determine file type
-    file_type = file_processor.get_file_type(file.filename)
+    file_type = file_processor.get_file_type(filename)
     
     if file_type == 'unknown':
         raise HTTPException(
@@ -87,57 +79,258 @@ async def upload_file(
             detail=f"Unsupported file type. Supported: .pdf, .docx, .pptx, .txt, .md, .png, .jpg, .jpeg",
         )
     
-    # Save file to disk
-    project_upload_dir = os.path.join(settings.UPLOAD_DIR, str(project_id))
-    os.makedirs(project_upload_dir, exist_ok=True)
-    
-    # Generate unique filename
-    import uuid
-    file_id = uuid.uuid4()
-    file_ext = Path(file.filename).suffix
-    saved_filename = f"{file_id}{file_ext}"
-    file_path = os.path.join(project_upload_dir, saved_filename)
-    
-    # Write file
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(file_content)
+    return file_type
+
+
+async def _enqueue_analysis(db: AsyncSession, uploaded_file: UploadedFile) -> None:
+    """Hand a file to the Celery analysis workers."""
+    uploaded_file.status = "queued"
+    await db.commit()
+    analyze_file_task.delay(str(uploaded_file.id), str(uploaded_file.project_id))
+    logger.info(f"Queued analysis for {uploaded_file.filename}")
+
+
+async def _create_file_record(
+    db: AsyncSession,
+    project_id: UUID,
+    filename: str,
+    file_type: str,
+    content_hash: str,
+    file_path: str,
+    file_size: int,
+    new_blob: bool,
+) -> UploadedFile:
+    """Create the UploadedFile row for stored content, reusing any earlier analysis."""
+    logger.info(f"Saved file: {file_path} ({file_size} bytes, new_blob={new_blob})")
     
-    logger.info(f"Saved file: {file_path} ({file_size} bytes)")
+    # Identical content that was already analyzed needs no new analysis
+    duplicate = None if new_blob else await blob_store.find_analyzed_duplicate(db, content_hash)
     
     # Create database record
     uploaded_file = UploadedFile(
-        id=file_id,
         project_id=project_id,
-        filename=file.filename,
+        filename=filename,
         file_path=file_path,
         file_type=file_type,
         file_size=file_size,
-        status="pending",
+        content_hash=content_hash,
+        status="completed" if duplicate else "pending",
+        analysis_result=duplicate.analysis_result if duplicate else None,
     )
     
     db.add(uploaded_file)
     await db.commit()
     await db.refresh(uploaded_file)
     
-    # TODO: Trigger async analysis task (Celery)
-    # For now, we'll analyze synchronously
-    logger.info(f"File uploaded successfully: {file.filename}")
+    if duplicate:
+        logger.info(f"File uploaded successfully: {filename} (duplicate of {duplicate.id}, analysis reused)")
+        # No analysis runs for this row, so index it here; the duplicate's vectors are copied
+        if settings.SEMANTIC_INDEXING_ENABLED and file_type != 'image':
+            try:
+                await semantic_search_service.index_file(db, uploaded_file)
+            except Exception as e:
+                # Semantic search is an extra; the upload itself succeeded
+                await db.rollback()
+                await db.refresh(uploaded_file)
+                logger.warning(f"Failed to index file {uploaded_file.id} for semantic search: {str(e)}")
+        if settings.ANALYZE_IN_BACKGROUND:
+            schedule_knowledge_base_build_task.delay(str(project_id))
+    else:
+        logger.info(f"File uploaded successfully: {filename}")
+        if settings.ANALYZE_IN_BACKGROUND:
+            await _enqueue_analysis(db, uploaded_file)
     
     return uploaded_file
 
 
+@router.post("/upload", response_model=FileUploadResponse, status_code=status.HTTP_201_CREATED)
+async def upload_file(
+    project_id: UUID = Form(...),
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Upload a file to a project.
+    
+    Supported file types:
+    - Documents: .pdf, .docx, .doc, .txt, .md
+    - Images: .png, .jpg, .jpeg, .gif, .webp
+    
+    File size limit: 10MB (configurable)
+
+    Starlette spools the multipart body to a temporary file before this
+    handler runs, so the size limit bounds what is hashed and stored, not
+    what is received. The file is then copied into the blob store chunk by
+    chunk rather than read into memory. Large files should use the
+    resumable upload endpoints below, which stream the request body.
+
+    Content is stored once per SHA-256. Re-uploading a file that has already
+    been analyzed (in any project) completes immediately and reuses the
+    stored analysis.
+    """
+    file_type = await _check_upload_allowed(db, project_id, file.filename)
+    
+    # Skip hashing and copying when the spooled file is already too large
+    if file.size is not None and file.size > settings.max_file_size_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds limit ({settings.MAX_FILE_SIZE_MB}MB)",
+        )
+    
+    chunk_size = settings.UPLOAD_CHUNK_SIZE_KB * 1024
+    
+    async def read_chunks():
+        while chunk := await file.read(chunk_size):
+            yield chunk
+    
+    # Save file to the deduplicated blob store
+    try:
+        content_hash, file_path, created, file_size = await blob_store.save_stream(
+            read_chunks(),
+            ext=Path(file.filename).suffix,
+            max_bytes=settings.max_file_size_bytes,
+            db=db,
+        )
+    except UploadTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds limit ({settings.MAX_FILE_SIZE_MB}MB)",
+        )
+    
+    return await _create_file_record(
+        db, project_id, file.filename, file_type, content_hash, file_path, file_size, created
+    )
+
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    request: UploadSessionCreate,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Start a resumable upload for a large file.
+
+    Send the file with PUT /uploads/{upload_id}?offset=N (raw bytes, any number
+    of parts), check progress with GET /uploads/{upload_id} after a dropped
+    connection, then call POST /uploads/{upload_id}/complete.
+    """
+    await _check_upload_allowed(db, request.project_id, request.filename)
+    
+    try:
+        session = await upload_sessions.create(request.project_id, request.filename, request.total_size)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    
+    return UploadSessionResponse(**session)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload_session(upload_id: UUID):
+    """
+    Get resumable upload progress.
+    
+    received_bytes is the offset the next part must start at.
+    """
+    try:
+        session = await upload_sessions.get(str(upload_id))
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Upload session {upload_id} not found",
+        )
+    
+    return UploadSessionResponse(**session)
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_part(
+    upload_id: UUID,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset this part starts at"),
+):
+    """
+    Append a part (raw request body) to a resumable upload.
+    
+    The body is streamed straight to disk. A part whose offset does not match
+    the bytes already received is rejected with 409 and changes nothing.
+    """
+    try:
+        session = await upload_sessions.append(str(upload_id), offset, request.stream())
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Upload session {upload_id} not found",
+        )
+    except UploadSessionError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
+    return UploadSessionResponse(**session)
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=FileUploadResponse, status_code=status.HTTP_201_CREATED)
+async def complete_upload_session(
+    upload_id: UUID,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Finish a resumable upload and register the file with its project.
+    """
+    try:
+        session = await upload_sessions.take_completed(str(upload_id))
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Upload session {upload_id} not found",
+        )
+    except UploadSessionError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
+    project_id = UUID(session["project_id"])
+    try:
+        # Re-check: other uploads may have filled the project in the meantime
+        file_type = await _check_upload_allowed(db, project_id, session["filename"])
+    except HTTPException:
+        upload_sessions.abort(str(upload_id))
+        raise
+    
+    content_hash, file_path, created, file_size = await blob_store.adopt_file(
+        upload_sessions.data_path(str(upload_id)),
+        ext=Path(session["filename"]).suffix,
+        db=db,
+    )
+    
+    return await _create_file_record(
+        db, project_id, session["filename"], file_type, content_hash, file_path, file_size, created
+    )
+
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload_session(upload_id: UUID):
+    """
+    Abort a resumable upload and discard the received data.
+    """
+    upload_sessions.abort(str(upload_id))
+    return None
+
+
 @router.post("/{file_id}/analyze", response_model=FileAnalysisResponse)
 async def analyze_file(
     file_id: UUID,
+    background: Optional[bool] = Query(None, description="Queue on Celery instead of waiting (default: ANALYZE_IN_BACKGROUND)"),
     db: AsyncSession = Depends(get_db),
 ):
     """
     Analyze an uploaded file using Gemini AI.
     
     This will:
-    1. Extract text from the file (for documents)
-    2. Send to Gemini for analysis
-    3. Store the analysis result
+    1. Reuse a stored analysis of identical content, if one exists
+    2. Otherwise extract text from the file (for documents)
+    3. Send to Gemini for analysis
+    4. Store the analysis result
+
+    In background mode the file is queued for the Celery workers and the
+    response returns immediately with status "queued"; poll the file list
+    for progress.
     """
     # Get file record
     query = select(UploadedFile).where(UploadedFile.id == file_id)
@@ -150,64 +343,22 @@ async def analyze_file(
             detail=f"File with id {file_id} not found",
         )
     
-    # Update status to analyzing
-    uploaded_file.status = "analyzing"
-    await db.commit()
+    if background is None:
+        background = settings.ANALYZE_IN_BACKGROUND
+    
+    if background:
+        # Uploads are already queued in background mode; don't analyze twice
+        if uploaded_file.status not in ("queued", "analyzing"):
+            await _enqueue_analysis(db, uploaded_file)
+        return FileAnalysisResponse(
+            file_id=file_id,
+            status=uploaded_file.status,
+            analysis=None,
+            message="File queued for analysis",
+        )
     
     try:
-        analysis_result = None
-
-        # Process based on file type
-        if uploaded_file.file_type == 'image':
-            # Analyze image directly with Gemini
-            analysis_result = await gemini_service.analyze_image(uploaded_file.file_path)
-
-        elif uploaded_file.file_type == 'pptx':
-            # Extract text from PPTX
-            text_content = await file_processor.process_file(
-                uploaded_file.file_path,
-                uploaded_file.file_type
-            )
-
-            # Extract images from PPTX
-            image_paths = await file_processor.extract_images_from_pptx(uploaded_file.file_path)
-            logger.info(f"Extracted {len(image_paths)} images from PPTX: {uploaded_file.filename}")
-
-            if text_content or image_paths:
-                # Analyze with Gemini (text + images)
-                analysis_result = await gemini_service.analyze_document_with_images(
-                    document_content=text_content or "无文本内容",
-                    document_type=uploaded_file.file_type,
-                    filename=uploaded_file.filename,
-                    image_paths=image_paths if image_paths else None,
-                )
-
-        else:
-            # Extract text first
-            text_content = await file_processor.process_file(
-                uploaded_file.file_path,
-                uploaded_file.file_type
-            )
-
-            if text_content:
-                # Analyze with Gemini
-                analysis_result = await gemini_service.analyze_document(
-                    document_content=text_content,
-                    document_type=uploaded_file.file_type,
-                    filename=uploaded_file.filename,
-                )
-        
-        # Update file record
-        uploaded_file.status = "completed"
-        if analysis_result:
-            # Store summary as analysis_result
-            summary = analysis_result.get('summary', 'Analysis completed')
-            uploaded_file.analysis_result = summary[:1000]  # Limit to 1000 chars
-        
-        await db.commit()
-        await db.refresh(uploaded_file)
-        
-        logger.info(f"File analysis completed: {uploaded_file.filename}")
+        analysis_result = await file_analysis_service.analyze(db, uploaded_file)
         
         return FileAnalysisResponse(
             file_id=file_id,
@@ -217,19 +368,120 @@ async def analyze_file(
         )
     
     except Exception as e:
-        # Update status to failed
-        uploaded_file.status = "failed"
-        uploaded_file.analysis_result = f"Error: {str(e)}"
-        await db.commit()
-        
-        logger.error(f"Error analyzing file {file_id}: {str(e)}")
-        
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error analyzing file: {str(e)}",
         )
 
 
+@router.post("/project/{project_id}/analyze", response_model=BatchAnalysisResponse)
+async def analyze_project_files(
+    project_id: UUID,
+    include_failed: bool = Query(False, description="Also retry files whose analysis failed"),
+    include_queued: bool = Query(
+        False,
+        description="Also restart files left queued by an interrupted batch (e.g. a server restart)",
+    ),
+    stream: bool = Query(False, description="Stream per-file progress as server-sent events"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Analyze all pending files of a project in parallel.
+    
+    Up to BATCH_ANALYSIS_CONCURRENCY files are analyzed at once, so the batch
+    takes roughly as long as its slowest files rather than the sum of all of
+    them. One failing file does not stop the others; failures are reported
+    per file.
+    
+    With stream=true the response is an SSE stream with a `start` event, one
+    `file` event per finished file and a final `done` event carrying the
+    same summary as the JSON response.
+
+    Files stay queued only while their analysis is scheduled; if the server
+    goes away mid-batch, run again with include_queued=true to pick them up.
+    Don't combine it with background analysis, whose queued files are
+    already waiting for a Celery worker.
+    """
+    # Verify project exists
+    project_query = select(Project).where(Project.id == project_id)
+    project_result = await db.execute(project_query)
+    project = project_result.scalar_one_or_none()
+    
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Project with id {project_id} not found",
+        )
+    
+    statuses = ["pending"]
+    if include_failed:
+        statuses.append("failed")
+    if include_queued:
+        statuses.append("queued")
+    
+    # Claim the batch atomically, marking it queued so progress is visible in
+    # the file list: a concurrent request (double click, retry, second tab)
+    # finds these files no longer pending and does not analyze them again
+    claim_result = await db.execute(
+        update(UploadedFile)
+        .where(UploadedFile.project_id == project_id)
+        .where(UploadedFile.status.in_(statuses))
+        .values(status="queued")
+        .returning(UploadedFile.id, UploadedFile.created_at)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = sorted(claim_result.all(), key=lambda row: row.created_at)
+    await db.commit()
+    file_ids = [row.id for row in claimed]
+    
+    logger.info(f"Batch analyzing {len(file_ids)} files for project {project_id}")
+    started = time.perf_counter()
+    
+    def summarize(results: List[dict]) -> BatchAnalysisResponse:
+        return BatchAnalysisResponse(
+            project_id=project_id,
+            total=len(file_ids),
+            completed=sum(1 for r in results if r["status"] == "completed"),
+            failed=sum(1 for r in results if r["status"] != "completed"),
+            duration_ms=round((time.perf_counter() - started) * 1000, 1),
+            results=results,
+        )
+    
+    batch = file_analysis_service.analyze_batch(
+        file_ids, concurrency=settings.BATCH_ANALYSIS_CONCURRENCY
+    )
+    
+    if not stream:
+        results = [result async for result in batch]
+        summary = summarize(results)
+        logger.info(f"Batch analysis finished: {summary.completed}/{summary.total} completed in {summary.duration_ms}ms")
+        return summary
+    
+    async def generate_stream():
+        yield f"event: start\ndata: {json.dumps({'project_id': str(project_id), 'total': len(file_ids)})}\n\n"
+        
+        results = []
+        async for result in batch:
+            results.append(result)
+            item = BatchAnalysisItem(**result).model_dump(mode="json")
+            item["done"] = len(results)
+            yield f"event: file\ndata: {json.dumps(item)}\n\n"
+        
+        summary = summarize(results)
+        logger.info(f"Batch analysis finished: {summary.completed}/{summary.total} completed in {summary.duration_ms}ms")
+        yield f"event: done\ndata: {summary.model_dump_json()}\n\n"
+    
+    return StreamingResponse(
+        generate_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # Disable nginx buffering
+        }
+    )
+
+
 @router.get("/project/{project_id}", response_model=FileListResponse)
 async def list_project_files(
     project_id: UUID,
@@ -276,17 +528,21 @@ async def delete_file(
             detail=f"File with id {file_id} not found",
         )
     
-    # Delete physical file
-    try:
-        if os.path.exists(uploaded_file.file_path):
-            os.remove(uploaded_file.file_path)
-            logger.info(f"Deleted file: {uploaded_file.file_path}")
-    except Exception as e:
-        logger.error(f"Error deleting physical file: {str(e)}")
+    content_hash, file_path = uploaded_file.content_hash, uploaded_file.file_path
     
     # Delete database record
     await db.delete(uploaded_file)
     await db.commit()
     
+    # Delete physical file (shared blobs only once no other upload references them)
+    try:
+        if blob_store.is_blob(file_path):
+            await blob_store.release(db, content_hash, file_path)
+        elif os.path.exists(file_path):
+            os.remove(file_path)
+            logger.info(f"Deleted file: {file_path}")
+    except Exception as e:
+        logger.error(f"Error deleting physical file: {str(e)}")
+    
     return None
 
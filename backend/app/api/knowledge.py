@@ -11,7 +11,6 @@ from uuid import UUID
 from backend.app.core.database import get_db
 from backend.app.models.project import Project
 from backend.app.models.knowledge_base import KnowledgeBase
-from backend.app.models.file import UploadedFile
 from backend.app.schemas.knowledge import (
     KnowledgeBaseResponse,
     KnowledgeBaseBuildRequest,
@@ -19,7 +18,7 @@ from backend.app.schemas.knowledge import (
     KnowledgeBaseConfirmRequest,
     KnowledgeBaseData,
 )
-from backend.app.services.knowledge_builder import knowledge_builder
+from backend.app.services.file_analysis_service import file_analysis_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -61,72 +60,14 @@ async def build_knowledge_base(
         logger.info(f"Knowledge base already exists for project {project_id}")
         return existing_kb
     
-    # Get all completed file analyses
-    files_query = (
-        select(UploadedFile)
-        .where(UploadedFile.project_id == project_id)
-        .where(UploadedFile.status == "completed")
-    )
-    files_result = await db.execute(files_query)
-    files = files_result.scalars().all()
+    try:
+        return await file_analysis_service.build_knowledge_base(db, project, existing_kb)
     
-    if not files:
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No analyzed files found. Please upload and analyze files first.",
+            detail=str(e),
         )
-    
-    logger.info(f"Found {len(files)} analyzed files")
-    
-    # Prepare file analyses
-    file_analyses = []
-    for file in files:
-        # Read analysis from file (stored during analysis)
-        # For now, we'll use a simplified approach
-        # In production, you might want to store full analysis in a separate table
-        file_analyses.append({
-            "filename": file.filename,
-            "file_type": file.file_type,
-            "analysis": {
-                "summary": file.analysis_result or "No analysis available"
-            }
-        })
-    
-    # For better results, we should re-analyze or fetch stored detailed analysis
-    # Let's fetch from a hypothetical analysis storage
-    # TODO: Implement proper analysis storage and retrieval
-    
-    # Build knowledge base
-    try:
-        kb_data = await knowledge_builder.build_knowledge_base(
-            project_name=project.name,
-            file_analyses=file_analyses,
-        )
-        
-        # Create or update knowledge base
-        if existing_kb:
-            logger.info(f"Updating existing knowledge base (version {existing_kb.version})")
-            existing_kb.structured_data = kb_data
-            existing_kb.version += 1
-            existing_kb.status = "confirmed" if not kb_data.get("pending_questions") else "pending"
-            kb = existing_kb
-        else:
-            logger.info("Creating new knowledge base")
-            kb = KnowledgeBase(
-                project_id=project_id,
-                structured_data=kb_data,
-                version=1,
-                status="pending",
-            )
-            db.add(kb)
-        
-        await db.commit()
-        await db.refresh(kb)
-        
-        logger.info(f"✅ Knowledge base built successfully for project: {project.name}")
-        
-        return kb
-    
     except Exception as e:
         logger.error(f"Error building knowledge base: {str(e)}")
         raise HTTPException(
@@ -10,7 +10,7 @@ from pydantic import BaseModel
 from backend.app.core.database import get_db
 from backend.app.models.conversation import Conversation
 from backend.app.services.prd_service import PRDService
-from backend.app.services.gemini_service import GeminiService
+from backend.app.services.ai_service_factory import get_gemini_service
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +31,7 @@ class PRDDraftResponse(BaseModel):
 
 def get_prd_service() -> PRDService:
     """Dependency to get PRD service."""
-    gemini_service = GeminiService()
+    gemini_service = get_gemini_service()
     return PRDService(gemini_service)
 
 
@@ -111,7 +111,7 @@ async def get_prd_draft(
     draft = conversation.prd_draft
     if not draft:
         # Return empty draft
-        prd_service = PRDService(GeminiService())
+        prd_service = PRDService(get_gemini_service())
         draft = prd_service._create_empty_draft()
 
     return PRDDraftResponse(**draft)
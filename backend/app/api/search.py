@@ -2,15 +2,19 @@
 API endpoints for knowledge base search.
 """
 import logging
+import time
 from uuid import UUID
-from typing import List, Optional
-from fastapi import APIRouter, Depends, Query
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, Query, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from pydantic import BaseModel
 from backend.app.core.database import get_db
-from backend.app.models.knowledge_base import KnowledgeBase
 from backend.app.models.conversation import Conversation
+from backend.app.models.project import Project
+from backend.app.services.knowledge_search import knowledge_search_service
+from backend.app.services.semantic_search import semantic_search_service
+from backend.app.services.embeddings import get_embedder
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +38,56 @@ class SearchResponse(BaseModel):
     results: List[SearchResult]
     total: int
     query: str
+    offset: int = 0
+    limit: int = 50
+    facets: Dict[str, Dict[str, int]] = {}  # {"type": {...}, "module": {...}}
+
+
+class FederatedSearchResult(SearchResult):
+    project_id: UUID
+    project_name: str
+
+
+class FederatedSearchResponse(BaseModel):
+    results: List[FederatedSearchResult]
+    total: int
+    projects_searched: int
+    query: str
+    took_ms: float
+
+
+class SuggestionItem(BaseModel):
+    text: str
+    kind: str  # module, feature, requirement, ui_component
+    module_name: Optional[str] = None
+    conversation_id: Optional[str] = None
+
+
+class SuggestResponse(BaseModel):
+    suggestions: List[SuggestionItem]
+    query: str
+
+
+class SemanticSearchResult(BaseModel):
+    file_id: Optional[UUID] = None
+    source_file: str
+    chunk_index: int
+    page_number: Optional[int] = None
+    text: str
+    score: float  # Cosine similarity
+
+
+class SemanticSearchResponse(BaseModel):
+    results: List[SemanticSearchResult]
+    total: int
+    query: str
+    embedding_model: str
+    took_ms: float
+
+
+class ReindexResponse(BaseModel):
+    files: int
+    chunks: int
 
 
 @router.get("/knowledge/{project_id}", response_model=SearchResponse)
@@ -42,6 +96,8 @@ async def search_knowledge_base(
     q: str = Query(..., description="搜索关键词"),
     module: Optional[str] = Query(None, description="按模块筛选"),
     type: Optional[str] = Query(None, description="类型筛选: requirement, module, tech, ui"),
+    limit: int = Query(50, ge=1, le=200, description="每页条数"),
+    offset: int = Query(0, ge=0, description="跳过的条数"),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -52,179 +108,224 @@ async def search_knowledge_base(
         q: Search query
         module: Filter by module name
         type: Filter by result type
+        limit: Page size
+        offset: Number of results to skip
         db: Database session
 
     Returns:
-        Search results
+        One page of results ranked by fused lexical + semantic relevance;
+        total counts all matches, facets count matches per type and module
     """
-    # Get knowledge base
-    result = await db.execute(
-        select(KnowledgeBase).where(KnowledgeBase.project_id == project_id)
-    )
-    kb = result.scalar_one_or_none()
-
-    if not kb or not kb.structured_data:
-        return SearchResponse(results=[], total=0, query=q)
-
-    data = kb.structured_data
-    results = []
-    query_lower = q.lower()
-
-    # Search in completed requirements
-    if not type or type == "requirement":
-        completed_reqs = data.get("completed_requirements", [])
-        for req in completed_reqs:
-            title = req.get("title", "")
-            description = req.get("description", "")
-            key_points = " ".join(req.get("key_points", []))
-
-            # Calculate relevance score
-            score = 0.0
-            search_text = f"{title} {description} {key_points}".lower()
-
-            if query_lower in title.lower():
-                score += 3.0
-            if query_lower in description.lower():
-                score += 2.0
-            if query_lower in key_points.lower():
-                score += 1.0
-
-            # Simple word matching
-            query_words = query_lower.split()
-            for word in query_words:
-                if word in search_text:
-                    score += 0.5
-
-            if score > 0:
-                results.append(SearchResult(
-                    type="requirement",
-                    title=title,
-                    description=description,
-                    content=key_points,
-                    conversation_id=req.get("conversation_id"),
-                    tags=["已完成", "需求"],
-                    created_at=req.get("archived_at"),
-                    relevance_score=score
-                ))
-
-    # Search in feature modules
-    if not type or type == "module":
-        feature_modules = data.get("feature_modules", [])
-        for module in feature_modules:
-            module_name = module.get("module_name", "")
-            module_desc = module.get("description", "")
-
-            # Apply module filter
-            if module and module_name != module:
-                continue
-
-            search_text = f"{module_name} {module_desc}".lower()
-            score = 0.0
-
-            if query_lower in module_name.lower():
-                score += 3.0
-            if query_lower in module_desc.lower():
-                score += 2.0
-
-            if score > 0:
-                feature_count = len(module.get("features", []))
-                results.append(SearchResult(
-                    type="module",
-                    title=module_name,
-                    description=module_desc,
-                    content=f"包含 {feature_count} 个功能",
-                    module_name=module_name,
-                    tags=["模块"],
-                    relevance_score=score
-                ))
-
-            # Search in features within module
-            if not type or type == "requirement":
-                for feature in module.get("features", []):
-                    feature_name = feature.get("name", "")
-                    feature_desc = feature.get("description", "")
-                    key_points = " ".join(feature.get("key_points", []))
-
-                    # Apply module filter
-                    if module and module_name != module:
-                        continue
-
-                    search_text = f"{feature_name} {feature_desc} {key_points}".lower()
-                    score = 0.0
-
-                    if query_lower in feature_name.lower():
-                        score += 3.0
-                    if query_lower in feature_desc.lower():
-                        score += 2.0
-                    if query_lower in key_points.lower():
-                        score += 1.0
-
-                    if score > 0:
-                        results.append(SearchResult(
-                            type="requirement",
-                            title=feature_name,
-                            description=feature_desc,
-                            content=key_points,
-                            conversation_id=feature.get("conversation_id"),
-                            module_name=module_name,
-                            tags=["功能", module_name],
-                            created_at=feature.get("completed_at"),
-                            relevance_score=score
-                        ))
-
-    # Search in tech architecture
-    if not type or type == "tech":
-        tech_arch = data.get("tech_architecture", {})
-        patterns = tech_arch.get("patterns", [])
-
-        for pattern in patterns:
-            if query_lower in pattern.lower():
-                results.append(SearchResult(
-                    type="tech_pattern",
-                    title=pattern,
-                    description="技术模式",
-                    content=pattern,
-                    tags=["技术架构"],
-                    relevance_score=2.0
-                ))
-
-    # Search in UI/UX standards
-    if not type or type == "ui":
-        ui_standards = data.get("ui_ux_standards", {})
-
-        # Search in components
-        components = ui_standards.get("common_components", [])
-        for component in components:
-            if query_lower in component.lower():
-                results.append(SearchResult(
-                    type="ui_component",
-                    title=component,
-                    description="UI 组件",
-                    content=component,
-                    tags=["UI/UX"],
-                    relevance_score=2.0
-                ))
-
-        # Search in interaction patterns
-        patterns = ui_standards.get("interaction_patterns", [])
-        for pattern in patterns:
-            if query_lower in pattern.lower():
-                results.append(SearchResult(
-                    type="ui_pattern",
-                    title=pattern,
-                    description="交互模式",
-                    content=pattern,
-                    tags=["UI/UX"],
-                    relevance_score=2.0
-                ))
-
-    # Sort by relevance score
-    results.sort(key=lambda x: x.relevance_score, reverse=True)
-
-    logger.info(f"Search '{q}' in project {project_id}: {len(results)} results")
+    search_result = await knowledge_search_service.search(db, project_id, q, doc_type=type, module=module)
+
+    if search_result is None:
+        return SearchResponse(results=[], total=0, query=q, offset=offset, limit=limit)
+
+    results = [
+        SearchResult(
+            type=ranked.doc.type,
+            title=ranked.doc.title,
+            description=ranked.doc.description,
+            content=ranked.doc.content,
+            conversation_id=ranked.doc.conversation_id,
+            module_name=ranked.doc.module_name,
+            tags=ranked.doc.tags,
+            created_at=ranked.doc.created_at,
+            relevance_score=round(ranked.score, 4),
+        )
+        for ranked in search_result.matches[offset:offset + limit]
+    ]
+
+    logger.info(f"Search '{q}' in project {project_id}: {len(search_result.matches)} results")
 
     return SearchResponse(
+        results=results,
+        total=len(search_result.matches),
+        query=q,
+        offset=offset,
+        limit=limit,
+        facets=search_result.facets,
+    )
+
+
+@router.get("/suggest/{project_id}", response_model=SuggestResponse)
+async def suggest(
+    project_id: UUID,
+    q: str = Query(..., description="已输入的前缀"),
+    limit: int = Query(10, ge=1, le=50, description="最多返回条数"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Search-as-you-type suggestions from module, feature, requirement and UI component names.
+
+    Args:
+        project_id: Project ID
+        q: Text typed so far
+        limit: Maximum number of suggestions
+        db: Database session
+
+    Returns:
+        Matching names, prefix matches first
+    """
+    suggestions = await knowledge_search_service.suggest(db, project_id, q, limit=limit)
+
+    return SuggestResponse(
+        suggestions=[
+            SuggestionItem(
+                text=suggestion.text,
+                kind=suggestion.kind,
+                module_name=suggestion.module_name,
+                conversation_id=suggestion.conversation_id,
+            )
+            for suggestion in suggestions
+        ],
+        query=q,
+    )
+
+
+@router.get("/federated", response_model=FederatedSearchResponse)
+async def federated_search(
+    q: str = Query(..., min_length=1, description="搜索关键词"),
+    type: Optional[str] = Query(None, description="类型筛选: requirement, module, tech, ui"),
+    top_k: int = Query(20, ge=1, le=100, description="返回条数"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Search the knowledge bases of all projects at once.
+
+    Args:
+        q: Search query
+        type: Filter by result type
+        top_k: Number of results returned
+        db: Database session
+
+    Returns:
+        Global top-k results by BM25 relevance, each with its project
+    """
+    started = time.perf_counter()
+    search_result = await knowledge_search_service.federated_search(db, q, top_k=top_k, doc_type=type)
+
+    results = [
+        FederatedSearchResult(
+            project_id=match.project_id,
+            project_name=match.project_name,
+            type=match.ranked.doc.type,
+            title=match.ranked.doc.title,
+            description=match.ranked.doc.description,
+            content=match.ranked.doc.content,
+            conversation_id=match.ranked.doc.conversation_id,
+            module_name=match.ranked.doc.module_name,
+            tags=match.ranked.doc.tags,
+            created_at=match.ranked.doc.created_at,
+            relevance_score=round(match.ranked.lexical_score, 4),
+        )
+        for match in search_result.matches
+    ]
+
+    logger.info(
+        f"Federated search '{q}': {search_result.total} results "
+        f"in {search_result.projects_searched} projects"
+    )
+
+    return FederatedSearchResponse(
+        results=results,
+        total=search_result.total,
+        projects_searched=search_result.projects_searched,
+        query=q,
+        took_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+
+
+@router.get("/semantic/{project_id}", response_model=SemanticSearchResponse)
+async def semantic_search(
+    project_id: UUID,
+    q: str = Query(..., min_length=1, description="自然语言查询"),
+    top_k: int = Query(10, ge=1, le=50, description="返回最相似的片段数"),
+    file_id: Optional[UUID] = Query(None, description="只搜索该文件"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Semantic search over the project's uploaded documents.
+
+    Args:
+        project_id: Project ID
+        q: Natural-language query
+        top_k: Number of chunks returned
+        file_id: Restrict the search to one file
+        db: Database session
+
+    Returns:
+        Document chunks ranked by embedding similarity
+    """
+    started = time.perf_counter()
+    try:
+        matches = await semantic_search_service.search(db, project_id, q, top_k=top_k, file_id=file_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    except Exception as e:
+        logger.error(f"Semantic search failed for project {project_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error running semantic search: {str(e)}",
+        )
+
+    results = [
+        SemanticSearchResult(
+            file_id=match.chunk.file_id,
+            source_file=match.chunk.source_file,
+            chunk_index=match.chunk.chunk_index,
+            page_number=(match.chunk.meta_data or {}).get("page_number"),
+            text=match.chunk.chunk_text,
+            score=round(match.score, 4),
+        )
+        for match in matches
+    ]
+
+    return SemanticSearchResponse(
         results=results,
         total=len(results),
-        query=q
+        query=q,
+        embedding_model=get_embedder().name,
+        took_ms=round((time.perf_counter() - started) * 1000, 1),
     )
+
+
+@router.post("/semantic/{project_id}/reindex", response_model=ReindexResponse)
+async def reindex_semantic_search(
+    project_id: UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Re-embed all analyzed files of a project (e.g. after changing EMBEDDING_PROVIDER).
+
+    Args:
+        project_id: Project ID
+        db: Database session
+
+    Returns:
+        Number of files and chunks indexed
+    """
+    project_query = select(Project).where(Project.id == project_id)
+    project_result = await db.execute(project_query)
+    project = project_result.scalar_one_or_none()
+
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Project with id {project_id} not found",
+        )
+
+    try:
+        counts = await semantic_search_service.reindex_project(db, project_id)
+    except Exception as e:
+        logger.error(f"Semantic reindex failed for project {project_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error reindexing project: {str(e)}",
+        )
+
+    logger.info(f"Reindexed project {project_id}: {counts['files']} files, {counts['chunks']} chunks")
+    return ReindexResponse(**counts)
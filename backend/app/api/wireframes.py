@@ -9,7 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 from backend.app.core.database import get_db
 from backend.app.services.wireframe_service import WireframeService
-from backend.app.services.gemini_service import GeminiService
+from backend.app.services.ai_service_factory import get_gemini_service
 from backend.app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -17,7 +17,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 # Initialize services
-gemini_service = GeminiService()
+gemini_service = get_gemini_service()
 wireframe_service = WireframeService(gemini_service)
 
 
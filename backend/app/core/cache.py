@@ -0,0 +1,109 @@
+"""
+Small in-process LRU cache with per-entry expiry.
+
+Used for hot read paths (search results, rendered context) where a stale
+entry is bounded by the TTL and explicit invalidation covers in-process
+writes. Contents are per worker process.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after ttl seconds.
+
+    Besides the entry count, the total weight of the entries can be bounded
+    (e.g. bytes of cached text): pass max_weight and a weigher returning an
+    entry's weight.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 512,
+        ttl: float = 60.0,
+        max_weight: Optional[int] = None,
+        weigher: Optional[Callable[[Any], int]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._weights: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry (marking it recently used) or default."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store an entry, evicting the least recently used one when full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        weight = self.weigher(value) if self.weigher else 0
+        with self._lock:
+            self._remove(key)
+            if self.max_weight is not None and weight > self.max_weight:
+                return
+            self._data[key] = (expires_at, value)
+            if self.weigher:
+                self._weights[key] = weight
+                self.weight += weight
+            while len(self._data) > self.maxsize or (
+                self.max_weight is not None and self.weight > self.max_weight
+            ):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key: Hashable) -> None:
+        """Drop an entry; the caller holds the lock."""
+        if self._data.pop(key, None) is not None:
+            self.weight -= self._weights.pop(key, 0)
+
+    def pop(self, key: Hashable) -> None:
+        """Drop one entry if present."""
+        with self._lock:
+            self._remove(key)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Drop every entry whose key matches predicate.
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                self._remove(key)
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self.weight = 0
+
+    def stats(self) -> dict:
+        """Size and hit/miss counters."""
+        stats = {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+        if self.max_weight is not None:
+            stats.update(weight=self.weight, max_weight=self.max_weight)
+        return stats
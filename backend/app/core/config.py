@@ -15,14 +15,25 @@ class Settings(BaseSettings):
     # AI Models - Gemini (Primary)
     GEMINI_API_KEY: str
     GEMINI_MODEL: str = "gemini-3-flash-preview"
+    GEMINI_MAX_CONCURRENCY: int = 8  # Max in-flight Gemini SDK calls per worker process
+    GEMINI_REQUEST_TIMEOUT: float = 180.0  # Seconds before a single Gemini call is abandoned
+    GEMINI_STREAM_BUFFER_SIZE: int = 32  # Chunks buffered between the SDK stream and the HTTP response
+    GEMINI_STREAM_IDLE_TIMEOUT: float = 60.0  # Seconds to wait for the next streamed chunk (or for a stalled client to read one)
+    GEMINI_MAX_STREAMS: int = 16  # Streamed responses relayed at once per worker process, separate from GEMINI_MAX_CONCURRENCY
+    GEMINI_MODEL_POOL_SIZE: int = 64  # GenerativeModel instances reused per (system instruction, generation config)
+    STREAM_STALL_THRESHOLD_MS: float = 2000.0  # Inter-chunk gap counted as a stall in stream metrics
+
+    GEMINI_REQUESTS_PER_MINUTE: int = 60  # Shared across all processes via Redis, 0 disables
 
     # AI Models - OpenAI (Optional)
     OPENAI_API_KEY: str = ""
     OPENAI_MODEL: str = "gpt-4-turbo-preview"
+    OPENAI_REQUESTS_PER_MINUTE: int = 60
 
     # AI Models - Claude (Optional)
     CLAUDE_API_KEY: str = ""
     CLAUDE_MODEL: str = "claude-3-5-sonnet-20241022"
+    CLAUDE_REQUESTS_PER_MINUTE: int = 50
 
     # AI Model Selection
     DEFAULT_AI_PROVIDER: str = "gemini"  # "gemini", "openai", or "claude"
@@ -38,7 +49,62 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "./uploads"
     MAX_FILE_SIZE_MB: int = 10
     MAX_FILES_PER_PROJECT: int = 50
-    
+    UPLOAD_CHUNK_SIZE_KB: int = 1024  # Read/write granularity for streamed uploads
+    UPLOAD_SESSION_TTL_HOURS: int = 24  # Unfinished resumable uploads are discarded after this
+    BATCH_ANALYSIS_CONCURRENCY: int = 5  # Files analyzed at once by the project batch analyze endpoint
+
+    # Document extraction
+    EXTRACTION_MAX_WORKERS: int = 0  # Extraction worker processes, 0 = one per CPU core
+    EXTRACTION_TIMEOUT_SECONDS: float = 120.0  # Per-document parse timeout
+    EXTRACTION_MEMORY_LIMIT_MB: int = 1024  # Address-space cap per extraction worker, 0 disables
+    PDF_PAGES_PER_TASK: int = 20  # Large PDFs are split into page ranges of this size and parsed in parallel
+    PPTX_IMAGES_IN_MEMORY: bool = True  # Send slide images to Gemini inline instead of via temp files
+    SCRATCH_TTL_MINUTES: int = 60  # Leftover scratch files (extracted images) are evicted after this
+
+    # Semantic search
+    SEMANTIC_INDEXING_ENABLED: bool = True  # Embed document chunks after each file analysis
+    EMBEDDING_PROVIDER: str = "gemini"  # "gemini", "local" (sentence-transformers) or "hashing" (offline, lexical only)
+    EMBEDDING_CHUNK_CHARS: int = 800  # Target chunk size; chunks break on paragraph/sentence boundaries
+    EMBEDDING_CHUNK_OVERLAP: int = 100  # Trailing characters repeated at the start of the next chunk
+    VECTOR_INDEX: str = "pgvector"  # "pgvector" (HNSW index in Postgres) or "memory" (in-process HNSW)
+    VECTOR_EF_SEARCH: int = 100  # HNSW candidate list size per query; higher = better recall, slower
+    HYBRID_SEARCH_ENABLED: bool = True  # Fuse embedding similarity into knowledge base search ranking
+    HYBRID_MIN_SIMILARITY: float = 0.55  # Cosine similarity an entry needs to count as a semantic match
+    SEARCH_CACHE_SIZE: int = 512  # Cached knowledge base search results per process
+    SEARCH_CACHE_TTL_SECONDS: int = 60  # Also bounds staleness after KB writes from other processes
+
+    # Prompt context
+    KB_CONTEXT_CACHE_SIZE: int = 256  # Rendered knowledge base context blocks kept per process
+    KB_VERSION_CACHE_TTL_SECONDS: int = 30  # How long a cached KB version is trusted before re-checking the database
+    CHAT_SUMMARY_ENABLED: bool = True  # Fold older chat turns into a running conversation summary in the background
+    CHAT_HISTORY_TOKEN_BUDGET: int = 6000  # Verbatim history tokens per chat turn before older turns are folded
+    CHAT_RECENT_MIN_MESSAGES: int = 6  # Newest messages always sent verbatim, whatever their size
+    CHAT_SUMMARY_MAX_TOKENS: int = 800  # Target length of the running summary
+
+    # Prompt token budgets (counted per provider, see services/context_assembler.py)
+    CHAT_PROMPT_TOKEN_BUDGET: int = 16000  # Whole chat prompt: instructions, KB, summary, history and new message
+    CHAT_KB_HISTORY_TOKENS: int = 2000  # Archived requirements retrieved into each chat turn by relevance to the message
+    CHAT_KB_HISTORY_TOP_K: int = 5  # Most archived requirements/features retrieved per chat turn
+    ANALYSIS_DOCUMENT_TOKENS: int = 6000  # Extracted document text per file analysis prompt
+    KB_BUILD_CONTEXT_TOKENS: int = 24000  # File analysis summaries in the knowledge base build prompt
+    PRD_SECTION_HISTORY_TOKENS: int = 4000  # Recent conversation included when regenerating a PRD section
+
+    # Provider-side prompt caching
+    PROMPT_CACHE_ENABLED: bool = True  # Mark the static chat prefix (instructions + KB) as a prompt cache breakpoint
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS: int = 600  # Lifetime of explicit Gemini cached contents
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS: int = 4096  # Smaller system instructions rely on Gemini's implicit caching
+    GEMINI_FILE_CACHE_TTL_HOURS: float = 46.0  # Reuse uploaded image handles; the Files API keeps uploads for 48 hours
+
+    # LLM response cache (see services/llm_cache.py)
+    LLM_CACHE_ENABLED: bool = True  # Reuse responses to repeated generate_text/chat calls that pass cache=True
+    LLM_CACHE_MEMORY_MB: int = 64  # In-process tier, least recently used responses are evicted beyond this
+    LLM_CACHE_REDIS_ENABLED: bool = True  # Share cached responses across processes through Redis
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # Lifetime of a cached response
+    LLM_CACHE_MAX_ENTRY_KB: int = 512  # Larger responses are not cached
+
+    # Export
+    EXPORT_RENDER_CACHE_ENABLED: bool = True  # Generate a conversation's PRD once per conversation state for all export formats
+
     # Application
     DEBUG: bool = False
     SECRET_KEY: str
@@ -47,6 +113,10 @@ class Settings(BaseSettings):
     # Celery
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
+    CELERY_WORKER_CONCURRENCY: int = 4  # Worker processes analyzing files in parallel
+    ANALYZE_IN_BACKGROUND: bool = False  # Queue analysis on Celery instead of running it in the request
+    KB_AUTO_BUILD: bool = True  # Build the knowledge base once all of a project's files are analyzed
+    KB_AUTO_BUILD_DELAY_SECONDS: int = 10  # Wait for uploads to settle before the automatic build
     
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -65,6 +135,11 @@ class Settings(BaseSettings):
         """Convert MB to bytes."""
         return self.MAX_FILE_SIZE_MB * 1024 * 1024
 
+    @property
+    def use_pgvector(self) -> bool:
+        """Whether the database needs the pgvector extension (vector column, HNSW index)."""
+        return self.SEMANTIC_INDEXING_ENABLED and self.VECTOR_INDEX == "pgvector"
+
 
 # Global settings instance
 settings = Settings()
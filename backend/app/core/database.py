@@ -2,6 +2,8 @@
 Database connection and session management.
 Using async SQLAlchemy with PostgreSQL.
 """
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from backend.app.core.config import settings
@@ -52,6 +54,18 @@ async def init_db():
     This will create all tables defined in models.
     """
     async with engine.begin() as conn:
+        if settings.use_pgvector:
+            # pgvector must exist before tables with vector columns are created
+            try:
+                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            except DBAPIError as e:
+                raise RuntimeError(
+                    "The pgvector extension is not available in this PostgreSQL database "
+                    "(needed with SEMANTIC_INDEXING_ENABLED=True and VECTOR_INDEX=pgvector). "
+                    "Install pgvector (e.g. use the pgvector/pgvector Docker image), or set "
+                    "VECTOR_INDEX=memory or SEMANTIC_INDEXING_ENABLED=False. "
+                    f"Database error: {e}"
+                ) from e
         await conn.run_sync(Base.metadata.create_all)
 
 
@@ -0,0 +1,178 @@
+"""
+Lightweight in-process metrics for AI calls.
+
+Keeps a rolling window of recent observations per metric name so the API can
+report averages and percentiles (e.g. stream TTFT, p95 chat latency) without
+an external metrics backend. Numbers are per worker process.
+"""
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Any, Optional
+
+# CJK ideographs count roughly one token each; other text roughly four chars per token
+_CJK_PATTERN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate used when the provider does not report usage."""
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    other_chars = len(text) - cjk_chars
+    return cjk_chars + (other_chars + 3) // 4
+
+
+class MetricsRecorder:
+    """Thread-safe rolling window of observations, keyed by metric name."""
+
+    def __init__(self, window_size: int = 1000):
+        self.window_size = window_size
+        self._series: Dict[str, Deque[float]] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float) -> None:
+        """Record one observation for a metric."""
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = deque(maxlen=self.window_size)
+                self._series[name] = series
+            series.append(value)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """Increment a monotonically growing counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def summary(self, name: str) -> Dict[str, float]:
+        """
+        Summarize one metric over the current window.
+
+        Returns:
+            Dictionary with count, avg, p50, p95 and max (empty window -> count 0)
+        """
+        with self._lock:
+            values = sorted(self._series.get(name, ()))
+
+        if not values:
+            return {"count": 0}
+
+        def percentile(p: float) -> float:
+            index = min(len(values) - 1, int(round(p * (len(values) - 1))))
+            return values[index]
+
+        return {
+            "count": len(values),
+            "avg": sum(values) / len(values),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "max": values[-1],
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Summaries of every metric plus all counters."""
+        with self._lock:
+            names = list(self._series.keys())
+            counters = dict(self._counters)
+        return {
+            "metrics": {name: self.summary(name) for name in names},
+            "counters": counters,
+        }
+
+    def reset(self) -> None:
+        """Drop all recorded observations and counters."""
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+
+
+@dataclass
+class StreamMetrics:
+    """
+    Timing for a single streamed response.
+
+    Call record_chunk() for every chunk sent to the client and finish() once
+    the stream ends. A stall is any gap between chunks longer than
+    stall_threshold_ms.
+    """
+    stall_threshold_ms: float = 2000.0
+    started_at: float = field(default_factory=time.perf_counter)
+    first_chunk_at: Optional[float] = None
+    last_chunk_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    chunk_count: int = 0
+    char_count: int = 0
+    token_count: int = 0
+    stall_count: int = 0
+    max_gap_ms: float = 0.0
+
+    def record_chunk(self, text: str) -> None:
+        """Record a chunk leaving the server."""
+        now = time.perf_counter()
+        if self.first_chunk_at is None:
+            self.first_chunk_at = now
+        elif self.last_chunk_at is not None:
+            gap_ms = (now - self.last_chunk_at) * 1000
+            self.max_gap_ms = max(self.max_gap_ms, gap_ms)
+            if gap_ms > self.stall_threshold_ms:
+                self.stall_count += 1
+        self.last_chunk_at = now
+        self.chunk_count += 1
+        self.char_count += len(text)
+        self.token_count += estimate_tokens(text)
+
+    def finish(self) -> None:
+        """Mark the stream as complete."""
+        self.finished_at = time.perf_counter()
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        """Time to first token (chunk) in milliseconds."""
+        if self.first_chunk_at is None:
+            return None
+        return (self.first_chunk_at - self.started_at) * 1000
+
+    @property
+    def duration_ms(self) -> float:
+        """Total stream duration in milliseconds."""
+        end = self.finished_at or time.perf_counter()
+        return (end - self.started_at) * 1000
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Generation throughput measured from the first chunk onwards."""
+        if self.first_chunk_at is None or self.last_chunk_at is None:
+            return None
+        elapsed = self.last_chunk_at - self.first_chunk_at
+        if elapsed <= 0:
+            return None
+        return self.token_count / elapsed
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable view, suitable for Message.meta_data."""
+        return {
+            "ttft_ms": round(self.ttft_ms, 1) if self.ttft_ms is not None else None,
+            "duration_ms": round(self.duration_ms, 1),
+            "tokens_per_second": round(self.tokens_per_second, 1) if self.tokens_per_second else None,
+            "chunks": self.chunk_count,
+            "chars": self.char_count,
+            "estimated_tokens": self.token_count,
+            "stalls": self.stall_count,
+            "max_gap_ms": round(self.max_gap_ms, 1),
+        }
+
+    def record_to(self, recorder: MetricsRecorder, prefix: str) -> None:
+        """Push this stream's numbers into a MetricsRecorder."""
+        if self.ttft_ms is not None:
+            recorder.observe(f"{prefix}.ttft_ms", self.ttft_ms)
+        if self.tokens_per_second is not None:
+            recorder.observe(f"{prefix}.tokens_per_second", self.tokens_per_second)
+        recorder.observe(f"{prefix}.duration_ms", self.duration_ms)
+        recorder.increment(f"{prefix}.streams")
+        recorder.increment(f"{prefix}.stalls", self.stall_count)
+
+
+# Global recorder
+metrics = MetricsRecorder()
@@ -5,7 +5,7 @@ Import all models here to ensure they are registered with SQLAlchemy.
 from backend.app.models.project import Project
 from backend.app.models.knowledge_base import KnowledgeBase, DocumentEmbedding
 from backend.app.models.conversation import Conversation, Message
-from backend.app.models.file import UploadedFile
+from backend.app.models.file import UploadedFile, FileAnalysis
 
 __all__ = [
     "Project",
@@ -14,5 +14,6 @@ __all__ = [
     "Conversation",
     "Message",
     "UploadedFile",
+    "FileAnalysis",
 ]
 
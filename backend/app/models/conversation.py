@@ -22,8 +22,10 @@ class Conversation(Base):
     title = Column(String(255), nullable=True)  # Auto-generated or user-defined
     status = Column(String(50), default="active", nullable=False)  # active, completed, archived
     
-    # Summary of the conversation (generated periodically)
+    # Running summary of older turns, folded in the background as the conversation grows
     summary = Column(Text, nullable=True)
+    # Last message sequence covered by summary; later messages are sent verbatim
+    summary_through_sequence = Column(Integer, default=0, server_default="0", nullable=False)
 
     # Requirement summary for completed conversations (stored when marked as completed)
     requirement_summary = Column(JSON, nullable=True)
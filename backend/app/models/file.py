@@ -3,7 +3,7 @@ Uploaded File model - tracks files uploaded to projects.
 """
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, JSON, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from backend.app.core.database import Base
@@ -23,8 +23,9 @@ class UploadedFile(Base):
     file_path = Column(String(500), nullable=False)  # Storage path
     file_type = Column(String(50), nullable=False)  # e.g., "pdf", "image", "docx"
     file_size = Column(Integer, nullable=False)  # Size in bytes
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of file content
     
-    status = Column(String(50), default="pending", nullable=False)  # pending, analyzing, completed, failed
+    status = Column(String(50), default="pending", nullable=False)  # pending, queued, analyzing, completed, failed
     analysis_result = Column(String(1000), nullable=True)  # Brief description of analysis
 
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
@@ -35,3 +36,31 @@ class UploadedFile(Base):
     def __repr__(self):
         return f"<UploadedFile(id={self.id}, filename={self.filename})>"
 
+
+
+class FileAnalysis(Base):
+    """
+    File Analysis model.
+    Content-addressed store for the full AI analysis of a file, keyed by
+    (content_hash, model_name, prompt_version), so identical content is
+    analyzed once per model and prompt revision.
+    """
+    __tablename__ = "file_analyses"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "model_name", "prompt_version", name="uq_file_analysis_key"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    content_hash = Column(String(64), nullable=False, index=True)  # SHA-256 of file content
+    model_name = Column(String(100), nullable=False)  # Model that produced the analysis
+    prompt_version = Column(String(50), nullable=False)  # Analysis prompt revision
+    file_type = Column(String(50), nullable=False)
+
+    # Full analysis JSON (summary, entities, ui_info, tech_info, references)
+    analysis = Column(JSON, nullable=False, default=dict)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f"<FileAnalysis(content_hash={self.content_hash[:12]}, model={self.model_name}, prompt={self.prompt_version})>"
@@ -3,11 +3,29 @@ Knowledge Base model - stores structured project context.
 """
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Text, JSON
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Text, JSON, Float
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.orm import relationship
+from pgvector.sqlalchemy import Vector
+from backend.app.core.config import settings
 from backend.app.core.database import Base
 
+# Gemini text-embedding-004 dimension; every embedder must produce vectors of this size
+EMBEDDING_DIMENSION = 768
+
+
+def embedding_column_type():
+    """
+    Column type of DocumentEmbedding.embedding.
+
+    A pgvector column when pgvector does the search (settings.use_pgvector);
+    otherwise a plain float array, so the app also runs on Postgres without
+    the extension and the in-process index (VECTOR_INDEX=memory) searches.
+    """
+    if settings.use_pgvector:
+        return Vector(EMBEDDING_DIMENSION)
+    return ARRAY(Float)
+
 
 class KnowledgeBase(Base):
     """
@@ -58,19 +76,26 @@ class DocumentEmbedding(Base):
     Stores vector embeddings of uploaded documents for semantic search.
     """
     __tablename__ = "document_embeddings"
+    # The HNSW index (pgvector >= 0.5) is not declared here, so create_all
+    # also works on older pgvector; it is created by
+    # add_document_embedding_vectors.py when settings.use_pgvector.
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    knowledge_base_id = Column(UUID(as_uuid=True), ForeignKey("knowledge_bases.id", ondelete="CASCADE"), nullable=False)
+    knowledge_base_id = Column(UUID(as_uuid=True), ForeignKey("knowledge_bases.id", ondelete="CASCADE"), nullable=True)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    file_id = Column(UUID(as_uuid=True), ForeignKey("uploaded_files.id", ondelete="CASCADE"), nullable=True, index=True)
     
     source_file = Column(String(255), nullable=False)  # Original filename
     chunk_text = Column(Text, nullable=False)  # Text chunk
     chunk_index = Column(Integer, nullable=False)  # Order in the document
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of the source file
     
-    # Vector embedding (using pgvector extension)
+    # Vector embedding (pgvector column, or float array without pgvector)
     # Note: Gemini embedding dimension is 768
-    # embedding = Column(Vector(768), nullable=False)  # Will be added after pgvector setup
+    embedding = Column(embedding_column_type(), nullable=False)
+    embedding_model = Column(String(100), nullable=False)  # Embedder that produced the vector
     
-    meta_data = Column(JSON, nullable=True, default=dict)  # Additional metadata
+    meta_data = Column(JSON, nullable=True, default=dict)  # Additional metadata (page_number, ...)
 
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     
@@ -79,4 +104,3 @@ class DocumentEmbedding(Base):
     
     def __repr__(self):
         return f"<DocumentEmbedding(id={self.id}, source_file={self.source_file})>"
-
@@ -35,3 +35,38 @@ class FileAnalysisResponse(BaseModel):
     analysis: Optional[dict]
     message: str
 
+
+
+class BatchAnalysisItem(BaseModel):
+    """Outcome of one file in a batch analysis."""
+    file_id: UUID
+    filename: Optional[str]
+    status: str  # completed, failed
+    error: Optional[str] = None
+    duration_ms: Optional[float] = None
+
+
+class BatchAnalysisResponse(BaseModel):
+    """Schema for project-level batch analysis result."""
+    project_id: UUID
+    total: int
+    completed: int
+    failed: int
+    duration_ms: float
+    results: list[BatchAnalysisItem]
+
+
+class UploadSessionCreate(BaseModel):
+    """Schema for starting a resumable upload."""
+    project_id: UUID
+    filename: str = Field(..., min_length=1, max_length=255)
+    total_size: int = Field(..., gt=0, description="Total file size in bytes")
+
+
+class UploadSessionResponse(BaseModel):
+    """Schema for resumable upload session state."""
+    upload_id: str
+    project_id: UUID
+    filename: str
+    total_size: int
+    received_bytes: int = Field(..., description="Offset the next part must start at")
@@ -3,9 +3,15 @@ Abstract base class for AI services.
 Defines unified interface for different AI providers (Gemini, OpenAI, Claude).
 """
 from abc import ABC, abstractmethod
+from collections import deque
 from typing import Optional, List, Dict, Any, AsyncGenerator
 from dataclasses import dataclass
 from datetime import datetime
+from backend.app.core.metrics import metrics
+
+# Usage records kept per service instance; long-lived services drop the oldest
+# (process-wide totals are kept by the ai.<provider>.* metrics counters)
+MAX_USAGE_RECORDS = 10000
 
 
 @dataclass
@@ -17,6 +23,8 @@ class AIUsageStats:
     total_tokens: int
     estimated_cost: float  # in USD
     timestamp: datetime
+    cached_prompt_tokens: int = 0  # Part of prompt_tokens read from the provider's prompt cache
+    cache_write_tokens: int = 0  # Part of prompt_tokens written to the prompt cache (Claude bills these at a premium)
 
 
 @dataclass
@@ -25,6 +33,7 @@ class AIMessage:
     role: str  # "system", "user", "assistant"
     content: str
     images: Optional[List[str]] = None  # Image paths or URLs
+    cache: bool = False  # Cache breakpoint: the prompt up to and including this message repeats across calls
 
 
 class AIServiceBase(ABC):
@@ -45,7 +54,7 @@ class AIServiceBase(ABC):
         """
         self.model_name = model_name
         self.api_key = api_key
-        self._usage_stats: List[AIUsageStats] = []
+        self._usage_stats: "deque[AIUsageStats]" = deque(maxlen=MAX_USAGE_RECORDS)
 
     @property
     @abstractmethod
@@ -173,6 +182,10 @@ class AIServiceBase(ABC):
             stats: Usage statistics to record
         """
         self._usage_stats.append(stats)
+        provider = self.provider_name.lower()
+        metrics.increment(f"ai.{provider}.prompt_tokens", stats.prompt_tokens)
+        metrics.increment(f"ai.{provider}.cached_prompt_tokens", stats.cached_prompt_tokens)
+        metrics.increment(f"ai.{provider}.cache_write_tokens", stats.cache_write_tokens)
 
     def get_usage_stats(self) -> List[AIUsageStats]:
         """
@@ -181,7 +194,11 @@ class AIServiceBase(ABC):
         Returns:
             List of usage statistics
         """
-        return self._usage_stats.copy()
+        return list(self._usage_stats)
+
+    def clear_usage_stats(self) -> None:
+        """Drop all recorded usage statistics."""
+        self._usage_stats.clear()
 
     def get_total_cost(self) -> float:
         """
@@ -201,14 +218,31 @@ class AIServiceBase(ABC):
         """
         return sum(stat.total_tokens for stat in self._usage_stats)
 
+    def get_total_cached_tokens(self) -> int:
+        """
+        Calculate prompt tokens served from the provider's prompt cache.
+
+        Returns:
+            Total cached prompt tokens
+        """
+        return sum(stat.cached_prompt_tokens for stat in self._usage_stats)
+
     @abstractmethod
-    def estimate_cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+    def estimate_cost(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> float:
         """
         Estimate cost for given token usage.
 
         Args:
-            prompt_tokens: Number of prompt tokens
+            prompt_tokens: Number of prompt tokens (including cached ones)
             completion_tokens: Number of completion tokens
+            cached_tokens: Prompt tokens read from the prompt cache
+            cache_write_tokens: Prompt tokens written to the prompt cache
 
         Returns:
             Estimated cost in USD
@@ -1,15 +1,18 @@
 """
 AI Service Factory - manages AI service instances and model selection.
 """
-from typing import Dict, Optional, Literal
+from typing import Dict, Optional, Literal, TYPE_CHECKING
 from backend.app.services.ai_service_base import AIServiceBase
 from backend.app.core.config import settings
 import logging
 
+if TYPE_CHECKING:
+    from backend.app.services.gemini_service import GeminiService
+
 logger = logging.getLogger(__name__)
 
 # Type alias for AI providers
-AIProvider = Literal["gemini", "openai", "claude", "deepseek"]
+AIProvider = Literal["gemini", "openai", "claude", "deepseek", "fake"]
 
 
 class AIServiceFactory:
@@ -88,17 +91,21 @@ class AIServiceFactory:
             return self._create_claude_service()
         elif provider == "deepseek":
             return self._create_deepseek_service()
+        elif provider == "fake":
+            return self._create_fake_service()
         else:
             raise ValueError(f"Unsupported AI provider: {provider}")
 
     def _create_gemini_service(self) -> AIServiceBase:
-        """Create Gemini AI service instance."""
-        from backend.app.services.gemini_service import GeminiService
+        """Get the process-wide Gemini service instance."""
+        from backend.app.services.gemini_service import gemini_service
 
         if not settings.GEMINI_API_KEY:
             raise ValueError("Gemini API key not configured")
 
-        return GeminiService()
+        # Shared with the modules that import gemini_service directly, so
+        # its model pool and usage stats cover every Gemini call
+        return gemini_service
 
     def _create_openai_service(self) -> AIServiceBase:
         """Create OpenAI service instance."""
@@ -136,6 +143,15 @@ class AIServiceFactory:
         model = getattr(settings, 'DEEPSEEK_MODEL', 'deepseek-reasoner')
         return DeepSeekService(model_name=model, api_key=deepseek_key)
 
+    def _create_fake_service(self) -> AIServiceBase:
+        """Create offline fake service instance (debug only)."""
+        from backend.app.services.fake_ai_service import FakeAIService
+
+        if not settings.DEBUG:
+            raise ValueError("Fake AI provider is only available in debug mode")
+
+        return FakeAIService()
+
     def set_provider(self, provider: AIProvider) -> None:
         """
         Set the current AI provider.
@@ -146,7 +162,7 @@ class AIServiceFactory:
         Raises:
             ValueError: If provider is not supported
         """
-        if provider not in ["gemini", "openai", "claude", "deepseek"]:
+        if provider not in ["gemini", "openai", "claude", "deepseek", "fake"]:
             raise ValueError(f"Unsupported AI provider: {provider}")
 
         self._current_provider = provider
@@ -200,6 +216,15 @@ class AIServiceFactory:
             "supports_images": False,
         }
 
+        # Offline fake provider with emulated prompt caching, for local testing
+        if settings.DEBUG:
+            providers["fake"] = {
+                "available": True,
+                "model": "fake-model",
+                "supports_streaming": True,
+                "supports_images": True,
+            }
+
         return providers
 
     def get_usage_summary(self) -> Dict[str, any]:
@@ -224,13 +249,16 @@ class AIServiceFactory:
             summary["by_provider"][provider_name] = {
                 "cost": cost,
                 "tokens": tokens,
+                "cached_prompt_tokens": service.get_total_cached_tokens(),
                 "model": service.model_name,
             }
 
         return summary
 
     def clear_cache(self) -> None:
-        """Clear all cached service instances."""
+        """Clear all cached service instances and their usage statistics."""
+        for service in self._services.values():
+            service.clear_usage_stats()
         self._services.clear()
         logger.info("Cleared AI service cache")
 
@@ -250,3 +278,16 @@ def get_ai_service(provider: Optional[AIProvider] = None) -> AIServiceBase:
         AI service instance
     """
     return ai_factory.get_service(provider)
+
+
+def get_gemini_service() -> "GeminiService":
+    """
+    Shared Gemini service instance.
+
+    For callers that use Gemini-specific methods (image chat, embeddings)
+    rather than the AIServiceBase interface.
+
+    Returns:
+        Gemini service instance
+    """
+    return ai_factory.get_service("gemini")
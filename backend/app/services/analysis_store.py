@@ -0,0 +1,142 @@
+"""
+Content-addressed store for full file analysis results.
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Optional, List, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from backend.app.models.file import UploadedFile, FileAnalysis
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class AnalysisStore:
+    """
+    Stores the complete JSON returned by analyze_document / analyze_image.
+
+    Entries are keyed by (content_hash, model_name, prompt_version), so the
+    same file content is only sent to the LLM again when the model or the
+    analysis prompt changes.
+    """
+
+    @staticmethod
+    def _hash_file(file_path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    async def compute_file_hash(self, file_path: str) -> str:
+        """Compute the SHA-256 of a file without blocking the event loop."""
+        return await asyncio.to_thread(self._hash_file, file_path)
+
+    async def get(
+        self,
+        db: AsyncSession,
+        content_hash: str,
+        model_name: str,
+        prompt_version: str,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Look up a stored analysis.
+
+        Returns:
+            The stored analysis dictionary, or None if this content has not been
+            analyzed with this model and prompt version
+        """
+        result = await db.execute(
+            select(FileAnalysis.analysis)
+            .where(FileAnalysis.content_hash == content_hash)
+            .where(FileAnalysis.model_name == model_name)
+            .where(FileAnalysis.prompt_version == prompt_version)
+        )
+        return result.scalar_one_or_none()
+
+    async def put(
+        self,
+        db: AsyncSession,
+        content_hash: str,
+        model_name: str,
+        prompt_version: str,
+        file_type: str,
+        analysis: Dict[str, Any],
+    ) -> None:
+        """
+        Store an analysis (no-op if an entry for the same key already exists).
+
+        Does not commit; the caller owns the transaction.
+        """
+        try:
+            async with db.begin_nested():
+                db.add(FileAnalysis(
+                    content_hash=content_hash,
+                    model_name=model_name,
+                    prompt_version=prompt_version,
+                    file_type=file_type,
+                    analysis=analysis,
+                ))
+        except IntegrityError:
+            # Another request stored the same analysis first
+            logger.info(f"Analysis for {content_hash[:12]} ({model_name}, {prompt_version}) already stored")
+
+    async def load_file_analyses(
+        self,
+        db: AsyncSession,
+        files: List[UploadedFile],
+        model_name: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Collect full analyses for a set of files in one query.
+
+        For each file, prefers the analysis made with model_name, then the most
+        recent analysis of the same content by any model, and finally falls back
+        to the short summary kept on the UploadedFile row.
+
+        Returns:
+            List of {"filename", "file_type", "analysis"} dictionaries, in the
+            format expected by KnowledgeBuilder.build_knowledge_base
+        """
+        hashes = {f.content_hash for f in files if f.content_hash}
+        by_hash: Dict[str, Dict[str, Any]] = {}
+
+        if hashes:
+            result = await db.execute(
+                select(FileAnalysis)
+                .where(FileAnalysis.content_hash.in_(hashes))
+                .order_by(FileAnalysis.created_at)
+            )
+            for entry in result.scalars().all():
+                current = by_hash.get(entry.content_hash)
+                # Later rows win, except that the requested model always wins
+                if current is None or current["model_name"] != model_name or entry.model_name == model_name:
+                    by_hash[entry.content_hash] = {
+                        "model_name": entry.model_name,
+                        "analysis": entry.analysis,
+                    }
+
+        file_analyses = []
+        for file in files:
+            stored = by_hash.get(file.content_hash) if file.content_hash else None
+            if stored:
+                analysis = stored["analysis"]
+            else:
+                analysis = {"summary": file.analysis_result or "No analysis available"}
+            file_analyses.append({
+                "filename": file.filename,
+                "file_type": file.file_type,
+                "analysis": analysis,
+            })
+
+        reused = sum(1 for f in files if f.content_hash in by_hash)
+        logger.info(f"Loaded {reused}/{len(files)} full file analyses from store")
+        return file_analyses
+
+
+# Global instance
+analysis_store = AnalysisStore()
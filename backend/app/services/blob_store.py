@@ -0,0 +1,358 @@
+"""
+Content-addressed blob storage for uploaded files.
+
+Every upload is stored once under UPLOAD_DIR/blobs/<hash[:2]>/<hash><ext>,
+no matter how many projects it is uploaded to. UploadedFile rows that share a
+content_hash are the blob's references; the blob (and its cached extracted
+text) is removed when the last referencing row is deleted.
+
+Storing a blob and inserting its row, and checking for remaining references
+before deleting it, hold a per-hash Postgres advisory lock, so an upload of
+the same content cannot reference a blob that is being deleted.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple, AsyncIterator
+from uuid import UUID
+import aiofiles
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, text
+from backend.app.core.config import settings
+from backend.app.models.file import UploadedFile
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when streamed upload content exceeds the allowed size."""
+
+
+class BlobStore:
+    """Deduplicated, reference-counted file storage keyed by SHA-256."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def blob_path(self, content_hash: str, ext: str = "") -> str:
+        """Storage path for a blob."""
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}{ext.lower()}")
+
+    def text_cache_path(self, content_hash: str) -> str:
+        """Path of the cached extracted text for a blob."""
+        # Not "<hash>.txt": that is the blob itself for .txt uploads
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}.extracted.txt")
+
+    def page_index_path(self, content_hash: str) -> str:
+        """Path of the page boundaries of the cached extracted text."""
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}.pages.json")
+
+    def _legacy_text_cache_path(self, content_hash: str) -> str:
+        """Where extracted text was cached before it got its own suffix."""
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}.txt")
+
+    def is_blob(self, file_path: str) -> bool:
+        """Whether a stored file path lives inside the blob store."""
+        return os.path.abspath(file_path).startswith(os.path.abspath(self.root) + os.sep)
+
+    @staticmethod
+    def _lock_key(content_hash: str) -> int:
+        # First 64 bits of the hash as a signed bigint
+        return int(content_hash[:16], 16) - (1 << 63)
+
+    async def lock(self, db: AsyncSession, content_hash: str) -> None:
+        """
+        Serialize reference changes of one blob until db's transaction ends.
+
+        Takes a transaction-scoped advisory lock, released on commit or rollback.
+        """
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": self._lock_key(content_hash)})
+
+    def _incoming_path(self) -> str:
+        incoming_dir = os.path.join(self.root, ".incoming")
+        os.makedirs(incoming_dir, exist_ok=True)
+        return os.path.join(incoming_dir, f"{uuid.uuid4()}.part")
+
+    def _commit(self, tmp_path: str, content_hash: str, ext: str) -> Tuple[str, bool]:
+        """Move a fully written temp file to its blob path, or drop it if the blob exists."""
+        path = self.blob_path(content_hash, ext)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            logger.info(f"Blob already stored: {content_hash[:12]}")
+            return path, False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return path, True
+
+    async def save(
+        self,
+        content: bytes,
+        ext: str = "",
+        db: Optional[AsyncSession] = None,
+    ) -> Tuple[str, str, bool]:
+        """
+        Store in-memory file content, skipping the write if identical content exists.
+
+        Args:
+            content: File bytes
+            ext: Original file extension (kept so type detection by suffix works)
+            db: Session that will insert the referencing row; see save_stream
+
+        Returns:
+            Tuple of (content_hash, blob_path, created)
+        """
+        async def single_chunk():
+            yield content
+
+        content_hash, path, created, _ = await self.save_stream(single_chunk(), ext, db=db)
+        return content_hash, path, created
+
+    async def save_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        ext: str = "",
+        max_bytes: Optional[int] = None,
+        db: Optional[AsyncSession] = None,
+    ) -> Tuple[str, str, bool, int]:
+        """
+        Store streamed file content without holding it in memory.
+
+        Chunks are hashed and written to a temp file as they are consumed,
+        and the size limit is checked per chunk, so the stream is abandoned
+        as soon as it crosses the limit. Whether that saves receiving the
+        rest depends on the source: a raw request stream stops there, an
+        UploadFile has already been spooled in full by Starlette.
+
+        Args:
+            chunks: Async iterator of byte chunks
+            ext: Original file extension
+            max_bytes: Optional size limit
+            db: Session that will insert the referencing row; the blob lock is
+                taken in it before the blob is stored, so commit the row in the
+                same transaction
+
+        Returns:
+            Tuple of (content_hash, blob_path, created, size)
+
+        Raises:
+            UploadTooLargeError: If more than max_bytes arrive
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        tmp_path = self._incoming_path()
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+                    sha256.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        content_hash = sha256.hexdigest()
+        if db is not None:
+            try:
+                await self.lock(db, content_hash)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        path, created = self._commit(tmp_path, content_hash, ext)
+        if created:
+            logger.info(f"Stored new blob: {path} ({size} bytes)")
+        return content_hash, path, created, size
+
+    async def adopt_file(
+        self,
+        file_path: str,
+        ext: str = "",
+        db: Optional[AsyncSession] = None,
+    ) -> Tuple[str, str, bool, int]:
+        """
+        Move an already written file (e.g. a completed resumable upload) into the store.
+
+        Args:
+            file_path: File to move
+            ext: Original file extension
+            db: Session that will insert the referencing row; see save_stream
+
+        Returns:
+            Tuple of (content_hash, blob_path, created, size)
+        """
+        def hash_file() -> Tuple[str, int]:
+            sha256 = hashlib.sha256()
+            size = 0
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+                    size += len(chunk)
+            return sha256.hexdigest(), size
+
+        content_hash, size = await asyncio.to_thread(hash_file)
+        if db is not None:
+            await self.lock(db, content_hash)
+        path, created = self._commit(file_path, content_hash, ext)
+        if created:
+            logger.info(f"Stored new blob: {path} ({size} bytes)")
+        return content_hash, path, created, size
+
+    async def reference_count(
+        self,
+        db: AsyncSession,
+        content_hash: str,
+        exclude_file_id: Optional[UUID] = None,
+    ) -> int:
+        """Number of UploadedFile rows referencing a blob."""
+        query = select(func.count(UploadedFile.id)).where(UploadedFile.content_hash == content_hash)
+        if exclude_file_id is not None:
+            query = query.where(UploadedFile.id != exclude_file_id)
+        result = await db.execute(query)
+        return result.scalar() or 0
+
+    async def release(self, db: AsyncSession, content_hash: Optional[str], file_path: str) -> bool:
+        """
+        Delete a blob if no UploadedFile row references it any more.
+
+        Call after the transaction deleting a referencing row has committed.
+        The reference count is checked under the blob lock and the lock is
+        held until the files are gone; the session's transaction is committed
+        at the end to release it.
+
+        Args:
+            db: Database session (with no other pending changes)
+            content_hash: Blob's content hash
+            file_path: Blob path as stored on the deleted row
+
+        Returns:
+            True if the blob was removed from disk
+        """
+        if not content_hash or not self.is_blob(file_path):
+            return False
+
+        await self.lock(db, content_hash)
+        try:
+            remaining = await self.reference_count(db, content_hash)
+            if remaining > 0:
+                logger.info(f"Blob {content_hash[:12]} still has {remaining} reference(s)")
+                return False
+
+            paths = [
+                file_path,
+                self.text_cache_path(content_hash),
+                self.page_index_path(content_hash),
+            ]
+            # Text cached under the old name, unless that name is the blob itself
+            legacy_path = self._legacy_text_cache_path(content_hash)
+            if os.path.abspath(legacy_path) != os.path.abspath(file_path):
+                paths.append(legacy_path)
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            logger.info(f"Deleted unreferenced blob: {file_path}")
+            return True
+        finally:
+            await db.commit()
+
+    async def find_analyzed_duplicate(
+        self,
+        db: AsyncSession,
+        content_hash: str,
+    ) -> Optional[UploadedFile]:
+        """Most recent completed upload with the same content, from any project."""
+        result = await db.execute(
+            select(UploadedFile)
+            .where(UploadedFile.content_hash == content_hash)
+            .where(UploadedFile.status == "completed")
+            .order_by(UploadedFile.created_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def read_cached_text(self, content_hash: str) -> Optional[str]:
+        """Cached extracted text for a blob, if any."""
+        path = self.text_cache_path(content_hash)
+        if not os.path.exists(path):
+            return None
+        async with aiofiles.open(path, "r", encoding="utf-8") as f:
+            return await f.read()
+
+    async def read_cached_pages(self, content_hash: str) -> Optional[List[str]]:
+        """
+        Cached extracted text split into pages, if its page boundaries were cached.
+
+        Returns:
+            Page texts in page order, or None if there is no cached text or
+            it was cached without page boundaries
+        """
+        index_path = self.page_index_path(content_hash)
+        text_path = self.text_cache_path(content_hash)
+        if not os.path.exists(index_path) or not os.path.exists(text_path):
+            return None
+        async with aiofiles.open(index_path, "r", encoding="utf-8") as f:
+            index = json.loads(await f.read())
+        # newline="" so offsets count the characters exactly as written
+        async with aiofiles.open(text_path, "r", encoding="utf-8", newline="") as f:
+            text = await f.read()
+        if index.get("length") != len(text):
+            # The text was re-cached without page boundaries since
+            return None
+        return [text[start:end] for start, end in index["pages"]]
+
+    async def write_page_index(self, content_hash: str, pages: List[Tuple[int, int]], length: int) -> None:
+        """
+        Cache the page boundaries of a blob's extracted text.
+
+        Args:
+            content_hash: SHA-256 of the blob
+            pages: (start, end) character offsets of each page in the cached text
+            length: Length of the cached text the offsets refer to
+        """
+        path = self.page_index_path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+            await f.write(json.dumps({"length": length, "pages": pages}))
+        os.replace(tmp_path, path)
+
+    async def write_cached_text(self, content_hash: str, text: str) -> None:
+        """Cache extracted text for a blob."""
+        path = self.text_cache_path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+            await f.write(text)
+        os.replace(tmp_path, path)
+
+    @asynccontextmanager
+    async def cached_text_writer(self, content_hash: str):
+        """
+        Write extracted text for a blob incrementally.
+
+        Yields an aiofiles handle; the cache entry only appears once the block
+        exits without error, so readers never see a partial text.
+        """
+        path = self.text_cache_path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+                yield f
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+
+
+# Global instance
+blob_store = BlobStore(os.path.join(settings.UPLOAD_DIR, "blobs"))
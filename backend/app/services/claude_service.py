@@ -1,12 +1,17 @@
 """
 Claude API service for AI operations.
 """
+import base64
 import anthropic
 from backend.app.services.ai_service_base import (
     AIServiceBase,
     AIMessage,
     AIUsageStats
 )
+from backend.app.core.config import settings
+from backend.app.services.context_assembler import get_token_counter
+from backend.app.services.llm_cache import llm_cache
+from backend.app.services.single_flight import single_flight
 from typing import Optional, List, Dict, Any, AsyncGenerator
 from datetime import datetime, timezone
 import logging
@@ -14,6 +19,9 @@ import json
 
 logger = logging.getLogger(__name__)
 
+# Prompt cache breakpoints the Messages API accepts per request
+MAX_CACHE_BREAKPOINTS = 4
+
 
 class ClaudeService(AIServiceBase):
     """Service for interacting with Anthropic Claude API."""
@@ -42,6 +50,8 @@ class ClaudeService(AIServiceBase):
     def supports_images(self) -> bool:
         return True  # Claude 3 支持图像
 
+    @llm_cache.cached
+    @single_flight.coalesced
     async def generate_text(
         self,
         prompt: str,
@@ -64,18 +74,8 @@ class ClaudeService(AIServiceBase):
             response = await self.client.messages.create(**kwargs)
 
             # Record usage
-            usage = response.usage
-            if usage:
-                cost = self.estimate_cost(usage.input_tokens, usage.output_tokens)
-                stats = AIUsageStats(
-                    model_name=self.model_name,
-                    prompt_tokens=usage.input_tokens,
-                    completion_tokens=usage.output_tokens,
-                    total_tokens=usage.input_tokens + usage.output_tokens,
-                    estimated_cost=cost,
-                    timestamp=datetime.now(timezone.utc),
-                )
-                self.record_usage(stats)
+            if response.usage:
+                self._record_response_usage(response.usage)
 
             return response.content[0].text
 
@@ -83,6 +83,8 @@ class ClaudeService(AIServiceBase):
             logger.error(f"Error generating text with Claude: {str(e)}")
             raise
 
+    @llm_cache.cached
+    @single_flight.coalesced
     async def chat(
         self,
         messages: List[AIMessage],
@@ -91,67 +93,13 @@ class ClaudeService(AIServiceBase):
     ) -> str:
         """Chat with conversation history."""
         try:
-            # Convert AIMessage to Claude format
-            claude_messages = []
-            system_message = None
-
-            for msg in messages:
-                if msg.role == "system":
-                    system_message = msg.content
-                    continue
-
-                content = msg.content
-                if msg.images and self.supports_images:
-                    # For vision support, include images
-                    content = [{"type": "text", "text": msg.content}]
-                    for img_path in msg.images:
-                        import base64
-                        with open(img_path, "rb") as image_file:
-                            image_data = base64.b64encode(image_file.read()).decode('utf-8')
-
-                        # Detect image type
-                        ext = img_path.lower().split('.')[-1]
-                        media_type = f"image/{ext}" if ext in ["jpeg", "png", "gif", "webp"] else "image/jpeg"
-
-                        content.append({
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": media_type,
-                                "data": image_data,
-                            }
-                        })
-
-                claude_messages.append({
-                    "role": msg.role if msg.role in ["user", "assistant"] else "user",
-                    "content": content
-                })
-
-            kwargs = {
-                "model": self.model_name,
-                "max_tokens": max_tokens or 4096,
-                "temperature": temperature,
-                "messages": claude_messages,
-            }
-
-            if system_message:
-                kwargs["system"] = system_message
+            kwargs = self._build_request(messages, temperature, max_tokens)
 
             response = await self.client.messages.create(**kwargs)
 
             # Record usage
-            usage = response.usage
-            if usage:
-                cost = self.estimate_cost(usage.input_tokens, usage.output_tokens)
-                stats = AIUsageStats(
-                    model_name=self.model_name,
-                    prompt_tokens=usage.input_tokens,
-                    completion_tokens=usage.output_tokens,
-                    total_tokens=usage.input_tokens + usage.output_tokens,
-                    estimated_cost=cost,
-                    timestamp=datetime.now(timezone.utc),
-                )
-                self.record_usage(stats)
+            if response.usage:
+                self._record_response_usage(response.usage)
 
             return response.content[0].text
 
@@ -159,6 +107,7 @@ class ClaudeService(AIServiceBase):
             logger.error(f"Error in Claude chat: {str(e)}")
             raise
 
+    @single_flight.coalesced
     async def chat_stream(
         self,
         messages: List[AIMessage],
@@ -167,31 +116,14 @@ class ClaudeService(AIServiceBase):
     ) -> AsyncGenerator[str, None]:
         """Chat with streaming response."""
         try:
-            claude_messages = []
-            system_message = None
-
-            for msg in messages:
-                if msg.role == "system":
-                    system_message = msg.content
-                    continue
-                claude_messages.append({
-                    "role": msg.role if msg.role in ["user", "assistant"] else "user",
-                    "content": msg.content
-                })
-
-            kwargs = {
-                "model": self.model_name,
-                "max_tokens": max_tokens or 4096,
-                "temperature": temperature,
-                "messages": claude_messages,
-            }
-
-            if system_message:
-                kwargs["system"] = system_message
+            kwargs = self._build_request(messages, temperature, max_tokens)
 
             async with self.client.messages.stream(**kwargs) as stream:
                 async for text in stream.text_stream:
                     yield text
+                final_message = await stream.get_final_message()
+                if final_message.usage:
+                    self._record_response_usage(final_message.usage)
 
         except Exception as e:
             logger.error(f"Error in Claude streaming chat: {str(e)}")
@@ -209,7 +141,7 @@ class ClaudeService(AIServiceBase):
 
 文档类型：{document_type}
 文档内容：
-{document_content[:8000]}
+{get_token_counter("claude").truncate(document_content, settings.ANALYSIS_DOCUMENT_TOKENS)}
 
 请以JSON格式返回分析结果，包括：
 1. 文档概述（summary）
@@ -282,7 +214,101 @@ class ClaudeService(AIServiceBase):
         except json.JSONDecodeError:
             return {"description": response}
 
-    def estimate_cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+    def _build_request(
+        self,
+        messages: List[AIMessage],
+        temperature: float,
+        max_tokens: Optional[int],
+    ) -> Dict[str, Any]:
+        """
+        Convert messages to Messages API arguments.
+
+        Messages flagged with cache=True become prompt cache breakpoints: the
+        prefix up to them (system prompt first) is cached for five minutes
+        and billed at a tenth of the input price when reused. Claude allows
+        MAX_CACHE_BREAKPOINTS per request, so only the last ones are kept.
+        """
+        breakpoints = [i for i, msg in enumerate(messages) if msg.cache][-MAX_CACHE_BREAKPOINTS:]
+
+        claude_messages = []
+        system_blocks = []
+
+        for i, msg in enumerate(messages):
+            cache_control = {"cache_control": {"type": "ephemeral"}} if i in breakpoints else {}
+
+            if msg.role == "system":
+                system_blocks.append({"type": "text", "text": msg.content, **cache_control})
+                continue
+
+            content = [{"type": "text", "text": msg.content}]
+            if msg.images and self.supports_images:
+                # For vision support, include images
+                for img_path in msg.images:
+                    with open(img_path, "rb") as image_file:
+                        image_data = base64.b64encode(image_file.read()).decode('utf-8')
+
+                    # Detect image type
+                    ext = img_path.lower().split('.')[-1]
+                    media_type = f"image/{ext}" if ext in ["jpeg", "png", "gif", "webp"] else "image/jpeg"
+
+                    content.append({
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": media_type,
+                            "data": image_data,
+                        }
+                    })
+            if cache_control:
+                content[-1].update(cache_control)
+
+            claude_messages.append({
+                "role": msg.role if msg.role in ["user", "assistant"] else "user",
+                "content": content
+            })
+
+        kwargs = {
+            "model": self.model_name,
+            "max_tokens": max_tokens or 4096,
+            "temperature": temperature,
+            "messages": claude_messages,
+        }
+
+        if system_blocks:
+            kwargs["system"] = system_blocks
+
+        return kwargs
+
+    def _record_response_usage(self, usage: Any) -> None:
+        """Record a response's token usage, including prompt cache reads and writes."""
+        # input_tokens only counts the uncached part of the prompt
+        cached_tokens = getattr(usage, "cache_read_input_tokens", 0) or 0
+        cache_write_tokens = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        prompt_tokens = usage.input_tokens + cached_tokens + cache_write_tokens
+        cost = self.estimate_cost(
+            prompt_tokens,
+            usage.output_tokens,
+            cached_tokens=cached_tokens,
+            cache_write_tokens=cache_write_tokens,
+        )
+        self.record_usage(AIUsageStats(
+            model_name=self.model_name,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=usage.output_tokens,
+            total_tokens=prompt_tokens + usage.output_tokens,
+            estimated_cost=cost,
+            timestamp=datetime.now(timezone.utc),
+            cached_prompt_tokens=cached_tokens,
+            cache_write_tokens=cache_write_tokens,
+        ))
+
+    def estimate_cost(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> float:
         """
         Estimate cost for Claude API usage.
 
@@ -290,9 +316,17 @@ class ClaudeService(AIServiceBase):
         - Claude 3.5 Sonnet: $0.003/1K input, $0.015/1K output
         - Claude 3 Opus: $0.015/1K input, $0.075/1K output
         - Claude 3 Haiku: $0.00025/1K input, $0.00125/1K output
+        - Prompt cache reads cost 0.1x and cache writes 1.25x the input price
         """
         model_lower = self.model_name.lower()
 
+        # Both are part of prompt_tokens; weight them by their price multiplier
+        prompt_tokens = (
+            prompt_tokens - cached_tokens - cache_write_tokens
+            + cached_tokens * 0.1
+            + cache_write_tokens * 1.25
+        )
+
         if "sonnet" in model_lower:
             prompt_cost = (prompt_tokens / 1000) * 0.003
             completion_cost = (completion_tokens / 1000) * 0.015
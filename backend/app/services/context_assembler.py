@@ -0,0 +1,217 @@
+"""
+Token-budgeted prompt assembly.
+
+Prompt builders used to cut their inputs by characters or item counts
+(`context[:15000]`, `messages[-10:]`), which wastes paid context on short
+inputs and can still overflow on dense ones. Here each input is a slot with
+a priority; ContextAssembler counts tokens for the target provider and
+fills the slots in priority order until the budget is spent.
+
+OpenAI and DeepSeek are counted with tiktoken when it is installed; Claude
+uses the cl100k encoding as an approximation. Gemini has no local
+tokenizer, so its counts (and everything when tiktoken is missing) use the
+CJK-aware estimate from core.metrics.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from backend.app.core.config import settings
+from backend.app.core.metrics import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    logger.warning("tiktoken not installed, prompt token counts are estimated")
+
+# Appended (or prepended) where text was cut to fit
+TRUNCATION_MARK = "\n...（内容过长，已截断）"
+
+# A partially fitting item is only included if at least this many tokens of it fit
+MIN_PARTIAL_TOKENS = 64
+
+
+class TokenCounter:
+    """Counts and truncates text in a provider's tokens."""
+
+    def __init__(self, provider: str = "gemini"):
+        self.provider = provider
+        self._encoding = None
+        if TIKTOKEN_AVAILABLE and provider in ("openai", "deepseek", "claude"):
+            try:
+                if provider == "openai":
+                    self._encoding = tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+                else:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from a real tokenizer rather than the estimate."""
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        """Tokens in text."""
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "head") -> str:
+        """
+        Cut text to at most max_tokens, marking the cut.
+
+        Args:
+            text: Text to cut
+            max_tokens: Token limit including the truncation mark
+            keep: "head" keeps the beginning, "tail" keeps the end
+
+        Returns:
+            text unchanged if it fits, otherwise the kept part plus the mark
+        """
+        if self.count(text) <= max_tokens:
+            return text
+        limit = max_tokens - self.count(TRUNCATION_MARK)
+        if limit <= 0:
+            return ""
+
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            kept = tokens[:limit] if keep == "head" else tokens[-limit:]
+            cut = self._encoding.decode(kept)
+        else:
+            # The estimate grows monotonically with length, so binary search the cut
+            low, high = 0, len(text)
+            while low < high:
+                mid = (low + high + 1) // 2
+                part = text[:mid] if keep == "head" else text[len(text) - mid:]
+                if estimate_tokens(part) <= limit:
+                    low = mid
+                else:
+                    high = mid - 1
+            cut = text[:low] if keep == "head" else text[len(text) - low:]
+
+        return cut + TRUNCATION_MARK if keep == "head" else TRUNCATION_MARK.lstrip("\n") + "\n" + cut
+
+
+_counters: Dict[str, TokenCounter] = {}
+
+
+def get_token_counter(provider: Optional[str] = None) -> TokenCounter:
+    """Shared TokenCounter for a provider (default: DEFAULT_AI_PROVIDER)."""
+    provider = provider or settings.DEFAULT_AI_PROVIDER
+    counter = _counters.get(provider)
+    if counter is None:
+        counter = TokenCounter(provider)
+        _counters[provider] = counter
+    return counter
+
+
+@dataclass
+class ContextSlot:
+    """
+    One input of a prompt.
+
+    content is either a single text or a list of items (messages,
+    requirements, file summaries). Lists are filled item by item from the
+    preferred end and keep their original order in the output.
+    """
+    name: str
+    content: Union[str, Sequence[str]]
+    priority: int = 0  # Lower fills first
+    max_tokens: Optional[int] = None  # Cap for this slot on top of the overall budget
+    required: bool = False  # Always included in full (system prompt, user message)
+    keep: str = "head"  # "head" or "tail": which end survives truncation
+    separator: str = "\n"
+
+
+@dataclass
+class AssembledContext:
+    """Result of filling slots: text per slot plus the token accounting."""
+    parts: Dict[str, str] = field(default_factory=dict)
+    items: Dict[str, List[str]] = field(default_factory=dict)  # Included items of list slots
+    tokens: Dict[str, int] = field(default_factory=dict)
+    truncated: List[str] = field(default_factory=list)  # Slots that did not fit whole
+    budget: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens.values())
+
+    def __getitem__(self, name: str) -> str:
+        return self.parts.get(name, "")
+
+
+class ContextAssembler:
+    """Fills prompt slots by priority within a token budget."""
+
+    def __init__(self, budget: int, provider: Optional[str] = None):
+        self.budget = budget
+        self.counter = get_token_counter(provider)
+
+    def assemble(self, slots: Sequence[ContextSlot]) -> AssembledContext:
+        """
+        Fill slots within the budget.
+
+        Required slots are counted first and never cut. The others are
+        filled in priority order with whatever budget is left, each up to
+        its own max_tokens.
+        """
+        result = AssembledContext(budget=self.budget)
+        remaining = self.budget
+
+        for slot in slots:
+            if slot.required:
+                text = slot.content if isinstance(slot.content, str) else slot.separator.join(slot.content)
+                result.parts[slot.name] = text
+                result.tokens[slot.name] = self.counter.count(text)
+                remaining -= result.tokens[slot.name]
+
+        for slot in sorted((s for s in slots if not s.required), key=lambda s: s.priority):
+            allowance = max(0, remaining)
+            if slot.max_tokens is not None:
+                allowance = min(allowance, slot.max_tokens)
+
+            if isinstance(slot.content, str):
+                text = self.counter.truncate(slot.content, allowance, keep=slot.keep)
+                if text != slot.content:
+                    result.truncated.append(slot.name)
+            else:
+                items, cut = self._fill_items(slot, allowance)
+                if cut:
+                    result.truncated.append(slot.name)
+                result.items[slot.name] = items
+                text = slot.separator.join(items)
+
+            result.parts[slot.name] = text
+            result.tokens[slot.name] = self.counter.count(text)
+            remaining -= result.tokens[slot.name]
+
+        if result.truncated:
+            logger.debug(f"Context budget {self.budget} cut slots: {', '.join(result.truncated)}")
+        return result
+
+    def _fill_items(self, slot: ContextSlot, allowance: int) -> Tuple[List[str], bool]:
+        """Items of a list slot that fit, in their original order, and whether any were cut."""
+        separator_tokens = self.counter.count(slot.separator)
+        ordered = list(slot.content) if slot.keep == "head" else list(reversed(slot.content))
+        chosen: List[str] = []
+        used = 0
+        for item in ordered:
+            cost = self.counter.count(item) + (separator_tokens if chosen else 0)
+            if used + cost <= allowance:
+                chosen.append(item)
+                used += cost
+                continue
+            # Cut the first item that does not fit if a useful part of it does
+            room = allowance - used - (separator_tokens if chosen else 0)
+            if room >= MIN_PARTIAL_TOKENS:
+                chosen.append(self.counter.truncate(item, room, keep=slot.keep))
+            break
+        cut = len(chosen) < len(ordered) or (chosen and chosen[-1] is not ordered[len(chosen) - 1])
+        return (chosen if slot.keep == "head" else list(reversed(chosen))), bool(cut)
@@ -0,0 +1,244 @@
+"""
+Rolling conversation summaries.
+
+Instead of sending the last 50 raw messages on every chat turn, older turns
+are folded into Conversation.summary in the background and only the
+messages after Conversation.summary_through_sequence go out verbatim.
+
+Folding starts once those messages exceed CHAT_HISTORY_TOKEN_BUDGET and
+keeps the newest half of the budget verbatim, so the summary is rewritten
+every few turns rather than after each one and the history sent per turn
+stays between half and the full budget, plus the summary.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Set
+from uuid import UUID
+from sqlalchemy import select, update
+from backend.app.core.config import settings
+from backend.app.core.database import AsyncSessionLocal
+from backend.app.core.metrics import metrics, estimate_tokens
+from backend.app.models.conversation import Conversation, Message
+from backend.app.services.ai_service_factory import get_gemini_service
+from backend.app.services.gemini_service import GeminiService
+
+logger = logging.getLogger(__name__)
+
+# Longest excerpt of a single message put into the summarization prompt
+MAX_MESSAGE_CHARS = 4000
+
+# Summarization calls per background run; very long existing conversations
+# catch up over a few turns instead of in one burst
+MAX_FOLDS_PER_RUN = 4
+
+SUMMARY_PROMPT = """你负责为一次产品需求（PRD）讨论维护一份滚动摘要，供后续对话作为上下文使用。
+
+已有摘要：
+{summary}
+
+新增的对话记录：
+{transcript}
+
+请将新增对话合并进已有摘要，输出更新后的完整摘要：
+- 保留已确认的需求、功能点、业务规则、数据字段和约束条件
+- 保留用户做出的决定、否定的方案以及尚未解决的问题
+- 省略寒暄和重复内容，不要编造对话中没有的信息
+- 使用简洁的 Markdown 列表，总长度不超过约 {max_tokens} 字
+- 只输出摘要正文
+"""
+
+
+@dataclass
+class PendingMessage:
+    """A message not yet covered by the summary."""
+    sequence: int
+    role: str
+    content: str
+    tokens: int
+
+
+def plan_fold(
+    messages: Sequence[PendingMessage],
+    budget: int,
+    min_recent: int,
+    max_fold_tokens: Optional[int] = None,
+) -> int:
+    """
+    Number of leading messages to fold into the summary.
+
+    Nothing is folded while the messages fit in the budget. Otherwise the
+    newest messages worth half the budget (at least min_recent of them)
+    stay verbatim. The cut is moved back onto a user message so a question
+    and its answer are never split.
+
+    Args:
+        messages: Unsummarized messages in chronological order
+        budget: History token budget
+        min_recent: Messages always kept verbatim
+        max_fold_tokens: Cap on the tokens folded in one step
+
+    Returns:
+        Count of messages to fold, 0 if none
+    """
+    if len(messages) <= min_recent or sum(m.tokens for m in messages) <= budget:
+        return 0
+
+    kept = 0
+    kept_tokens = 0
+    for message in reversed(messages):
+        if kept >= min_recent and kept_tokens + message.tokens > budget // 2:
+            break
+        kept += 1
+        kept_tokens += message.tokens
+    fold_count = len(messages) - kept
+
+    if max_fold_tokens is not None:
+        folded_tokens = 0
+        for i, message in enumerate(messages[:fold_count]):
+            folded_tokens += message.tokens
+            if folded_tokens > max_fold_tokens:
+                fold_count = max(i, 1)
+                break
+
+    cut = fold_count
+    while 0 < cut < len(messages) and messages[cut].role != "user":
+        cut -= 1
+    return cut or fold_count
+
+
+def _transcript(messages: Sequence[PendingMessage]) -> str:
+    lines = []
+    for message in messages:
+        speaker = "用户" if message.role == "user" else "助手"
+        content = message.content
+        if len(content) > MAX_MESSAGE_CHARS:
+            content = content[:MAX_MESSAGE_CHARS] + "\n...（已截断）"
+        lines.append(f"{speaker}：{content}")
+    return "\n\n".join(lines)
+
+
+class ConversationSummarizer:
+    """Folds older turns of conversations into their running summary."""
+
+    def __init__(self):
+        self._in_flight: Set[UUID] = set()
+        # Strong references so pending tasks are not garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def gemini_service(self) -> GeminiService:
+        return get_gemini_service()
+
+    def schedule(self, conversation_id: UUID) -> None:
+        """
+        Fold a conversation's older turns in the background if it is over budget.
+
+        Call after a chat turn has been committed. Does nothing if a fold for
+        the conversation is already running in this process.
+        """
+        if not settings.CHAT_SUMMARY_ENABLED or conversation_id in self._in_flight:
+            return
+        self._in_flight.add(conversation_id)
+        task = asyncio.create_task(self._run(conversation_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, conversation_id: UUID) -> None:
+        try:
+            for _ in range(MAX_FOLDS_PER_RUN):
+                if not await self.fold(conversation_id):
+                    break
+        except Exception as e:
+            metrics.increment("conversation_summary.failures")
+            logger.warning(f"Failed to summarize conversation {conversation_id}: {str(e)}")
+        finally:
+            self._in_flight.discard(conversation_id)
+
+    async def fold(self, conversation_id: UUID) -> bool:
+        """
+        Fold one batch of older messages into the conversation summary.
+
+        The summary is written only if no other worker moved the watermark in
+        the meantime.
+
+        Returns:
+            True if the summary was updated
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Conversation.summary, Conversation.summary_through_sequence)
+                .where(Conversation.id == conversation_id)
+            )
+            row = result.one_or_none()
+            if row is None:
+                return False
+            summary, through_sequence = row.summary, row.summary_through_sequence or 0
+
+            result = await db.execute(
+                select(Message.sequence, Message.role, Message.content)
+                .where(Message.conversation_id == conversation_id)
+                .where(Message.sequence > through_sequence)
+                .order_by(Message.sequence)
+            )
+            pending: List[PendingMessage] = [
+                PendingMessage(r.sequence, r.role, r.content, estimate_tokens(r.content))
+                for r in result.all()
+            ]
+
+        budget = settings.CHAT_HISTORY_TOKEN_BUDGET
+        fold_count = plan_fold(
+            pending,
+            budget=budget,
+            min_recent=settings.CHAT_RECENT_MIN_MESSAGES,
+            max_fold_tokens=budget * 2,
+        )
+        if fold_count == 0:
+            return False
+        folded = pending[:fold_count]
+
+        # No transaction is held open while the model writes the summary
+        started = time.perf_counter()
+        new_summary = await self.gemini_service.generate_text(
+            SUMMARY_PROMPT.format(
+                summary=summary or "（暂无）",
+                transcript=_transcript(folded),
+                max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+            ),
+            temperature=0.3,
+        )
+        new_summary = new_summary.strip()
+        if not new_summary:
+            raise ValueError("Empty summary returned")
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .where(Conversation.summary_through_sequence == through_sequence)
+                # Background bookkeeping must not reorder the conversation list
+                .values(
+                    summary=new_summary,
+                    summary_through_sequence=folded[-1].sequence,
+                    updated_at=Conversation.updated_at,
+                )
+            )
+            await db.commit()
+
+        if result.rowcount == 0:
+            logger.info(f"Summary of conversation {conversation_id} was updated concurrently, discarding")
+            return False
+
+        metrics.observe("conversation_summary.duration_ms", (time.perf_counter() - started) * 1000)
+        metrics.observe("conversation_summary.tokens", estimate_tokens(new_summary))
+        metrics.increment("conversation_summary.folds")
+        logger.info(
+            f"Folded {len(folded)} messages (through #{folded[-1].sequence}) into the summary "
+            f"of conversation {conversation_id}"
+        )
+        return True
+
+
+# Global instance
+conversation_summarizer = ConversationSummarizer()
@@ -7,12 +7,29 @@ from uuid import UUID
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
+from backend.app.core.config import settings
+from backend.app.core.metrics import metrics
 from backend.app.models.conversation import Conversation, Message
 from backend.app.models.knowledge_base import KnowledgeBase
+from backend.app.services.context_assembler import ContextAssembler, ContextSlot
 from backend.app.services.gemini_service import GeminiService
+from backend.app.services.kb_context import kb_context_cache
 
 logger = logging.getLogger(__name__)
 
+CHAT_SYSTEM_PROMPT = """你是一个专业的产品需求文档（PRD）写作助手。你的任务是：
+1. 理解用户的需求描述
+2. 基于项目知识库提出必要的澄清问题
+3. 帮助用户完善需求细节
+4. 最终生成结构化的PRD文档
+
+请遵循以下原则：
+- 提问要具体、有针对性
+- 参考项目知识库中的UI规范和技术约定
+- 使用Markdown格式输出
+- 保持专业但友好的语气
+"""
+
 
 class ConversationService:
     """Service for managing conversations and AI dialogue."""
@@ -24,30 +41,33 @@ class ConversationService:
         self,
         db: AsyncSession,
         conversation_id: UUID,
-        max_messages: int = 50
+        max_messages: int = 50,
+        after_sequence: int = 0
     ) -> List[Dict[str, str]]:
         """
         Get recent conversation history for context.
 
-        Enhanced from 10 to 50 messages for better context retention.
-        The AI model can now reference much longer conversation histories,
-        leading to more coherent and context-aware responses.
+        Older turns are folded into Conversation.summary in the background
+        (see conversation_memory), so callers pass the summary's watermark as
+        after_sequence and only the messages since then are returned.
 
         Args:
             db: Database session
             conversation_id: Conversation ID
             max_messages: Maximum number of recent messages to include (default: 50)
+            after_sequence: Only include messages with a higher sequence
 
         Returns:
             List of message dictionaries with role and content
         """
         result = await db.execute(
-            select(Message)
+            select(Message.role, Message.content)
             .where(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.desc())
+            .where(Message.sequence > after_sequence)
+            .order_by(Message.sequence.desc())
             .limit(max_messages)
         )
-        messages = result.scalars().all()
+        messages = result.all()
         
         # Reverse to get chronological order
         return [
@@ -55,6 +75,104 @@ class ConversationService:
             for msg in reversed(messages)
         ]
     
+    async def build_chat_messages(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        conversation_id: UUID,
+        user_message: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Assemble the prompt for a chat turn.
+
+        The system message carries the instructions and the knowledge base
+        and is marked as a prompt cache breakpoint. It is followed by the
+        messages since the running summary and the current user message,
+        which is prefixed with the summary and the archived requirements most
+        relevant to it.
+
+        Args:
+            db: Database session
+            project_id: Project ID
+            conversation_id: Conversation ID
+            user_message: User's message
+
+        Returns:
+            Messages for the chat model
+        """
+        # Get knowledge base context
+        kb_context = await self.get_knowledge_base_context(db, project_id)
+
+        # Archived requirements relevant to this message, from the project's search index
+        relevant_history = await kb_context_cache.get_relevant_history(
+            db,
+            project_id,
+            user_message,
+            top_k=settings.CHAT_KB_HISTORY_TOP_K,
+            max_tokens=settings.CHAT_KB_HISTORY_TOKENS,
+        )
+
+        # The endpoint has loaded the conversation already, so this is an identity map hit
+        conversation = await db.get(Conversation, conversation_id)
+        summary = conversation.summary if conversation else None
+        summary_through = (conversation.summary_through_sequence or 0) if conversation else 0
+
+        # Get conversation history since the summary
+        history = await self.get_conversation_context(db, conversation_id, after_sequence=summary_through)
+
+        # The current message is saved before the response is generated; it goes last below
+        if history and history[-1] == {"role": "user", "content": user_message}:
+            history.pop()
+
+        # Fit everything into the prompt budget: instructions and the new
+        # message always, then the knowledge base, the relevant history, the
+        # summary and as many recent messages as are left room for
+        assembled = ContextAssembler(settings.CHAT_PROMPT_TOKEN_BUDGET, provider="gemini").assemble([
+            ContextSlot("instructions", CHAT_SYSTEM_PROMPT, required=True),
+            ContextSlot("user_message", user_message, required=True),
+            ContextSlot("knowledge_base", kb_context or "", priority=0),
+            ContextSlot("relevant_history", relevant_history or "", priority=1),
+            ContextSlot("summary", summary or "", priority=2),
+            ContextSlot("history", [msg["content"] for msg in history], priority=3, keep="tail"),
+        ])
+        kept = assembled.items["history"]
+        history = [
+            {"role": msg["role"], "content": content}
+            for msg, content in zip(history[len(history) - len(kept):], kept)
+        ]
+
+        # Chat history must open with a user turn
+        while history and history[0]["role"] != "user":
+            history.pop(0)
+
+        # Stable prefix first so providers can cache it across turns: the
+        # instructions and knowledge base only change with the KB version,
+        # and the history only grows until the next summary fold. Per-turn
+        # context travels with the new message.
+        system_prompt = CHAT_SYSTEM_PROMPT
+        if assembled["knowledge_base"]:
+            system_prompt += f"\n\n{assembled['knowledge_base']}"
+
+        reference_parts = []
+        if assembled["summary"]:
+            reference_parts.append(f"## 早前对话摘要\n以下是本次对话较早部分的摘要：\n{assembled['summary']}")
+        if assembled["relevant_history"]:
+            reference_parts.append(assembled["relevant_history"])
+        if reference_parts:
+            user_content = "# 参考信息\n\n" + "\n\n".join(reference_parts) + f"\n\n# 用户消息\n{user_message}"
+        else:
+            user_content = user_message
+
+        messages = [{"role": "system", "content": system_prompt, "cache": settings.PROMPT_CACHE_ENABLED}]
+        messages.extend(history)
+        messages.append({"role": "user", "content": user_content})
+
+        metrics.observe("chat.prompt_tokens", assembled.total_tokens)
+        metrics.observe("chat.history_messages", len(history))
+        if assembled.truncated:
+            metrics.increment("chat.prompt_truncations")
+        return messages
+
     async def get_knowledge_base_context(
         self,
         db: AsyncSession,
@@ -70,74 +188,8 @@ class ConversationService:
         Returns:
             Formatted knowledge base context string
         """
-        result = await db.execute(
-            select(KnowledgeBase)
-            .where(KnowledgeBase.project_id == project_id)
-            .where(KnowledgeBase.status == "confirmed")
-        )
-        kb = result.scalar_one_or_none()
-        
-        if not kb:
-            return None
-        
-        # Format knowledge base into context
-        data = kb.structured_data
-        context_parts = ["# 项目知识库\n"]
-        
-        # System overview
-        if data.get("system_overview"):
-            overview = data["system_overview"]
-            context_parts.append("## 系统概览")
-            if overview.get("product_type"):
-                context_parts.append(f"产品类型：{overview['product_type']}")
-            if overview.get("core_modules"):
-                context_parts.append(f"核心模块：{', '.join(overview['core_modules'])}")
-            if overview.get("description"):
-                context_parts.append(f"描述：{overview['description']}")
-            context_parts.append("")
-        
-        # UI standards
-        if data.get("ui_standards"):
-            ui = data["ui_standards"]
-            context_parts.append("## UI规范")
-            if ui.get("primary_colors"):
-                context_parts.append(f"主色调：{', '.join(ui['primary_colors'])}")
-            if ui.get("component_library"):
-                context_parts.append(f"组件库：{ui['component_library']}")
-            if ui.get("layout_features"):
-                context_parts.append(f"布局特征：{', '.join(ui['layout_features'])}")
-            context_parts.append("")
-        
-        # Tech conventions
-        if data.get("tech_conventions"):
-            tech = data["tech_conventions"]
-            context_parts.append("## 技术约定")
-            if tech.get("naming_style"):
-                context_parts.append(f"命名风格：{tech['naming_style']}")
-            if tech.get("api_style"):
-                context_parts.append(f"API风格：{tech['api_style']}")
-            if tech.get("known_fields"):
-                context_parts.append("已知字段：")
-                for field in tech["known_fields"][:5]:  # Limit to 5 fields
-                    context_parts.append(f"  - {field.get('name')}: {field.get('type')} - {field.get('usage')}")
-            context_parts.append("")
-
-        # Completed requirements (history)
-        if data.get("completed_requirements"):
-            requirements = data["completed_requirements"]
-            context_parts.append("## 已完成需求")
-            context_parts.append("以下是项目中已经确认和完成的需求，请在设计新需求时参考这些内容，避免冲突或重复：")
-            context_parts.append("")
-            for idx, req in enumerate(requirements[-5:], 1):  # Show last 5 requirements
-                context_parts.append(f"### {idx}. {req.get('title', '未命名需求')}")
-                context_parts.append(f"**描述**: {req.get('description', '暂无描述')}")
-                if req.get('key_points'):
-                    context_parts.append("**关键要点**:")
-                    for point in req['key_points']:
-                        context_parts.append(f"  - {point}")
-                context_parts.append("")
-
-        return "\n".join(context_parts)
+        # Rendered once per KB version and shared across turns
+        return await kb_context_cache.get_context(db, project_id, "chat")
     
     async def generate_ai_response(
         self,
@@ -159,39 +211,8 @@ class ConversationService:
         Returns:
             AI-generated response
         """
-        # Get knowledge base context
-        kb_context = await self.get_knowledge_base_context(db, project_id)
-        
-        # Get conversation history
-        history = await self.get_conversation_context(db, conversation_id)
-        
-        # Build system prompt
-        system_prompt = """你是一个专业的产品需求文档（PRD）写作助手。你的任务是：
-1. 理解用户的需求描述
-2. 基于项目知识库提出必要的澄清问题
-3. 帮助用户完善需求细节
-4. 最终生成结构化的PRD文档
+        messages = await self.build_chat_messages(db, project_id, conversation_id, user_message)
 
-请遵循以下原则：
-- 提问要具体、有针对性
-- 参考项目知识库中的UI规范和技术约定
-- 使用Markdown格式输出
-- 保持专业但友好的语气
-"""
-        
-        if kb_context:
-            system_prompt += f"\n\n{kb_context}"
-        
-        # Prepare messages for Gemini
-        messages = [{"role": "user", "content": system_prompt}]
-        
-        # Add conversation history
-        for msg in history:
-            messages.append(msg)
-        
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
-        
         # Generate response using Gemini with optional images
         try:
             response = await self.gemini_service.chat(
@@ -225,38 +246,7 @@ class ConversationService:
         Yields:
             Text chunks as they are generated
         """
-        # Get knowledge base context
-        kb_context = await self.get_knowledge_base_context(db, project_id)
-
-        # Get conversation history
-        history = await self.get_conversation_context(db, conversation_id)
-
-        # Build system prompt
-        system_prompt = """你是一个专业的产品需求文档（PRD）写作助手。你的任务是：
-1. 理解用户的需求描述
-2. 基于项目知识库提出必要的澄清问题
-3. 帮助用户完善需求细节
-4. 最终生成结构化的PRD文档
-
-请遵循以下原则：
-- 提问要具体、有针对性
-- 参考项目知识库中的UI规范和技术约定
-- 使用Markdown格式输出
-- 保持专业但友好的语气
-"""
-
-        if kb_context:
-            system_prompt += f"\n\n{kb_context}"
-
-        # Prepare messages for Gemini
-        messages = [{"role": "user", "content": system_prompt}]
-
-        # Add conversation history
-        for msg in history:
-            messages.append(msg)
-
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
+        messages = await self.build_chat_messages(db, project_id, conversation_id, user_message)
 
         # Generate response using Gemini with streaming
         try:
@@ -360,7 +350,8 @@ class ConversationService:
 
 只返回JSON，不要其他内容。"""
 
-            summary_text = await self.gemini_service.generate_text(prompt)
+            # Same conversation, same prompt: an unchanged conversation is summarized once
+            summary_text = await self.gemini_service.generate_text(prompt, cache=True)
 
             # Parse JSON from response (handle markdown code blocks)
             import json
@@ -434,6 +425,8 @@ class ConversationService:
         # Mark as modified to ensure SQLAlchemy tracks the change
         from sqlalchemy.orm.attributes import flag_modified
         flag_modified(kb, "structured_data")
+        # New version so caches and search indexes keyed on it pick up the change
+        kb.version += 1
 
         logger.info(f"Archived requirement from conversation {conversation_id} to knowledge base")
 
@@ -7,6 +7,10 @@ from backend.app.services.ai_service_base import (
     AIMessage,
     AIUsageStats
 )
+from backend.app.core.config import settings
+from backend.app.services.context_assembler import get_token_counter
+from backend.app.services.llm_cache import llm_cache
+from backend.app.services.single_flight import single_flight
 from typing import Optional, List, Dict, Any, AsyncGenerator
 from datetime import datetime, timezone
 import logging
@@ -47,6 +51,8 @@ class DeepSeekService(AIServiceBase):
         # DeepSeek currently doesn't support image analysis
         return False
 
+    @llm_cache.cached
+    @single_flight.coalesced
     async def generate_text(
         self,
         prompt: str,
@@ -69,18 +75,8 @@ class DeepSeekService(AIServiceBase):
             )
 
             # Record usage
-            usage = response.usage
-            if usage:
-                cost = self.estimate_cost(usage.prompt_tokens, usage.completion_tokens)
-                stats = AIUsageStats(
-                    model_name=self.model_name,
-                    prompt_tokens=usage.prompt_tokens,
-                    completion_tokens=usage.completion_tokens,
-                    total_tokens=usage.total_tokens,
-                    estimated_cost=cost,
-                    timestamp=datetime.now(timezone.utc),
-                )
-                self.record_usage(stats)
+            if response.usage:
+                self._record_response_usage(response.usage)
 
             return response.choices[0].message.content
 
@@ -88,6 +84,8 @@ class DeepSeekService(AIServiceBase):
             logger.error(f"Error generating text with DeepSeek: {str(e)}")
             raise
 
+    @llm_cache.cached
+    @single_flight.coalesced
     async def chat(
         self,
         messages: List[AIMessage],
@@ -109,18 +107,8 @@ class DeepSeekService(AIServiceBase):
             )
 
             # Record usage
-            usage = response.usage
-            if usage:
-                cost = self.estimate_cost(usage.prompt_tokens, usage.completion_tokens)
-                stats = AIUsageStats(
-                    model_name=self.model_name,
-                    prompt_tokens=usage.prompt_tokens,
-                    completion_tokens=usage.completion_tokens,
-                    total_tokens=usage.total_tokens,
-                    estimated_cost=cost,
-                    timestamp=datetime.now(timezone.utc),
-                )
-                self.record_usage(stats)
+            if response.usage:
+                self._record_response_usage(response.usage)
 
             return response.choices[0].message.content
 
@@ -128,6 +116,7 @@ class DeepSeekService(AIServiceBase):
             logger.error(f"Error in DeepSeek chat: {str(e)}")
             raise
 
+    @single_flight.coalesced
     async def chat_stream(
         self,
         messages: List[AIMessage],
@@ -147,10 +136,14 @@ class DeepSeekService(AIServiceBase):
                 temperature=temperature,
                 max_tokens=max_tokens,
                 stream=True,
+                stream_options={"include_usage": True},
             )
 
             async for chunk in stream:
-                if chunk.choices[0].delta.content:
+                # The final chunk carries usage (including cached tokens) and no choices
+                if chunk.usage:
+                    self._record_response_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
                     yield chunk.choices[0].delta.content
 
         except Exception as e:
@@ -169,7 +162,7 @@ class DeepSeekService(AIServiceBase):
 
 文档类型：{document_type}
 文档内容：
-{document_content[:8000]}
+{get_token_counter("deepseek").truncate(document_content, settings.ANALYSIS_DOCUMENT_TOKENS)}
 
 请以JSON格式返回分析结果，包括：
 1. 文档概述（summary）
@@ -213,7 +206,28 @@ class DeepSeekService(AIServiceBase):
         """Analyze an image and extract information."""
         raise NotImplementedError("DeepSeek does not support image analysis yet")
 
-    def estimate_cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+    def _record_response_usage(self, usage: Any) -> None:
+        """Record a response's token usage, including prompt cache hits."""
+        # DeepSeek caches stable prompt prefixes automatically; it only reports the hits
+        cached_tokens = getattr(usage, "prompt_cache_hit_tokens", 0) or 0
+        cost = self.estimate_cost(usage.prompt_tokens, usage.completion_tokens, cached_tokens=cached_tokens)
+        self.record_usage(AIUsageStats(
+            model_name=self.model_name,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            total_tokens=usage.total_tokens,
+            estimated_cost=cost,
+            timestamp=datetime.now(timezone.utc),
+            cached_prompt_tokens=cached_tokens,
+        ))
+
+    def estimate_cost(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> float:
         """
         Estimate cost for DeepSeek API usage.
 
@@ -221,10 +235,12 @@ class DeepSeekService(AIServiceBase):
         - DeepSeek-Chat: ¥0.001/1K tokens input, ¥0.002/1K tokens output
         - DeepSeek-Coder: Similar pricing
 
+        - Context cache hits: a tenth of the input price
+
         Using approximate USD conversion: ¥1 ≈ $0.14
         """
-        # DeepSeek pricing in CNY per 1K tokens
-        prompt_cost_cny = (prompt_tokens / 1000) * 0.001
+        # DeepSeek pricing in CNY per 1K tokens; cache hits are part of prompt_tokens
+        prompt_cost_cny = ((prompt_tokens - cached_tokens) / 1000) * 0.001 + (cached_tokens / 1000) * 0.0001
         completion_cost_cny = (completion_tokens / 1000) * 0.002
 
         # Convert to USD (approximate)
@@ -0,0 +1,157 @@
+"""
+Pluggable text embedders for semantic search.
+
+All embedders return L2-normalized vectors of EMBEDDING_DIMENSION floats so
+they can share the document_embeddings table and its cosine index. Vectors
+from different embedders are not comparable; rows record which embedder
+produced them and searches only look at rows from the active one.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from backend.app.core.config import settings
+from backend.app.models.knowledge_base import EMBEDDING_DIMENSION
+from backend.app.services.search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+    logger.warning("sentence-transformers not installed, local embedding model unavailable")
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+class EmbedderBase(ABC):
+    """Turns texts into fixed-size vectors."""
+
+    name: str
+    dimension: int = EMBEDDING_DIMENSION
+
+    @abstractmethod
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed chunks to be stored in the index."""
+
+    @abstractmethod
+    async def embed_query(self, text: str) -> List[float]:
+        """Embed a search query."""
+
+
+class GeminiEmbedder(EmbedderBase):
+    """Gemini text-embedding-004 (768 dimensions)."""
+
+    BATCH_SIZE = 100  # API limit per request
+
+    def __init__(self, model: str = "models/text-embedding-004"):
+        from backend.app.services.gemini_service import gemini_service
+        from backend.app.services.rate_limiter import rate_limiter
+
+        self.gemini_service = gemini_service
+        self.rate_limiter = rate_limiter
+        self.model = model
+        self.name = f"gemini:{model}"
+
+    async def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        # Bulk indexing shares the provider quota with file analysis
+        await self.rate_limiter.acquire("gemini")
+        return await self.gemini_service.embed_texts(batch, task_type="retrieval_document", model=self.model)
+
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.BATCH_SIZE] for i in range(0, len(texts), self.BATCH_SIZE)]
+        results = await asyncio.gather(*[self._embed_batch(batch) for batch in batches])
+        return [_normalize(vector) for batch in results for vector in batch]
+
+    async def embed_query(self, text: str) -> List[float]:
+        vectors = await self.gemini_service.embed_texts([text], task_type="retrieval_query", model=self.model)
+        return _normalize(vectors[0])
+
+
+class LocalModelEmbedder(EmbedderBase):
+    """
+    Offline sentence-transformers model (needs the optional
+    sentence-transformers package). The default multilingual model
+    outputs 768 dimensions and handles Chinese.
+    """
+
+    def __init__(self, model: str = "paraphrase-multilingual-mpnet-base-v2"):
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise ValueError("sentence-transformers is not installed")
+        self.model_name = model
+        self.name = f"local:{model}"
+        self._model: Optional["SentenceTransformer"] = None
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        if self._model is None:
+            self._model = SentenceTransformer(self.model_name)
+            if self._model.get_sentence_embedding_dimension() != self.dimension:
+                raise ValueError(
+                    f"{self.model_name} outputs {self._model.get_sentence_embedding_dimension()} "
+                    f"dimensions, expected {self.dimension}"
+                )
+        return self._model.encode(texts, normalize_embeddings=True).tolist()
+
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._encode, texts)
+
+    async def embed_query(self, text: str) -> List[float]:
+        return (await asyncio.to_thread(self._encode, [text]))[0]
+
+
+class HashingEmbedder(EmbedderBase):
+    """
+    Deterministic bag-of-terms embedder with no model or network access.
+
+    Uses the search tokenizer (CJK unigrams/bigrams) and signed feature
+    hashing. Captures lexical overlap only; meant for tests and offline
+    development.
+    """
+
+    name = "hashing:v1"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for token in tokenize(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return _normalize(vector)
+
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    async def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+_embedder: Optional[EmbedderBase] = None
+
+
+def get_embedder() -> EmbedderBase:
+    """
+    Embedder selected by settings.EMBEDDING_PROVIDER ("gemini", "local" or "hashing").
+
+    Raises:
+        ValueError: If the provider is unknown or unavailable
+    """
+    global _embedder
+    if _embedder is None:
+        provider = settings.EMBEDDING_PROVIDER.lower()
+        if provider == "gemini":
+            _embedder = GeminiEmbedder()
+        elif provider == "local":
+            _embedder = LocalModelEmbedder()
+        elif provider == "hashing":
+            _embedder = HashingEmbedder()
+        else:
+            raise ValueError(f"Unknown embedding provider: {settings.EMBEDDING_PROVIDER}")
+        logger.info(f"Using embedder: {_embedder.name}")
+    return _embedder
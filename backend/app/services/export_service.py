@@ -1,17 +1,23 @@
 """
 Export service for generating PRD documents.
 """
+import hashlib
+import json
 import logging
 from datetime import datetime
-from typing import Optional, Literal
+from typing import Optional, Literal, Tuple
 from uuid import UUID
 from io import BytesIO
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
+from backend.app.core.config import settings
+from backend.app.core.metrics import metrics
 from backend.app.models.conversation import Conversation, Message
 from backend.app.models.knowledge_base import KnowledgeBase
 from backend.app.models.project import Project
 from backend.app.services.gemini_service import GeminiService
+from backend.app.services.kb_context import kb_context_cache
+from backend.app.services.prd_render_store import RenderedPRD, prd_render_store
 
 # 导入导出相关的库
 try:
@@ -32,6 +38,10 @@ logger = logging.getLogger(__name__)
 
 ExportFormat = Literal['markdown', 'pdf', 'word', 'html']
 
+# Revision of the PRD generation prompt and header. Bump it whenever they
+# change so stored renders are regenerated.
+EXPORT_PROMPT_VERSION = "export-v1"
+
 
 class ExportService:
     """Service for exporting conversations as PRD documents."""
@@ -39,26 +49,30 @@ class ExportService:
     def __init__(self, gemini_service: GeminiService):
         self.gemini_service = gemini_service
     
-    async def export_conversation_to_markdown(
+    async def render_markdown(
         self,
         db: AsyncSession,
         conversation_id: UUID,
         include_knowledge_base: bool = True,
         custom_template: Optional[str] = None
-    ) -> tuple[str, str]:
+    ) -> Tuple[RenderedPRD, Conversation]:
         """
-        Export a conversation as a Markdown PRD document.
-        
+        PRD markdown for a conversation, generated once per conversation state.
+
+        Renders are stored by last message sequence, knowledge base version
+        and template inputs, so repeated exports and downloads in any format
+        only generate the PRD again after the conversation changes.
+
         Args:
             db: Database session
             conversation_id: Conversation ID
             include_knowledge_base: Whether to include knowledge base
             custom_template: Custom template (optional)
-            
+
         Returns:
-            Tuple of (content, filename)
+            Tuple of (rendered PRD, conversation)
         """
-        # Get conversation with messages
+        # Get conversation
         conv_result = await db.execute(
             select(Conversation).where(Conversation.id == conversation_id)
         )
@@ -71,11 +85,40 @@ class ExportService:
             select(Project).where(Project.id == conversation.project_id)
         )
         project = project_result.scalar_one()
-        
+
+        # Identify the conversation state without loading the messages
+        sequence_result = await db.execute(
+            select(func.max(Message.sequence)).where(Message.conversation_id == conversation_id)
+        )
+        last_sequence = sequence_result.scalar() or 0
+
+        kb_version = -1  # Knowledge base not requested
+        if include_knowledge_base:
+            kb_result = await db.execute(
+                select(KnowledgeBase.version)
+                .where(KnowledgeBase.project_id == conversation.project_id)
+                .where(KnowledgeBase.status == "confirmed")
+            )
+            kb_version = kb_result.scalar_one_or_none() or 0
+
+        template_hash = hashlib.sha256(json.dumps(
+            [EXPORT_PROMPT_VERSION, custom_template or "", conversation.title or "", project.name, project.description or ""],
+            ensure_ascii=False,
+        ).encode("utf-8")).hexdigest()
+        key = prd_render_store.make_key(last_sequence, kb_version, template_hash)
+
+        if settings.EXPORT_RENDER_CACHE_ENABLED:
+            rendered = await prd_render_store.get(conversation_id, key)
+            if rendered is not None:
+                metrics.increment("export.render_hits")
+                return rendered, conversation
+        metrics.increment("export.render_misses")
+
         # Get messages
         messages_result = await db.execute(
             select(Message)
             .where(Message.conversation_id == conversation_id)
+            .where(Message.sequence <= last_sequence)
             .order_by(Message.sequence)
         )
         messages = messages_result.scalars().all()
@@ -91,22 +134,52 @@ class ExportService:
             knowledge_base = kb_result.scalar_one_or_none()
         
         # Generate PRD using AI
-        prd_content = await self._generate_prd_with_ai(
+        prd_content, generated = await self._generate_prd_with_ai(
             project=project,
             conversation=conversation,
             messages=messages,
             knowledge_base=knowledge_base,
             custom_template=custom_template
         )
+
+        # The plain fallback is not stored, so the next export tries the AI again
+        if generated and settings.EXPORT_RENDER_CACHE_ENABLED:
+            rendered = await prd_render_store.put(conversation_id, key, prd_content)
+        else:
+            rendered = RenderedPRD(prd_content, hashlib.sha256(prd_content.encode("utf-8")).hexdigest())
+
+        logger.info(f"Exported conversation {conversation_id} to PRD")
+        return rendered, conversation
+
+    async def export_conversation_to_markdown(
+        self,
+        db: AsyncSession,
+        conversation_id: UUID,
+        include_knowledge_base: bool = True,
+        custom_template: Optional[str] = None
+    ) -> tuple[str, str]:
+        """
+        Export a conversation as a Markdown PRD document.
         
-        # Generate filename
+        Args:
+            db: Database session
+            conversation_id: Conversation ID
+            include_knowledge_base: Whether to include knowledge base
+            custom_template: Custom template (optional)
+            
+        Returns:
+            Tuple of (content, filename)
+        """
+        rendered, conversation = await self.render_markdown(
+            db, conversation_id, include_knowledge_base, custom_template
+        )
+        return rendered.markdown, self.make_filename(conversation)
+
+    def make_filename(self, conversation: Conversation) -> str:
+        """Markdown filename of an export."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_title = self._sanitize_filename(conversation.title or "PRD")
-        filename = f"{safe_title}_{timestamp}.md"
-        
-        logger.info(f"Exported conversation {conversation_id} to PRD")
-        
-        return prd_content, filename
+        return f"{safe_title}_{timestamp}.md"
     
     async def _generate_prd_with_ai(
         self,
@@ -115,7 +188,7 @@ class ExportService:
         messages: list,
         knowledge_base: Optional[KnowledgeBase],
         custom_template: Optional[str]
-    ) -> str:
+    ) -> Tuple[str, bool]:
         """
         Use AI to generate a structured PRD from conversation.
         
@@ -127,7 +200,8 @@ class ExportService:
             custom_template: Custom template (optional)
             
         Returns:
-            Generated PRD content in Markdown
+            Tuple of (PRD content in Markdown, whether the AI generated it
+            rather than the plain fallback)
         """
         # Build conversation summary
         conversation_text = self._format_conversation(messages)
@@ -196,7 +270,8 @@ class ExportService:
             prd_content = await self.gemini_service.generate_text(
                 prompt=prompt,
                 temperature=0.3,  # Lower temperature for more structured output
-                max_tokens=8000
+                max_tokens=8000,
+                cache=True,
             )
             
             # Add header
@@ -211,12 +286,12 @@ class ExportService:
 
 """
             
-            return header + prd_content
+            return header + prd_content, True
             
         except Exception as e:
             logger.error(f"Error generating PRD with AI: {e}")
             # Fallback: return formatted conversation
-            return self._generate_simple_prd(project, conversation, messages, knowledge_base)
+            return self._generate_simple_prd(project, conversation, messages, knowledge_base), False
     
     def _format_conversation(self, messages: list) -> str:
         """Format conversation messages as text."""
@@ -227,45 +302,8 @@ class ExportService:
         return "\n".join(lines)
     
     def _format_knowledge_base(self, kb: KnowledgeBase) -> str:
-        """Format knowledge base as text."""
-        data = kb.structured_data
-        lines = []
-        
-        # System overview
-        if data.get("system_overview"):
-            overview = data["system_overview"]
-            lines.append("## 系统概览")
-            if overview.get("product_type"):
-                lines.append(f"- 产品类型：{overview['product_type']}")
-            if overview.get("core_modules"):
-                lines.append(f"- 核心模块：{', '.join(overview['core_modules'])}")
-            if overview.get("description"):
-                lines.append(f"- 描述：{overview['description']}")
-            lines.append("")
-        
-        # UI standards
-        if data.get("ui_standards"):
-            ui = data["ui_standards"]
-            lines.append("## UI规范")
-            if ui.get("primary_colors"):
-                lines.append(f"- 主色调：{', '.join(ui['primary_colors'])}")
-            if ui.get("component_library"):
-                lines.append(f"- 组件库：{ui['component_library']}")
-            if ui.get("layout_features"):
-                lines.append(f"- 布局特征：{', '.join(ui['layout_features'])}")
-            lines.append("")
-        
-        # Tech conventions
-        if data.get("tech_conventions"):
-            tech = data["tech_conventions"]
-            lines.append("## 技术约定")
-            if tech.get("naming_style"):
-                lines.append(f"- 命名风格：{tech['naming_style']}")
-            if tech.get("api_style"):
-                lines.append(f"- API风格：{tech['api_style']}")
-            lines.append("")
-        
-        return "\n".join(lines)
+        """Format knowledge base as text (cached per KB version)."""
+        return kb_context_cache.render(kb, "export")
     
     def _generate_simple_prd(
         self,
@@ -339,12 +377,29 @@ class ExportService:
         Returns:
             Tuple of (content, filename, content_type)
         """
-        # First generate the markdown content
+        # First generate the markdown content (stored per conversation state)
         markdown_content, base_filename = await self.export_conversation_to_markdown(
             db, conversation_id, include_knowledge_base, custom_template
         )
+        return self.convert(markdown_content, base_filename, format)
 
-        # Convert to requested format
+    def convert(
+        self,
+        markdown_content: str,
+        base_filename: str,
+        format: ExportFormat
+    ) -> tuple[bytes | str, str, str]:
+        """
+        Convert PRD markdown to an export format.
+
+        Args:
+            markdown_content: PRD markdown
+            base_filename: Markdown filename
+            format: Export format (markdown, word, html, pdf)
+
+        Returns:
+            Tuple of (content, filename, content_type)
+        """
         if format == 'markdown':
             return markdown_content, base_filename, 'text/markdown'
 
@@ -0,0 +1,319 @@
+"""
+Process-pool text extraction for PDF, DOCX and PPTX files.
+
+pypdf / python-docx / python-pptx parsing is CPU bound and holds the GIL, so
+running it inside an async handler stalls the event loop. The engine runs
+each parse in a separate worker process with a per-document timeout and an
+address-space cap, and splits large PDFs into page ranges that are parsed
+in parallel. PPTX images are extracted (and deduplicated) there too.
+"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, AsyncIterator, Deque, Tuple
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(ValueError):
+    """Raised when a document cannot be extracted (corrupt, too large, killed)."""
+
+
+class ExtractionTimeoutError(ExtractionError):
+    """Raised when extraction exceeds the per-document timeout."""
+
+
+@dataclass
+class PageText:
+    """Text of one document page; page_number is 1-based."""
+    page_number: int
+    text: str
+
+
+@dataclass
+class ExtractedImage:
+    """An image embedded in a document, deduplicated by content hash."""
+    slide_number: int  # 1-based slide (or page) of the first occurrence
+    ext: str
+    mime_type: str
+    data: bytes
+    sha256: str
+    occurrences: int = 1
+
+
+# --- Worker-side functions (run in the pool processes, must be picklable) ---
+
+def _init_worker(memory_limit_bytes: int) -> None:
+    """Cap the worker's address space so one huge document cannot exhaust RAM."""
+    if memory_limit_bytes <= 0:
+        return
+    try:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+    except (ImportError, ValueError, OSError) as e:
+        # Not available on this platform (e.g. Windows); run uncapped
+        logging.getLogger(__name__).warning(f"Could not set extraction memory limit: {e}")
+
+
+def _count_pdf_pages(file_path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(file_path).pages)
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() for i in range(start, min(end, len(reader.pages)))]
+
+
+def _extract_docx(file_path: str) -> str:
+    from docx import Document
+
+    doc = Document(file_path)
+    return "\n\n".join([paragraph.text for paragraph in doc.paragraphs])
+
+
+def _extract_pptx(file_path: str) -> str:
+    from pptx import Presentation
+
+    prs = Presentation(file_path)
+    text_runs = []
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                text_runs.append(shape.text)
+    return "\n\n".join(text_runs)
+
+
+def _extract_pptx_images(file_path: str) -> List[ExtractedImage]:
+    from pptx import Presentation
+
+    prs = Presentation(file_path)
+    images: Dict[str, ExtractedImage] = {}
+    for slide_idx, slide in enumerate(prs.slides):
+        for shape in slide.shapes:
+            # Check if shape has image
+            if not hasattr(shape, "image"):
+                continue
+            try:
+                image = shape.image
+                blob = image.blob
+                digest = hashlib.sha256(blob).hexdigest()
+                if digest in images:
+                    # Logos, backgrounds etc. repeated across slides are kept once
+                    images[digest].occurrences += 1
+                    continue
+                images[digest] = ExtractedImage(
+                    slide_number=slide_idx + 1,
+                    ext=image.ext,
+                    mime_type=image.content_type,
+                    data=blob,
+                    sha256=digest,
+                )
+            except Exception as img_error:
+                logging.getLogger(__name__).warning(
+                    f"Failed to extract image from slide {slide_idx + 1}: {img_error}"
+                )
+    return list(images.values())
+
+
+# --- Engine ---
+
+class ExtractionEngine:
+    """
+    Runs document parsers in a process pool.
+
+    The pool is created lazily and rebuilt whenever a job times out or a
+    worker dies (e.g. hitting the memory cap), since a running process
+    cannot be cancelled any other way. Rebuilding fails every other job
+    that was in the pool at the time; those are retried once on the fresh
+    pool, so only the document that caused it fails. Inside daemonic processes such as
+    Celery prefork workers, which may not spawn children, jobs run in a
+    thread instead; there the Celery pool itself provides the parallelism.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        timeout: float,
+        memory_limit_mb: int,
+        pdf_pages_per_task: int,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024
+        self.pdf_pages_per_task = max(1, pdf_pages_per_task)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Incremented on every recycle, so a failed job can tell whether its pool was replaced
+        self._generation = 0
+
+    def _use_processes(self) -> bool:
+        return not multiprocessing.current_process().daemon
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # Don't fork a process that already runs threads (uvicorn, SDK executors)
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.memory_limit_bytes,),
+            )
+            logger.info(f"Started extraction pool with {self.max_workers} workers")
+        return self._pool
+
+    def _recycle_pool(self) -> None:
+        """Kill the pool's workers (including stuck ones) and start fresh next time."""
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        self._generation += 1
+        for process in list(getattr(pool, "_processes", {}).values()):
+            process.terminate()
+        # Jobs still in the pool fail with BrokenProcessPool and are retried by their callers
+        pool.shutdown(wait=False)
+        logger.warning("Extraction pool recycled")
+
+    async def _run(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        if self._use_processes():
+            future = loop.run_in_executor(self._get_pool(), func, *args)
+        else:
+            future = asyncio.to_thread(func, *args)
+        return await future
+
+    async def _run_document(self, file_path: str, func: Callable, *args, deadline: Optional[float] = None):
+        """
+        Run a document job under the timeout, translating worker failures.
+
+        A job whose pool breaks (a worker died, or another job's timeout
+        recycled the pool) is retried once on a fresh pool before the
+        document is given up on.
+
+        Args:
+            file_path: Document being parsed (for error messages)
+            func: Worker-side function to run
+            *args: Arguments of func
+            deadline: Loop time by which the whole document must finish;
+                defaults to now + timeout
+        """
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + self.timeout
+
+        for attempt in range(2):
+            generation = self._generation
+            try:
+                return await asyncio.wait_for(self._run(func, *args), timeout=max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                self._recycle_pool()
+                raise ExtractionTimeoutError(f"Extraction timed out after {self.timeout}s: {file_path}")
+            except BrokenProcessPool:
+                recycled_elsewhere = self._generation != generation
+                if not recycled_elsewhere:
+                    self._recycle_pool()
+                if attempt == 0:
+                    logger.warning(f"Extraction pool broke while parsing {file_path}, retrying on a fresh pool")
+                    continue
+                if recycled_elsewhere:
+                    raise ExtractionError(f"Extraction pool was restarted twice while parsing {file_path}")
+                raise ExtractionError(
+                    f"Extraction worker died twice while parsing {file_path} (over the memory limit or crashed)"
+                )
+            except MemoryError:
+                raise ExtractionError(f"Extraction exceeded the memory limit: {file_path}")
+
+    async def iter_pdf_pages(self, file_path: str) -> AsyncIterator[PageText]:
+        """
+        Stream PDF text page by page, in page order.
+
+        Page ranges are parsed in parallel, with at most max_workers ranges in
+        flight, and pages are yielded as soon as their range and all earlier
+        ranges are done, so consumers can start on page 1 while later pages
+        are still parsing. The whole document is never held in memory here.
+
+        Raises:
+            ExtractionTimeoutError: If the whole document takes longer than the timeout
+            ExtractionError: If a worker fails
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+
+        page_count = await self._run_document(file_path, _count_pdf_pages, file_path, deadline=deadline)
+        ranges = deque(
+            (start, start + self.pdf_pages_per_task)
+            for start in range(0, page_count, self.pdf_pages_per_task)
+        )
+        in_flight: Deque[Tuple[int, asyncio.Future]] = deque()
+
+        def submit_next() -> None:
+            start, end = ranges.popleft()
+            job = self._run_document(file_path, _extract_pdf_pages, file_path, start, end, deadline=deadline)
+            in_flight.append((start, asyncio.ensure_future(job)))
+
+        try:
+            while ranges and len(in_flight) < self.max_workers:
+                submit_next()
+
+            while in_flight:
+                start, future = in_flight.popleft()
+                texts = await future
+                if ranges:
+                    submit_next()
+                for offset, text in enumerate(texts):
+                    yield PageText(page_number=start + offset + 1, text=text)
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+        if page_count > self.pdf_pages_per_task:
+            logger.info(
+                f"Extracted {page_count} PDF pages in "
+                f"{-(-page_count // self.pdf_pages_per_task)} parallel ranges: {file_path}"
+            )
+
+    async def extract_pdf(self, file_path: str) -> str:
+        """
+        Extract PDF text, parsing page ranges of large documents in parallel.
+
+        Returns:
+            Page texts joined in page order
+        """
+        return "\n\n".join([page.text async for page in self.iter_pdf_pages(file_path)])
+
+    async def extract_docx(self, file_path: str) -> str:
+        """Extract DOCX paragraph text."""
+        return await self._run_document(file_path, _extract_docx, file_path)
+
+    async def extract_pptx(self, file_path: str) -> str:
+        """Extract text from all PPTX slide shapes."""
+        return await self._run_document(file_path, _extract_pptx, file_path)
+
+    async def extract_pptx_images(self, file_path: str) -> List[ExtractedImage]:
+        """Extract the distinct images of a PPTX, in slide order of first use."""
+        return await self._run_document(file_path, _extract_pptx_images, file_path)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global instance
+extraction_engine = ExtractionEngine(
+    max_workers=settings.EXTRACTION_MAX_WORKERS,
+    timeout=settings.EXTRACTION_TIMEOUT_SECONDS,
+    memory_limit_mb=settings.EXTRACTION_MEMORY_LIMIT_MB,
+    pdf_pages_per_task=settings.PDF_PAGES_PER_TASK,
+)
@@ -0,0 +1,201 @@
+"""
+Offline fake AI provider for tests and local development.
+
+Returns deterministic canned responses without network access and emulates
+Claude-style prompt cache accounting, so the effect of cache breakpoints
+on recorded usage and cost can be checked without an API key: the prompt up
+to the last message marked cache=True is a cacheable prefix. The first call
+with a given prefix writes it to the cache (if it has at least
+min_cache_tokens), and calls within cache_ttl seconds of the last use read
+it. Latency can be simulated per uncached prompt token.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Tuple
+from backend.app.core.metrics import estimate_tokens
+from backend.app.services.ai_service_base import AIServiceBase, AIMessage, AIUsageStats
+
+logger = logging.getLogger(__name__)
+
+# Characters per streamed chunk
+STREAM_CHUNK_CHARS = 16
+
+
+class FakeAIService(AIServiceBase):
+    """Deterministic offline AI service with emulated prompt caching."""
+
+    def __init__(
+        self,
+        model_name: str = "fake-model",
+        min_cache_tokens: int = 1024,
+        cache_ttl: float = 300.0,
+        latency_per_token: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize fake service.
+
+        Args:
+            model_name: Model name reported in usage stats
+            min_cache_tokens: Smallest prefix that is cached
+            cache_ttl: Seconds a cached prefix lives after its last use
+            latency_per_token: Simulated seconds per uncached prompt token
+            clock: Time source, injectable for tests
+        """
+        super().__init__(model_name, api_key="")
+        self.min_cache_tokens = min_cache_tokens
+        self.cache_ttl = cache_ttl
+        self.latency_per_token = latency_per_token
+        self._clock = clock
+        # prefix hash -> expiry time
+        self._prefix_cache: Dict[str, float] = {}
+
+    @property
+    def provider_name(self) -> str:
+        return "Fake"
+
+    @property
+    def supports_streaming(self) -> bool:
+        return True
+
+    @property
+    def supports_images(self) -> bool:
+        return True
+
+    def _account(self, messages: List[AIMessage]) -> Tuple[int, int, int]:
+        """
+        Prompt cache accounting for a request.
+
+        Returns:
+            (prompt tokens, cached tokens, cache write tokens)
+        """
+        tokens = [estimate_tokens(f"{msg.role}:{msg.content}") for msg in messages]
+        prompt_tokens = sum(tokens)
+
+        breakpoints = [i for i, msg in enumerate(messages) if msg.cache]
+        if not breakpoints:
+            return prompt_tokens, 0, 0
+        end = breakpoints[-1] + 1
+        prefix_tokens = sum(tokens[:end])
+        if prefix_tokens < self.min_cache_tokens:
+            return prompt_tokens, 0, 0
+
+        digest = hashlib.sha256()
+        for msg in messages[:end]:
+            digest.update(f"{msg.role}\x1f{msg.content}\x1e".encode("utf-8"))
+        key = digest.hexdigest()
+
+        now = self._clock()
+        hit = self._prefix_cache.get(key, 0.0) > now
+        # Like Claude, every use refreshes the prefix's lifetime
+        self._prefix_cache[key] = now + self.cache_ttl
+        if hit:
+            return prompt_tokens, prefix_tokens, 0
+        return prompt_tokens, 0, prefix_tokens
+
+    def _reply(self, messages: List[AIMessage]) -> str:
+        last = messages[-1].content if messages else ""
+        digest = hashlib.sha256(last.encode("utf-8")).hexdigest()[:8]
+        return f"[fake:{digest}] 已收到（{len(last)} 字）：{last[:40]}"
+
+    async def _complete(self, messages: List[AIMessage]) -> str:
+        prompt_tokens, cached_tokens, cache_write_tokens = self._account(messages)
+        if self.latency_per_token:
+            await asyncio.sleep((prompt_tokens - cached_tokens) * self.latency_per_token)
+
+        text = self._reply(messages)
+        completion_tokens = estimate_tokens(text)
+        self.record_usage(AIUsageStats(
+            model_name=self.model_name,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            estimated_cost=self.estimate_cost(
+                prompt_tokens,
+                completion_tokens,
+                cached_tokens=cached_tokens,
+                cache_write_tokens=cache_write_tokens,
+            ),
+            timestamp=datetime.now(timezone.utc),
+            cached_prompt_tokens=cached_tokens,
+            cache_write_tokens=cache_write_tokens,
+        ))
+        return text
+
+    async def generate_text(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """Generate a canned response to a prompt."""
+        messages = [AIMessage(role="system", content=system_instruction)] if system_instruction else []
+        messages.append(AIMessage(role="user", content=prompt))
+        return await self._complete(messages)
+
+    async def chat(
+        self,
+        messages: List[AIMessage],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """Chat with conversation history."""
+        return await self._complete(messages)
+
+    async def chat_stream(
+        self,
+        messages: List[AIMessage],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Chat with streaming response, in fixed-size chunks."""
+        text = await self._complete(messages)
+        for i in range(0, len(text), STREAM_CHUNK_CHARS):
+            yield text[i:i + STREAM_CHUNK_CHARS]
+            await asyncio.sleep(0)
+
+    async def analyze_document(
+        self,
+        document_content: str,
+        document_type: str,
+        filename: str = "",
+    ) -> Dict[str, Any]:
+        """Analyze document with a canned summary."""
+        summary = await self.generate_text(document_content)
+        return {
+            "summary": summary,
+            "filename": filename,
+            "document_type": document_type,
+        }
+
+    async def analyze_image(
+        self,
+        image_path: str,
+        prompt: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Analyze image with a canned description."""
+        return {"raw_analysis": await self.generate_text(prompt or image_path)}
+
+    def estimate_cost(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> float:
+        """
+        Estimate cost with Claude Sonnet prices.
+
+        - $0.003/1K input, $0.015/1K output
+        - Prompt cache reads cost 0.1x and cache writes 1.25x the input price
+        """
+        prompt_tokens = (
+            prompt_tokens - cached_tokens - cache_write_tokens
+            + cached_tokens * 0.1
+            + cache_write_tokens * 1.25
+        )
+        return (prompt_tokens / 1000) * 0.003 + (completion_tokens / 1000) * 0.015
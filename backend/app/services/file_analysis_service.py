@@ -0,0 +1,372 @@
+"""
+File analysis pipeline shared by the API and the Celery workers.
+
+Status lifecycle of an UploadedFile:
+    pending -> queued -> analyzing -> completed | failed
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Optional, Dict, Any, List, AsyncIterator, Set
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from backend.app.core.config import settings
+from backend.app.core.database import AsyncSessionLocal
+from backend.app.models.file import UploadedFile
+from backend.app.models.project import Project
+from backend.app.models.knowledge_base import KnowledgeBase
+from backend.app.services.file_processor import file_processor
+from backend.app.services.gemini_service import gemini_service, ANALYSIS_PROMPT_VERSIONS
+from backend.app.services.context_assembler import get_token_counter
+from backend.app.services.analysis_store import analysis_store
+from backend.app.services.knowledge_builder import knowledge_builder
+from backend.app.services.rate_limiter import rate_limiter
+from backend.app.services.scratch_space import scratch_space
+from backend.app.services.semantic_search import semantic_search_service
+
+logger = logging.getLogger(__name__)
+
+# Statuses of files whose analysis has not finished yet
+IN_FLIGHT_STATUSES = ("pending", "queued", "analyzing")
+
+
+class FileAnalysisService:
+    """Extracts, analyzes and stores results for uploaded files."""
+
+    def __init__(self):
+        self._batch_tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _prompt_version(file_type: str) -> str:
+        if file_type == 'image':
+            return ANALYSIS_PROMPT_VERSIONS["image"]
+        if file_type == 'pptx':
+            return ANALYSIS_PROMPT_VERSIONS["document_with_images"]
+        return ANALYSIS_PROMPT_VERSIONS["document"]
+
+    async def _run_analysis(self, uploaded_file: UploadedFile) -> Optional[Dict[str, Any]]:
+        """Extract content and send it to Gemini (respecting the provider rate limit)."""
+        if uploaded_file.file_type == 'image':
+            # Analyze image directly with Gemini
+            await rate_limiter.acquire("gemini")
+            return await gemini_service.analyze_image(uploaded_file.file_path)
+
+        if uploaded_file.file_type == 'pdf':
+            return await self._analyze_pdf_streaming(uploaded_file)
+
+        if uploaded_file.file_type == 'pptx':
+            return await self._analyze_pptx(uploaded_file)
+
+        # Extract text first
+        text_content = await file_processor.process_file(
+            uploaded_file.file_path,
+            uploaded_file.file_type,
+            content_hash=uploaded_file.content_hash,
+        )
+
+        if not text_content:
+            return None
+
+        # Analyze with Gemini
+        await rate_limiter.acquire("gemini")
+        return await gemini_service.analyze_document(
+            document_content=text_content,
+            document_type=uploaded_file.file_type,
+            filename=uploaded_file.filename,
+        )
+
+    async def _analyze_pptx(self, uploaded_file: UploadedFile) -> Optional[Dict[str, Any]]:
+        """
+        Analyze a presentation's text together with its distinct slide images.
+
+        Text and images are extracted concurrently. Images go to Gemini inline
+        (PPTX_IMAGES_IN_MEMORY) or through a scratch directory that is removed
+        as soon as the analysis finishes.
+        """
+        text_task = file_processor.process_file(
+            uploaded_file.file_path,
+            uploaded_file.file_type,
+            content_hash=uploaded_file.content_hash,
+        )
+
+        if settings.PPTX_IMAGES_IN_MEMORY:
+            text_content, extracted = await asyncio.gather(
+                text_task, file_processor.extract_pptx_images(uploaded_file.file_path)
+            )
+            images = [{"mime_type": image.mime_type, "data": image.data} for image in extracted]
+            image_paths: List[str] = []
+        else:
+            text_content, image_paths = await asyncio.gather(
+                text_task, file_processor.extract_images_from_pptx(uploaded_file.file_path)
+            )
+            images = []
+        logger.info(f"Extracted {len(images) + len(image_paths)} images from PPTX: {uploaded_file.filename}")
+
+        if not text_content and not images and not image_paths:
+            return None
+
+        try:
+            # Analyze with Gemini (text + images)
+            await rate_limiter.acquire("gemini")
+            return await gemini_service.analyze_document_with_images(
+                document_content=text_content or "无文本内容",
+                document_type=uploaded_file.file_type,
+                filename=uploaded_file.filename,
+                image_paths=image_paths or None,
+                images=images or None,
+            )
+        finally:
+            if image_paths:
+                scratch_space.release(os.path.dirname(image_paths[0]))
+
+    async def _analyze_pdf_streaming(self, uploaded_file: UploadedFile) -> Optional[Dict[str, Any]]:
+        """
+        Start the Gemini call as soon as enough leading pages are extracted.
+
+        The prompt only uses the first ANALYSIS_DOCUMENT_TOKENS tokens, so the
+        rest of a long PDF is extracted (and cached) while the model works.
+        """
+        async def analyze_text(text: str) -> Dict[str, Any]:
+            await rate_limiter.acquire("gemini")
+            return await gemini_service.analyze_document(
+                document_content=text,
+                document_type=uploaded_file.file_type,
+                filename=uploaded_file.filename,
+            )
+
+        counter = get_token_counter("gemini")
+        prefix_pages: List[str] = []
+        prefix_tokens = 0
+        analysis_task: Optional[asyncio.Task] = None
+        try:
+            async for page in file_processor.iter_text(
+                uploaded_file.file_path,
+                uploaded_file.file_type,
+                content_hash=uploaded_file.content_hash,
+            ):
+                if analysis_task is not None:
+                    continue
+                prefix_pages.append(page.text)
+                prefix_tokens += counter.count(page.text)
+                if prefix_tokens >= settings.ANALYSIS_DOCUMENT_TOKENS:
+                    logger.info(f"Starting analysis of {uploaded_file.filename} at page {page.page_number}")
+                    analysis_task = asyncio.create_task(analyze_text("\n\n".join(prefix_pages).strip()))
+        except BaseException:
+            if analysis_task is not None:
+                analysis_task.cancel()
+            raise
+
+        if analysis_task is not None:
+            return await analysis_task
+
+        text_content = "\n\n".join(prefix_pages).strip()
+        if not text_content:
+            return None
+        return await analyze_text(text_content)
+
+    async def analyze(self, db: AsyncSession, uploaded_file: UploadedFile) -> Optional[Dict[str, Any]]:
+        """
+        Analyze one file and record the result on its row.
+
+        Reuses a stored analysis of identical content (same model and prompt)
+        when one exists. Commits the status transitions as it goes; on error
+        the file is marked failed and the exception is re-raised. Completed
+        documents are then chunked and embedded for semantic search.
+
+        Returns:
+            Full analysis dictionary, or None if the file had no content
+        """
+        file_id = uploaded_file.id
+
+        # Update status to analyzing
+        uploaded_file.status = "analyzing"
+        await db.commit()
+
+        try:
+            if not uploaded_file.content_hash:
+                uploaded_file.content_hash = await analysis_store.compute_file_hash(uploaded_file.file_path)
+            prompt_version = self._prompt_version(uploaded_file.file_type)
+
+            # Reuse a stored analysis for the same content, model and prompt
+            analysis_result = await analysis_store.get(
+                db,
+                content_hash=uploaded_file.content_hash,
+                model_name=gemini_service.model_name,
+                prompt_version=prompt_version,
+            )
+
+            if analysis_result is not None:
+                logger.info(f"Reusing stored analysis for {uploaded_file.filename}")
+            else:
+                analysis_result = await self._run_analysis(uploaded_file)
+
+                # Keep the full analysis for knowledge base builds
+                if analysis_result:
+                    await analysis_store.put(
+                        db,
+                        content_hash=uploaded_file.content_hash,
+                        model_name=gemini_service.model_name,
+                        prompt_version=prompt_version,
+                        file_type=uploaded_file.file_type,
+                        analysis=analysis_result,
+                    )
+
+            # Update file record
+            uploaded_file.status = "completed"
+            if analysis_result:
+                # Store summary as analysis_result
+                summary = analysis_result.get('summary', 'Analysis completed')
+                uploaded_file.analysis_result = summary[:1000]  # Limit to 1000 chars
+
+            await db.commit()
+            logger.info(f"File analysis completed: {uploaded_file.filename}")
+
+        except Exception as e:
+            await db.rollback()
+            # Update status to failed
+            uploaded_file.status = "failed"
+            uploaded_file.analysis_result = f"Error: {str(e)}"[:1000]
+            await db.commit()
+            logger.error(f"Error analyzing file {file_id}: {str(e)}")
+            raise
+
+        if settings.SEMANTIC_INDEXING_ENABLED and uploaded_file.file_type != 'image':
+            try:
+                await semantic_search_service.index_file(db, uploaded_file)
+            except Exception as e:
+                # Semantic search is an extra; the analysis itself succeeded
+                await db.rollback()
+                logger.warning(f"Failed to index file {file_id} for semantic search: {str(e)}")
+
+        return analysis_result
+
+    async def _analyze_by_id(self, file_id: UUID) -> Dict[str, Any]:
+        """Analyze one file in its own session, reporting failure instead of raising."""
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            uploaded_file = await db.get(UploadedFile, file_id)
+            if not uploaded_file:
+                return {"file_id": file_id, "filename": None, "status": "failed", "error": "File not found"}
+
+            result = {"file_id": file_id, "filename": uploaded_file.filename}
+            try:
+                await self.analyze(db, uploaded_file)
+                result.update(status="completed", error=None)
+            except Exception as e:
+                result.update(status="failed", error=str(e))
+
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def analyze_batch(
+        self,
+        file_ids: List[UUID],
+        concurrency: int = 5,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Start analyzing many files concurrently.
+
+        All analyses are started before this returns, so a caller that
+        commits the files as queued and then never iterates (e.g. an SSE
+        client that disconnects before the first event) does not leave them
+        queued forever. At most `concurrency` files are analyzed at a time,
+        each with its own database session. A failing file is reported and
+        does not stop the others. The analyses run to completion whether or
+        not the results are consumed, since they are persisted on the file
+        rows.
+
+        Returns:
+            Async iterator yielding {"file_id", "filename", "status", "error",
+            "duration_ms"} per file as it finishes
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(file_id: UUID) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._analyze_by_id(file_id)
+
+        tasks = [asyncio.create_task(run(file_id)) for file_id in file_ids]
+        for task in tasks:
+            # The event loop only keeps weak references to tasks
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+        return self._iter_completed(tasks)
+
+    @staticmethod
+    async def _iter_completed(tasks: List[asyncio.Task]) -> AsyncIterator[Dict[str, Any]]:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+
+    async def count_in_flight(self, db: AsyncSession, project_id: UUID) -> int:
+        """Number of project files still waiting for or undergoing analysis."""
+        result = await db.execute(
+            select(func.count(UploadedFile.id))
+            .where(UploadedFile.project_id == project_id)
+            .where(UploadedFile.status.in_(IN_FLIGHT_STATUSES))
+        )
+        return result.scalar() or 0
+
+    async def build_knowledge_base(
+        self,
+        db: AsyncSession,
+        project: Project,
+        existing_kb: Optional[KnowledgeBase] = None,
+    ) -> KnowledgeBase:
+        """
+        Build (or rebuild) a project's knowledge base from its analyzed files.
+
+        Raises:
+            ValueError: If the project has no analyzed files
+        """
+        # Get all completed file analyses
+        files_result = await db.execute(
+            select(UploadedFile)
+            .where(UploadedFile.project_id == project.id)
+            .where(UploadedFile.status == "completed")
+        )
+        files = files_result.scalars().all()
+
+        if not files:
+            raise ValueError("No analyzed files found. Please upload and analyze files first.")
+
+        logger.info(f"Found {len(files)} analyzed files")
+
+        # Prepare file analyses from the analysis store (no extraction or LLM calls)
+        file_analyses = await analysis_store.load_file_analyses(
+            db, files, model_name=settings.GEMINI_MODEL
+        )
+
+        await rate_limiter.acquire("gemini")
+        kb_data = await knowledge_builder.build_knowledge_base(
+            project_name=project.name,
+            file_analyses=file_analyses,
+        )
+
+        # Create or update knowledge base
+        if existing_kb:
+            logger.info(f"Updating existing knowledge base (version {existing_kb.version})")
+            existing_kb.structured_data = kb_data
+            existing_kb.version += 1
+            existing_kb.status = "confirmed" if not kb_data.get("pending_questions") else "pending"
+            kb = existing_kb
+        else:
+            logger.info("Creating new knowledge base")
+            kb = KnowledgeBase(
+                project_id=project.id,
+                structured_data=kb_data,
+                version=1,
+                status="pending",
+            )
+            db.add(kb)
+
+        await db.commit()
+        await db.refresh(kb)
+
+        logger.info(f"✅ Knowledge base built successfully for project: {project.name}")
+        return kb
+
+
+# Global instance
+file_analysis_service = FileAnalysisService()
@@ -1,10 +1,13 @@
 """
 File processing service for extracting text from various file formats.
 """
+import asyncio
 import os
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Tuple, AsyncIterator
 import logging
+from backend.app.services.extraction_engine import extraction_engine, PageText, ExtractedImage
+from backend.app.services.scratch_space import scratch_space
 
 logger = logging.getLogger(__name__)
 
@@ -36,14 +39,9 @@ class FileProcessor:
     
     @staticmethod
     async def extract_text_from_pdf(file_path: str) -> str:
-        """Extract text from PDF file."""
+        """Extract text from PDF file (in the extraction process pool)."""
         try:
-            from pypdf import PdfReader
-            
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n\n"
+            text = await extraction_engine.extract_pdf(file_path)
             
             logger.info(f"Extracted {len(text)} characters from PDF: {file_path}")
             return text.strip()
@@ -54,12 +52,9 @@ class FileProcessor:
     
     @staticmethod
     async def extract_text_from_docx(file_path: str) -> str:
-        """Extract text from DOCX file."""
+        """Extract text from DOCX file (in the extraction process pool)."""
         try:
-            from docx import Document
-
-            doc = Document(file_path)
-            text = "\n\n".join([paragraph.text for paragraph in doc.paragraphs])
+            text = await extraction_engine.extract_docx(file_path)
 
             logger.info(f"Extracted {len(text)} characters from DOCX: {file_path}")
             return text.strip()
@@ -70,19 +65,10 @@ class FileProcessor:
 
     @staticmethod
     async def extract_text_from_pptx(file_path: str) -> str:
-        """Extract text from PPTX file."""
+        """Extract text from PPTX file (in the extraction process pool)."""
         try:
-            from pptx import Presentation
-
-            prs = Presentation(file_path)
-            text_runs = []
+            text = await extraction_engine.extract_pptx(file_path)
 
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text_runs.append(shape.text)
-
-            text = "\n\n".join(text_runs)
             logger.info(f"Extracted {len(text)} characters from PPTX: {file_path}")
             return text.strip()
 
@@ -91,57 +77,53 @@ class FileProcessor:
             raise
 
     @staticmethod
-    async def extract_images_from_pptx(file_path: str) -> List[str]:
+    async def extract_pptx_images(file_path: str) -> List[ExtractedImage]:
         """
-        Extract images from PPTX file and save them to temporary directory.
+        Extract the distinct images of a PPTX file into memory.
 
-        Returns:
-            List of image file paths
+        Images repeated across slides (logos, backgrounds) are returned once.
         """
         try:
-            from pptx import Presentation
-            import tempfile
-            from pathlib import Path
-
-            prs = Presentation(file_path)
-            image_paths = []
-
-            # Create temp directory for extracted images
-            temp_dir = tempfile.mkdtemp(prefix="pptx_images_")
-
-            image_count = 0
-            for slide_idx, slide in enumerate(prs.slides):
-                for shape in slide.shapes:
-                    # Check if shape has image
-                    if hasattr(shape, "image"):
-                        try:
-                            image = shape.image
-                            # Get image bytes
-                            image_bytes = image.blob
-                            # Get image extension
-                            ext = image.ext
-
-                            # Save image
-                            image_filename = f"slide_{slide_idx + 1}_img_{image_count + 1}.{ext}"
-                            image_path = os.path.join(temp_dir, image_filename)
-
-                            with open(image_path, 'wb') as f:
-                                f.write(image_bytes)
-
-                            image_paths.append(image_path)
-                            image_count += 1
-                            logger.info(f"Extracted image: {image_filename}")
-                        except Exception as img_error:
-                            logger.warning(f"Failed to extract image from slide {slide_idx + 1}: {img_error}")
-                            continue
-
-            logger.info(f"Extracted {len(image_paths)} images from PPTX: {file_path}")
-            return image_paths
+            images = await extraction_engine.extract_pptx_images(file_path)
+            repeats = sum(image.occurrences - 1 for image in images)
+            logger.info(f"Extracted {len(images)} unique images from PPTX ({repeats} repeats skipped): {file_path}")
+            return images
 
         except Exception as e:
             logger.error(f"Error extracting images from PPTX {file_path}: {str(e)}")
             return []
 
+    @staticmethod
+    async def extract_images_from_pptx(file_path: str) -> List[str]:
+        """
+        Extract images from PPTX file and save them to a scratch directory.
+
+        The caller should release the directory (scratch_space.release on the
+        parent of the returned paths) when done; otherwise it is evicted
+        after SCRATCH_TTL_MINUTES.
+
+        Returns:
+            List of image file paths
+        """
+        images = await FileProcessor.extract_pptx_images(file_path)
+        if not images:
+            return []
+
+        # Create scratch directory for extracted images
+        temp_dir = scratch_space.create_dir(prefix="pptx_images_")
+
+        def write_image(index: int, image: ExtractedImage) -> str:
+            image_filename = f"slide_{image.slide_number}_img_{index + 1}.{image.ext}"
+            image_path = os.path.join(temp_dir, image_filename)
+            with open(image_path, 'wb') as f:
+                f.write(image.data)
+            return image_path
+
+        image_paths = await asyncio.gather(*[
+            asyncio.to_thread(write_image, index, image) for index, image in enumerate(images)
+        ])
+        return list(image_paths)
+
     @staticmethod
     async def extract_text_from_text_file(file_path: str) -> str:
         """Extract text from plain text or markdown file."""
@@ -157,17 +139,116 @@ class FileProcessor:
             raise
     
     @staticmethod
-    async def process_file(file_path: str, file_type: str) -> Optional[str]:
+    async def iter_text(
+        file_path: str,
+        file_type: str,
+        content_hash: Optional[str] = None,
+    ) -> AsyncIterator[PageText]:
+        """
+        Stream extracted text, page by page for PDFs.
+
+        PDF pages are yielded as soon as they are parsed, so callers can start
+        working on the first pages while the rest of the document is still
+        being extracted. Cached PDF text is split back into its pages. Other
+        formats, and PDF text cached without page boundaries, are yielded as
+        a single page. Nothing is yielded for images.
+
+        Args:
+            file_path: Path to the file
+            file_type: Type of file (pdf, docx, text, markdown, image)
+            content_hash: SHA-256 of the file, enables the extracted text cache
+        """
+        if file_type != 'pdf':
+            text = await FileProcessor.process_file(file_path, file_type, content_hash=content_hash)
+            if text:
+                yield PageText(page_number=1, text=text)
+            return
+
+        from backend.app.services.blob_store import blob_store
+
+        if content_hash:
+            cached_pages = await blob_store.read_cached_pages(content_hash)
+            if cached_pages is not None:
+                logger.info(f"Using cached extracted pages for {file_path}")
+                for index, text in enumerate(cached_pages):
+                    yield PageText(page_number=index + 1, text=text)
+                return
+
+            # Cached by process_file, which does not record page boundaries
+            cached_text = await blob_store.read_cached_text(content_hash)
+            if cached_text is not None:
+                logger.info(f"Using cached extracted text for {file_path}")
+                if cached_text:
+                    yield PageText(page_number=1, text=cached_text)
+                return
+
+        page_spans: List[Tuple[int, int]] = []
+
+        async def stream_pages(cache_file=None) -> AsyncIterator[PageText]:
+            page_count, char_count, position = 0, 0, 0
+            try:
+                async for page in extraction_engine.iter_pdf_pages(file_path):
+                    if cache_file is not None:
+                        # Same layout as extract_text_from_pdf, without holding the document
+                        if char_count == 0:
+                            text = page.text.lstrip()
+                            start = position
+                        else:
+                            text = "\n\n" + page.text
+                            start = position + 2
+                        await cache_file.write(text)
+                        position += len(text)
+                        page_spans.append((start, position))
+                    page_count += 1
+                    char_count += len(page.text)
+                    yield page
+            except Exception as e:
+                logger.error(f"Error extracting text from PDF {file_path}: {str(e)}")
+                raise
+            logger.info(f"Extracted {char_count} characters from {page_count} PDF pages: {file_path}")
+
+        if not content_hash:
+            async for page in stream_pages():
+                yield page
+            return
+
+        async with blob_store.cached_text_writer(content_hash) as cache_file:
+            async for page in stream_pages(cache_file):
+                yield page
+            # Written before the text is committed, so cached text never lacks its pages
+            await blob_store.write_page_index(content_hash, page_spans, page_spans[-1][1] if page_spans else 0)
+
+    @staticmethod
+    async def process_file(
+        file_path: str,
+        file_type: str,
+        content_hash: Optional[str] = None,
+    ) -> Optional[str]:
         """
         Process file and extract text content.
         
         Args:
             file_path: Path to the file
             file_type: Type of file (pdf, docx, text, markdown, image)
+            content_hash: SHA-256 of the file; when given, extracted text is
+                cached per content and reused for duplicate uploads
         
         Returns:
             Extracted text content, or None for images (will be processed by Gemini directly)
         """
+        if content_hash and file_type != 'image':
+            from backend.app.services.blob_store import blob_store
+
+            cached_text = await blob_store.read_cached_text(content_hash)
+            if cached_text is not None:
+                logger.info(f"Using cached extracted text for {file_path}")
+                return cached_text
+
+            text = await FileProcessor.process_file(file_path, file_type)
+            if text is not None:
+                await blob_store.write_cached_text(content_hash, text)
+            return text
+
         try:
             if file_type == 'pdf':
                 return await FileProcessor.extract_text_from_pdf(file_path)
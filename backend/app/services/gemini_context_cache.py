@@ -0,0 +1,101 @@
+"""
+Explicit Gemini context caches for long, repeated system instructions.
+
+Gemini caches repeated prompt prefixes implicitly, but only on a
+best-effort basis. A system instruction sent on every chat turn (the chat
+instructions plus the project's knowledge base) is worth an explicit
+CachedContent instead: it is created once per distinct instruction, reused
+until shortly before it expires, and chat models are built from it.
+
+Instructions below GEMINI_CONTEXT_CACHE_MIN_TOKENS are left to implicit
+caching, since the API rejects small caches. If creating a cache fails
+(e.g. the model does not support explicit caching), the instruction is sent
+normally and the failure is remembered for one TTL.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from google.generativeai import caching
+from backend.app.core.cache import TTLCache
+from backend.app.core.config import settings
+from backend.app.core.metrics import metrics, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# A cache is not handed out during its last minute, so calls never race its expiry
+REFRESH_MARGIN_SECONDS = 60
+
+
+class GeminiContextCache:
+    """CachedContent handles per (model, system instruction)."""
+
+    def __init__(self, ttl_seconds: int, min_tokens: int, maxsize: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self._entries = TTLCache(maxsize=maxsize, ttl=max(1, ttl_seconds - REFRESH_MARGIN_SECONDS))
+        self._failed = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get(
+        self,
+        model_name: str,
+        system_instruction: str,
+        run_blocking: Callable[..., Awaitable[Any]],
+    ) -> Optional[Any]:
+        """
+        CachedContent holding a system instruction, created on first use.
+
+        Args:
+            model_name: Gemini model the cache is created for
+            system_instruction: Instruction to cache
+            run_blocking: Runs the blocking SDK call (GeminiService._run_blocking)
+
+        Returns:
+            CachedContent, or None if the instruction should be sent uncached
+        """
+        if estimate_tokens(system_instruction) < self.min_tokens:
+            return None
+
+        key = hashlib.sha256(f"{model_name}\x1f{system_instruction}".encode("utf-8")).hexdigest()
+        cached_content = self._entries.get(key)
+        if cached_content is not None:
+            metrics.increment("gemini_context_cache.hits")
+            return cached_content
+        if self._failed.get(key):
+            return None
+
+        # Concurrent turns on the same instruction create one cache between them
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cached_content = self._entries.get(key)
+            if cached_content is not None:
+                metrics.increment("gemini_context_cache.hits")
+                return cached_content
+            try:
+                cached_content = await run_blocking(
+                    caching.CachedContent.create,
+                    model=model_name if model_name.startswith("models/") else f"models/{model_name}",
+                    system_instruction=system_instruction,
+                    ttl=timedelta(seconds=self.ttl_seconds),
+                )
+            except Exception as e:
+                metrics.increment("gemini_context_cache.failures")
+                logger.warning(f"Could not create Gemini context cache, sending the prompt uncached: {str(e)}")
+                self._failed.set(key, True)
+                return None
+            finally:
+                self._locks.pop(key, None)
+
+            metrics.increment("gemini_context_cache.creates")
+            self._entries.set(key, cached_content)
+            logger.info(f"Created Gemini context cache {cached_content.name} ({self.ttl_seconds}s)")
+            return cached_content
+
+
+# Global instance
+gemini_context_cache = GeminiContextCache(
+    ttl_seconds=settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+    min_tokens=settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+)
@@ -0,0 +1,107 @@
+"""
+Gemini uploaded-file handles, reused across calls.
+
+Chat turns, image analysis and document analysis used to call
+genai.upload_file for every image on every call, so a screenshot attached
+to a conversation was uploaded again on each turn. Handles are cached here
+by the SHA-256 of the file content for a little less than the Files API
+retention (GEMINI_FILE_CACHE_TTL_HOURS), and new images of one call are
+uploaded concurrently.
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+import google.generativeai as genai
+from backend.app.core.cache import TTLCache
+from backend.app.core.config import settings
+from backend.app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+def _hash_file(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class GeminiFileCache:
+    """Uploaded file handles per content hash."""
+
+    def __init__(self, ttl_seconds: float, maxsize: int = 1024):
+        self._handles = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def upload(self, file_path: str, run_blocking: Callable[..., Awaitable[Any]]) -> Any:
+        """
+        Uploaded file handle for a local file, uploading it on first use.
+
+        Args:
+            file_path: Path of the file
+            run_blocking: Runs the blocking SDK call (GeminiService._run_blocking)
+
+        Returns:
+            File handle to pass as a content part
+
+        Raises:
+            Exception: If reading or uploading the file fails
+        """
+        content_hash = await asyncio.to_thread(_hash_file, file_path)
+        handle = self._handles.get(content_hash)
+        if handle is not None:
+            metrics.increment("gemini_file_cache.hits")
+            return handle
+
+        # Concurrent calls with the same image upload it once between them
+        lock = self._locks.setdefault(content_hash, asyncio.Lock())
+        async with lock:
+            handle = self._handles.get(content_hash)
+            if handle is not None:
+                metrics.increment("gemini_file_cache.hits")
+                return handle
+            try:
+                handle = await run_blocking(genai.upload_file, file_path)
+            except Exception:
+                metrics.increment("gemini_file_cache.failures")
+                raise
+            finally:
+                self._locks.pop(content_hash, None)
+
+            metrics.increment("gemini_file_cache.uploads")
+            self._handles.set(content_hash, handle)
+            logger.info(f"Uploaded image: {file_path} ({content_hash[:12]})")
+            return handle
+
+    async def upload_many(
+        self,
+        file_paths: Sequence[str],
+        run_blocking: Callable[..., Awaitable[Any]],
+    ) -> List[Any]:
+        """
+        Uploaded file handles for several files, uploading new ones concurrently.
+
+        Files that cannot be uploaded are logged and left out.
+
+        Returns:
+            Handles of the files that could be uploaded, in the given order
+        """
+        results = await asyncio.gather(
+            *(self.upload(path, run_blocking) for path in file_paths),
+            return_exceptions=True,
+        )
+        handles = []
+        for path, result in zip(file_paths, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to upload image {path}: {result}")
+            else:
+                handles.append(result)
+        return handles
+
+
+# Global instance
+gemini_file_cache = GeminiFileCache(ttl_seconds=settings.GEMINI_FILE_CACHE_TTL_HOURS * 3600)
@@ -2,10 +2,24 @@
 Gemini API service for AI operations.
 """
 import google.generativeai as genai
+from backend.app.core.cache import TTLCache
 from backend.app.core.config import settings
-from typing import Optional, List, Dict, Any
+from backend.app.core.metrics import metrics
+from backend.app.services.ai_service_base import AIServiceBase, AIMessage, AIUsageStats
+from backend.app.services.context_assembler import get_token_counter
+from backend.app.services.gemini_context_cache import gemini_context_cache
+from backend.app.services.gemini_file_cache import gemini_file_cache
+from backend.app.services.llm_cache import llm_cache
+from backend.app.services.single_flight import single_flight
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Callable, AsyncGenerator, Tuple, Union
+import asyncio
+import hashlib
+import functools
 import logging
 import os
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -18,21 +32,292 @@ if hasattr(settings, 'HTTP_PROXY') and settings.HTTP_PROXY:
 # Configure Gemini API
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
-
-class GeminiService:
+# The google-generativeai SDK calls (generate_content, send_message, upload_file)
+# are synchronous. They run on this dedicated, bounded executor so a slow LLM call
+# never blocks the event loop, and a burst of calls cannot exhaust the loop's
+# default executor used by the rest of the app.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.GEMINI_MAX_CONCURRENCY,
+    thread_name_prefix="gemini",
+)
+
+# Streamed responses are iterated on their own executor: a stream holds its
+# thread for as long as the client reads, so it must not count against the
+# request-call cap used by file analysis and knowledge base builds.
+_stream_executor = ThreadPoolExecutor(
+    max_workers=settings.GEMINI_MAX_STREAMS,
+    thread_name_prefix="gemini-stream",
+)
+
+# Revision of each analysis prompt. Bump the matching entry whenever a prompt
+# changes so analyses stored under the old prompt are not reused.
+ANALYSIS_PROMPT_VERSIONS = {
+    "document": "document-v2",
+    "document_with_images": "document-images-v3",
+    "image": "image-v1",
+}
+
+
+class GeminiService(AIServiceBase):
     """Service for interacting with Gemini API."""
     
     def __init__(self):
-        self.model_name = settings.GEMINI_MODEL
-        self.model = genai.GenerativeModel(self.model_name)
+        super().__init__(settings.GEMINI_MODEL, settings.GEMINI_API_KEY)
+        # GenerativeModel instances are immutable configuration, so one per
+        # (model, system instruction, generation config) serves every call
+        self._models = TTLCache(maxsize=settings.GEMINI_MODEL_POOL_SIZE, ttl=24 * 3600)
+        self.model = self._get_model()
         logger.info(f"Initialized Gemini service with model: {self.model_name}")
-    
+
+    @property
+    def provider_name(self) -> str:
+        return "Gemini"
+
+    @property
+    def supports_streaming(self) -> bool:
+        return True
+
+    @property
+    def supports_images(self) -> bool:
+        return True
+
+    def estimate_cost(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> float:
+        """
+        Estimate cost for Gemini API usage.
+
+        Pricing (as of Dec 2025):
+        - Gemini Pro: $0.00125/1K input, $0.01/1K output
+        - Gemini Flash: $0.0003/1K input, $0.0025/1K output
+        - Cached input tokens cost a tenth of the input price
+        """
+        # Cache hits are part of prompt_tokens
+        prompt_tokens = prompt_tokens - cached_tokens + cached_tokens * 0.1
+
+        if "pro" in self.model_name.lower():
+            prompt_cost = (prompt_tokens / 1000) * 0.00125
+            completion_cost = (completion_tokens / 1000) * 0.01
+        else:  # Flash models
+            prompt_cost = (prompt_tokens / 1000) * 0.0003
+            completion_cost = (completion_tokens / 1000) * 0.0025
+
+        return prompt_cost + completion_cost
+
+    def _record_response_usage(self, response: Any) -> None:
+        """Record a response's token usage, including context cache hits."""
+        usage = getattr(response, "usage_metadata", None)
+        if not usage:
+            return
+        prompt_tokens = usage.prompt_token_count or 0
+        completion_tokens = usage.candidates_token_count or 0
+        cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+        self.record_usage(AIUsageStats(
+            model_name=self.model_name,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=usage.total_token_count or prompt_tokens + completion_tokens,
+            estimated_cost=self.estimate_cost(prompt_tokens, completion_tokens, cached_tokens=cached_tokens),
+            timestamp=datetime.now(timezone.utc),
+            cached_prompt_tokens=cached_tokens,
+        ))
+
+    @staticmethod
+    def _split_messages(
+        messages: List[Union[Dict[str, Any], AIMessage]],
+        system_instruction: Optional[str],
+    ) -> Tuple[Optional[str], bool, List[Dict[str, Any]]]:
+        """
+        Separate system messages from the conversation.
+
+        Messages may be dicts or AIMessage. System messages are appended to
+        system_instruction; if one of them is flagged cache=True, the
+        resulting instruction is served from a context cache.
+
+        Returns:
+            (system instruction, cache it, remaining {"role", "content"} messages)
+        """
+        system_parts = [system_instruction] if system_instruction else []
+        cache = False
+        conversation = []
+        for msg in messages:
+            if isinstance(msg, AIMessage):
+                role, content, msg_cache = msg.role, msg.content, msg.cache
+            else:
+                role, content, msg_cache = msg["role"], msg["content"], bool(msg.get("cache"))
+            if role == "system":
+                system_parts.append(content)
+                cache = cache or msg_cache
+            else:
+                conversation.append({"role": role, "content": content})
+        return ("\n\n".join(system_parts) or None), cache, conversation
+
+    def _get_model(
+        self,
+        system_instruction: Optional[str] = None,
+        generation_config: Optional[Dict[str, Any]] = None,
+        cached_content: Any = None,
+    ) -> genai.GenerativeModel:
+        """
+        Pooled GenerativeModel for a system instruction and generation config.
+
+        Args:
+            system_instruction: System instruction baked into the model
+            generation_config: Generation parameters baked into the model
+            cached_content: CachedContent to build the model from instead
+                (it carries the model and system instruction itself)
+
+        Returns:
+            Shared model instance
+        """
+        if cached_content is not None:
+            key = ("cached", cached_content.name)
+        else:
+            instruction_hash = (
+                hashlib.sha256(system_instruction.encode("utf-8")).hexdigest() if system_instruction else None
+            )
+            key = (self.model_name, instruction_hash, tuple(sorted((generation_config or {}).items())))
+
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        metrics.increment("gemini.model_pool_misses")
+        if cached_content is not None:
+            model = genai.GenerativeModel.from_cached_content(cached_content)
+        else:
+            model = genai.GenerativeModel(
+                self.model_name,
+                system_instruction=system_instruction,
+                generation_config=generation_config,
+            )
+        self._models.set(key, model)
+        return model
+
+    async def _chat_model(self, system_instruction: Optional[str], cache: bool) -> Any:
+        """Model for a chat call, built from an explicit context cache when worthwhile."""
+        if not system_instruction:
+            return self.model
+        if cache and settings.PROMPT_CACHE_ENABLED:
+            cached_content = await gemini_context_cache.get(self.model_name, system_instruction, self._run_blocking)
+            if cached_content is not None:
+                return self._get_model(cached_content=cached_content)
+        # Still a stable prefix, which Gemini's implicit caching can pick up
+        return self._get_model(system_instruction)
+
+    async def _run_blocking(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Run a blocking SDK call on the Gemini executor.
+
+        Args:
+            func: Synchronous SDK callable
+            timeout: Seconds to wait (defaults to settings.GEMINI_REQUEST_TIMEOUT)
+
+        Returns:
+            Whatever func returns
+
+        Raises:
+            asyncio.TimeoutError: If the call (including time queued behind other
+                calls) does not finish within the timeout
+        """
+        timeout = timeout or settings.GEMINI_REQUEST_TIMEOUT
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(_executor, call), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Gemini call {getattr(func, '__name__', func)} timed out after {timeout}s")
+            raise
+
+    @staticmethod
+    def _request_options(timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Request options so the SDK itself also gives up on a hung call."""
+        return {"timeout": timeout or settings.GEMINI_REQUEST_TIMEOUT}
+
+    async def _pump_stream(self, response) -> AsyncGenerator[str, None]:
+        """
+        Relay a blocking SDK response stream to async consumers.
+
+        A producer on the Gemini executor iterates the SDK stream and hands each
+        chunk over through a queue bounded to GEMINI_STREAM_BUFFER_SIZE chunks.
+        When the consumer (the HTTP response) falls behind, the producer blocks
+        instead of buffering the whole answer, for at most
+        GEMINI_STREAM_IDLE_TIMEOUT before it gives up on a stalled client;
+        when the consumer goes away, the producer stops at the next chunk.
+        Producers run on a separate executor of GEMINI_MAX_STREAMS threads.
+
+        Args:
+            response: Iterable returned by send_message(..., stream=True)
+
+        Yields:
+            Text chunks in the order the model produced them
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        slots = threading.Semaphore(settings.GEMINI_STREAM_BUFFER_SIZE)
+        cancelled = threading.Event()
+        end_of_stream = object()
+
+        def hand_over(item: Any) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Event loop already closed; nobody is listening any more
+                cancelled.set()
+
+        def produce() -> None:
+            try:
+                for chunk in response:
+                    text = chunk.text
+                    if not text:
+                        continue
+                    if not slots.acquire(timeout=settings.GEMINI_STREAM_IDLE_TIMEOUT):
+                        # The client stopped reading; free the thread
+                        cancelled.set()
+                        hand_over(asyncio.TimeoutError("Stream consumer stalled"))
+                        break
+                    if cancelled.is_set():
+                        break
+                    hand_over(text)
+            except Exception as e:
+                hand_over(e)
+            finally:
+                hand_over(end_of_stream)
+
+        producer = loop.run_in_executor(_stream_executor, produce)
+        try:
+            while True:
+                item = await asyncio.wait_for(queue.get(), timeout=settings.GEMINI_STREAM_IDLE_TIMEOUT)
+                if item is end_of_stream:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                slots.release()
+                yield item
+        finally:
+            if not producer.done():
+                cancelled.set()
+                slots.release()  # Unblock a producer waiting for buffer space
+
+    @llm_cache.cached
+    @single_flight.coalesced
     async def generate_text(
         self,
         prompt: str,
         system_instruction: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
     ) -> str:
         """
         Generate text using Gemini API.
@@ -42,6 +327,7 @@ class GeminiService:
             system_instruction: System instruction for the model
             temperature: Sampling temperature (0.0 to 1.0)
             max_tokens: Maximum tokens to generate
+            timeout: Per-call timeout in seconds (defaults to GEMINI_REQUEST_TIMEOUT)
         
         Returns:
             Generated text
@@ -54,22 +340,18 @@ class GeminiService:
             if max_tokens:
                 generation_config["max_output_tokens"] = max_tokens
             
-            # Create model with system instruction if provided
-            if system_instruction:
-                model = genai.GenerativeModel(
-                    self.model_name,
-                    system_instruction=system_instruction,
-                    generation_config=generation_config,
-                )
-            else:
-                model = genai.GenerativeModel(
-                    self.model_name,
-                    generation_config=generation_config,
-                )
+            # Pooled model with the system instruction and config baked in
+            model = self._get_model(system_instruction, generation_config)
             
             # Generate content
-            response = model.generate_content(prompt)
+            response = await self._run_blocking(
+                model.generate_content,
+                prompt,
+                request_options=self._request_options(timeout),
+                timeout=timeout,
+            )
             
+            self._record_response_usage(response)
             logger.info(f"Generated text with {len(response.text)} characters")
             return response.text
         
@@ -83,6 +365,7 @@ class GeminiService:
         document_type: str,
         filename: str = "",
         image_paths: Optional[List[str]] = None,
+        images: Optional[List[Dict[str, Any]]] = None,
     ) -> Dict[str, Any]:
         """
         Analyze a document with optional images and extract structured information.
@@ -92,19 +375,25 @@ class GeminiService:
             document_type: Type of document (e.g., "prd", "pptx", "pdf")
             filename: Original filename
             image_paths: Optional list of image file paths from document
+            images: Optional in-memory images as {"mime_type", "data"} dicts,
+                sent inline instead of being uploaded from disk
 
         Returns:
             Structured analysis result
         """
+        image_paths = image_paths or []
+        images = images or []
+        image_count = len(image_paths) + len(images)
+
         prompt = f"""
 请分析以下文档（文件名：{filename}），提取关键信息：
 
 文档类型：{document_type}
 
 文档内容：
-{document_content[:5000]}
+{get_token_counter("gemini").truncate(document_content, settings.ANALYSIS_DOCUMENT_TOKENS)}
 
-{"另外，文档中包含 " + str(len(image_paths)) + " 张图片，请仔细分析这些图片中的UI设计、流程图、架构图等信息，提取其中的关键要素。" if image_paths else ""}
+{"另外，文档中包含 " + str(image_count) + " 张图片，请仔细分析这些图片中的UI设计、流程图、架构图等信息，提取其中的关键要素。" if image_count else ""}
 
 请以JSON格式返回分析结果，包括：
 1. 文档概述（summary）：简要描述文档的主要内容
@@ -124,24 +413,31 @@ class GeminiService:
 """
 
         try:
-            if image_paths and len(image_paths) > 0:
+            if image_count > 0:
                 # Upload images and create multimodal request
                 parts = [prompt]
-                for img_path in image_paths[:10]:  # Limit to 10 images
-                    try:
-                        uploaded_file = genai.upload_file(img_path)
-                        parts.append(uploaded_file)
-                        logger.info(f"Added image to document analysis: {img_path}")
-                    except Exception as img_error:
-                        logger.warning(f"Failed to upload image {img_path}: {img_error}")
-
-                response = self.model.generate_content(parts)
+                inline_images = images[:10]  # Limit to 10 images
+                # Inline images need no upload round trip
+                for image in inline_images:
+                    parts.append({"mime_type": image["mime_type"], "data": image["data"]})
+                # Uploaded once per image content, new ones concurrently
+                parts.extend(await gemini_file_cache.upload_many(
+                    image_paths[:10 - len(inline_images)], self._run_blocking
+                ))
+
+                response = await self._run_blocking(
+                    self.model.generate_content,
+                    parts,
+                    request_options=self._request_options(),
+                )
+                self._record_response_usage(response)
                 response_text = response.text
             else:
                 response_text = await self.generate_text(
                     prompt=prompt,
                     system_instruction="你是一个专业的产品需求分析助手，擅长从文档中提取结构化信息。请始终返回有效的JSON格式。",
                     temperature=0.3,
+                    cache=True,
                 )
 
             # Parse JSON response
@@ -194,7 +490,7 @@ class GeminiService:
 文档类型：{document_type}
 
 文档内容：
-{document_content[:5000]}  # 限制长度避免超出 token 限制
+{get_token_counter("gemini").truncate(document_content, settings.ANALYSIS_DOCUMENT_TOKENS)}
 
 请以JSON格式返回分析结果，包括：
 1. 文档概述（summary）：简要描述文档的主要内容
@@ -218,6 +514,7 @@ class GeminiService:
                 prompt=prompt,
                 system_instruction="你是一个专业的产品需求分析助手，擅长从文档中提取结构化信息。请始终返回有效的JSON格式。",
                 temperature=0.3,  # Lower temperature for more consistent extraction
+                cache=True,
             )
             
             # Try to parse JSON, if fails, return raw text
@@ -248,6 +545,37 @@ class GeminiService:
             logger.error(f"Error analyzing document: {str(e)}")
             raise
     
+    async def embed_texts(
+        self,
+        texts: List[str],
+        task_type: str = "retrieval_document",
+        model: str = "models/text-embedding-004",
+    ) -> List[List[float]]:
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts: Texts to embed (at most 100 per call)
+            task_type: "retrieval_document" for indexed chunks, "retrieval_query" for queries
+            model: Embedding model name
+
+        Returns:
+            One vector per input text
+        """
+        try:
+            result = await self._run_blocking(
+                genai.embed_content,
+                model=model,
+                content=texts,
+                task_type=task_type,
+                request_options=self._request_options(),
+            )
+            return result["embedding"]
+
+        except Exception as e:
+            logger.error(f"Error embedding {len(texts)} texts: {str(e)}")
+            raise
+
     async def analyze_image(
         self,
         image_path: str,
@@ -262,8 +590,8 @@ class GeminiService:
             Structured analysis result
         """
         try:
-            # Upload image
-            image_file = genai.upload_file(image_path)
+            # Upload image (reused if this content was uploaded before)
+            image_file = await gemini_file_cache.upload(image_path, self._run_blocking)
             
             prompt = """
 请分析这张UI截图，提取以下信息：
@@ -276,8 +604,13 @@ class GeminiService:
 请以JSON格式返回分析结果。
 """
             
-            response = self.model.generate_content([prompt, image_file])
+            response = await self._run_blocking(
+                self.model.generate_content,
+                [prompt, image_file],
+                request_options=self._request_options(),
+            )
             
+            self._record_response_usage(response)
             logger.info(f"Analyzed image: {image_path}")
             
             # TODO: Parse JSON response
@@ -287,36 +620,40 @@ class GeminiService:
             logger.error(f"Error analyzing image: {str(e)}")
             raise
     
+    @llm_cache.cached
+    @single_flight.coalesced
     async def chat(
         self,
         messages: List[Dict[str, Any]],
         system_instruction: Optional[str] = None,
         temperature: float = 0.7,
         image_paths: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+        max_tokens: Optional[int] = None,
     ) -> str:
         """
         Chat with Gemini using conversation history, with optional image support.
         
         Args:
-            messages: List of messages [{"role": "user", "content": "..."}, ...]
+            messages: List of messages [{"role": "user", "content": "..."}, ...]; "system"
+                messages are appended to system_instruction, and one marked "cache": True
+                has the instruction served from a Gemini context cache
             system_instruction: System instruction
             temperature: Sampling temperature
             image_paths: Optional list of image file paths to include in the last message
+            timeout: Per-call timeout in seconds (defaults to GEMINI_REQUEST_TIMEOUT)
+            max_tokens: Maximum tokens to generate
         
         Returns:
             Assistant's response
         """
         try:
-            # Create chat session
-            if system_instruction:
-                model = genai.GenerativeModel(
-                    self.model_name,
-                    system_instruction=system_instruction,
-                )
-            else:
-                model = self.model
+            # Create chat session; system messages join the (cacheable) instruction
+            system_instruction, cache, messages = self._split_messages(messages, system_instruction)
+            model = await self._chat_model(system_instruction, cache)
             
             chat = model.start_chat(history=[])
+            generation_config = {"max_output_tokens": max_tokens} if max_tokens else None
             
             # Add history (all messages except the last one)
             for msg in messages[:-1]:
@@ -333,24 +670,31 @@ class GeminiService:
                 # Upload images and create multimodal message
                 parts = []
                 
-                # Add images first
-                for img_path in image_paths:
-                    try:
-                        uploaded_file = genai.upload_file(img_path)
-                        parts.append(uploaded_file)
-                        logger.info(f"Uploaded image: {img_path}")
-                    except Exception as img_error:
-                        logger.error(f"Failed to upload image {img_path}: {img_error}")
+                # Add images first; each image content is uploaded only once
+                parts.extend(await gemini_file_cache.upload_many(image_paths, self._run_blocking))
                 
                 # Add text
                 parts.append(last_message_content)
                 
                 # Send multimodal message
-                response = chat.send_message(parts)
+                response = await self._run_blocking(
+                    chat.send_message,
+                    parts,
+                    generation_config=generation_config,
+                    request_options=self._request_options(timeout),
+                    timeout=timeout,
+                )
             else:
                 # Send text-only message
-                response = chat.send_message(last_message_content)
+                response = await self._run_blocking(
+                    chat.send_message,
+                    last_message_content,
+                    generation_config=generation_config,
+                    request_options=self._request_options(timeout),
+                    timeout=timeout,
+                )
             
+            self._record_response_usage(response)
             logger.info(f"Chat response generated with {len(response.text)} characters")
             return response.text
 
@@ -358,9 +702,10 @@ class GeminiService:
             logger.error(f"Error in chat: {str(e)}")
             raise
 
+    @single_flight.coalesced
     async def chat_stream(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         system_instruction: Optional[str] = None,
         temperature: float = 0.7,
         image_paths: Optional[List[str]] = None,
@@ -369,7 +714,7 @@ class GeminiService:
         Chat with Gemini using conversation history with streaming response.
 
         Args:
-            messages: List of messages [{"role": "user", "content": "..."}, ...]
+            messages: List of messages, as for chat()
             system_instruction: System instruction
             temperature: Sampling temperature
             image_paths: Optional list of image file paths to include in the last message
@@ -378,14 +723,9 @@ class GeminiService:
             Text chunks as they are generated
         """
         try:
-            # Create chat session
-            if system_instruction:
-                model = genai.GenerativeModel(
-                    self.model_name,
-                    system_instruction=system_instruction,
-                )
-            else:
-                model = self.model
+            # Create chat session; system messages join the (cacheable) instruction
+            system_instruction, cache, messages = self._split_messages(messages, system_instruction)
+            model = await self._chat_model(system_instruction, cache)
 
             chat = model.start_chat(history=[])
 
@@ -404,29 +744,34 @@ class GeminiService:
                 # Upload images and create multimodal message
                 parts = []
 
-                # Add images first
-                for img_path in image_paths:
-                    try:
-                        uploaded_file = genai.upload_file(img_path)
-                        parts.append(uploaded_file)
-                        logger.info(f"Uploaded image: {img_path}")
-                    except Exception as img_error:
-                        logger.error(f"Failed to upload image {img_path}: {img_error}")
+                # Add images first; each image content is uploaded only once
+                parts.extend(await gemini_file_cache.upload_many(image_paths, self._run_blocking))
 
                 # Add text
                 parts.append(last_message_content)
 
                 # Send multimodal message with streaming
-                response = chat.send_message(parts, stream=True)
+                response = await self._run_blocking(
+                    chat.send_message,
+                    parts,
+                    stream=True,
+                    request_options=self._request_options(),
+                )
             else:
                 # Send text-only message with streaming
-                response = chat.send_message(last_message_content, stream=True)
+                response = await self._run_blocking(
+                    chat.send_message,
+                    last_message_content,
+                    stream=True,
+                    request_options=self._request_options(),
+                )
 
             # Yield chunks as they arrive
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+            async for text in self._pump_stream(response):
+                yield text
 
+            # Usage metadata is complete once the stream has been consumed
+            self._record_response_usage(response)
             logger.info("Chat streaming completed")
 
         except Exception as e:
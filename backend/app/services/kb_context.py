@@ -0,0 +1,368 @@
+"""
+Knowledge base prompt context, rendered once per KB version.
+
+Chat turns, PRD section generation, export and wireframes all turn the
+project's knowledge base into a markdown block for the prompt. The
+renderers live here and their output is cached by (project_id, KB version,
+renderer), so a chat turn normally costs a dictionary lookup: the current
+version and status of each project's KB are cached too. Entries are
+dropped when a knowledge base changes in this process; cached versions
+expire after KB_VERSION_CACHE_TTL_SECONDS to pick up writes from other
+processes.
+
+Archived requirements are not part of the cached chat block. Each chat turn
+retrieves the entries most relevant to the user's message instead (see
+get_relevant_history).
+"""
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.app.core.cache import TTLCache
+from backend.app.core.config import settings
+from backend.app.core.metrics import metrics
+from backend.app.models.knowledge_base import KnowledgeBase
+from backend.app.services.context_assembler import ContextAssembler, ContextSlot
+from backend.app.services.knowledge_events import on_knowledge_base_changed
+from backend.app.services.search_index import SearchDocument, search_index_registry
+
+logger = logging.getLogger(__name__)
+
+
+def archive_order(doc_id: str) -> Tuple:
+    """Sort key of a search document id: 'requirement:10' -> ('requirement', 10)."""
+    kind, *indices = doc_id.split(":")
+    return (kind, *(int(index) if index.isdigit() else index for index in indices))
+
+
+def render_chat_context(data: Dict[str, Any]) -> str:
+    """Knowledge base block for the chat system prompt."""
+    context_parts = ["# 项目知识库\n"]
+
+    # System overview
+    if data.get("system_overview"):
+        overview = data["system_overview"]
+        context_parts.append("## 系统概览")
+        if overview.get("product_type"):
+            context_parts.append(f"产品类型：{overview['product_type']}")
+        if overview.get("core_modules"):
+            context_parts.append(f"核心模块：{', '.join(overview['core_modules'])}")
+        if overview.get("description"):
+            context_parts.append(f"描述：{overview['description']}")
+        context_parts.append("")
+
+    # UI standards
+    if data.get("ui_standards"):
+        ui = data["ui_standards"]
+        context_parts.append("## UI规范")
+        if ui.get("primary_colors"):
+            context_parts.append(f"主色调：{', '.join(ui['primary_colors'])}")
+        if ui.get("component_library"):
+            context_parts.append(f"组件库：{ui['component_library']}")
+        if ui.get("layout_features"):
+            context_parts.append(f"布局特征：{', '.join(ui['layout_features'])}")
+        context_parts.append("")
+
+    # Tech conventions
+    if data.get("tech_conventions"):
+        tech = data["tech_conventions"]
+        context_parts.append("## 技术约定")
+        if tech.get("naming_style"):
+            context_parts.append(f"命名风格：{tech['naming_style']}")
+        if tech.get("api_style"):
+            context_parts.append(f"API风格：{tech['api_style']}")
+        if tech.get("known_fields"):
+            context_parts.append("已知字段：")
+            for field in tech["known_fields"][:5]:  # Limit to 5 fields
+                context_parts.append(f"  - {field.get('name')}: {field.get('type')} - {field.get('usage')}")
+        context_parts.append("")
+
+    return "\n".join(context_parts)
+
+
+def render_history_entry(doc: SearchDocument) -> str:
+    """One archived requirement or feature for the chat prompt."""
+    lines = [f"### {doc.title or '未命名需求'}"]
+    if doc.module_name:
+        lines.append(f"**所属模块**: {doc.module_name}")
+    lines.append(f"**描述**: {doc.description or '暂无描述'}")
+    if doc.content:
+        lines.append(f"**关键要点**: {doc.content}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def render_prd_context(data: Dict[str, Any]) -> str:
+    """Short project background for PRD section prompts."""
+    if not data:
+        return ""
+
+    context = "项目背景知识：\n"
+
+    if "system_overview" in data:
+        so = data["system_overview"]
+        context += f"- 产品类型：{so.get('product_type', '未知')}\n"
+        context += f"- 产品描述：{so.get('description', '无')}\n"
+
+    if "tech_conventions" in data:
+        tc = data["tech_conventions"]
+        context += f"- API 风格：{tc.get('api_style', '未知')}\n"
+        context += f"- 命名风格：{tc.get('naming_style', '未知')}\n"
+
+    return context
+
+
+def render_export_context(data: Dict[str, Any]) -> str:
+    """Knowledge base section for exported PRDs."""
+    lines = []
+
+    # System overview
+    if data.get("system_overview"):
+        overview = data["system_overview"]
+        lines.append("## 系统概览")
+        if overview.get("product_type"):
+            lines.append(f"- 产品类型：{overview['product_type']}")
+        if overview.get("core_modules"):
+            lines.append(f"- 核心模块：{', '.join(overview['core_modules'])}")
+        if overview.get("description"):
+            lines.append(f"- 描述：{overview['description']}")
+        lines.append("")
+
+    # UI standards
+    if data.get("ui_standards"):
+        ui = data["ui_standards"]
+        lines.append("## UI规范")
+        if ui.get("primary_colors"):
+            lines.append(f"- 主色调：{', '.join(ui['primary_colors'])}")
+        if ui.get("component_library"):
+            lines.append(f"- 组件库：{ui['component_library']}")
+        if ui.get("layout_features"):
+            lines.append(f"- 布局特征：{', '.join(ui['layout_features'])}")
+        lines.append("")
+
+    # Tech conventions
+    if data.get("tech_conventions"):
+        tech = data["tech_conventions"]
+        lines.append("## 技术约定")
+        if tech.get("naming_style"):
+            lines.append(f"- 命名风格：{tech['naming_style']}")
+        if tech.get("api_style"):
+            lines.append(f"- API风格：{tech['api_style']}")
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+def render_wireframe_context(data: Dict[str, Any]) -> str:
+    """Product and design facts for wireframe prompts."""
+    lines = []
+
+    # Extract key information from knowledge base
+    if data.get("project_overview"):
+        overview = data["project_overview"]
+        lines.append("## 项目概览")
+        if overview.get("product_type"):
+            lines.append(f"- 产品类型：{overview['product_type']}")
+        if overview.get("target_users"):
+            lines.append(f"- 目标用户：{overview['target_users']}")
+        lines.append("")
+
+    if data.get("ui_ux_design"):
+        ui = data["ui_ux_design"]
+        lines.append("## UI/UX 设计")
+        if ui.get("design_system"):
+            lines.append(f"- 设计系统：{ui['design_system']}")
+        if ui.get("color_scheme"):
+            lines.append(f"- 配色方案：{ui['color_scheme']}")
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+RENDERERS: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    "chat": render_chat_context,
+    "prd": render_prd_context,
+    "export": render_export_context,
+    "wireframe": render_wireframe_context,
+}
+
+
+class KnowledgeContextCache:
+    """LRU cache of rendered knowledge base context blocks."""
+
+    def __init__(self, maxsize: int, version_ttl: float):
+        # Keys include the KB version, so rendered entries never go stale
+        self._rendered = TTLCache(maxsize=maxsize, ttl=24 * 3600)
+        # project_id -> (version, status) of its knowledge base
+        self._versions = TTLCache(maxsize=4096, ttl=version_ttl)
+        on_knowledge_base_changed(self.invalidate)
+
+    def render(self, kb: KnowledgeBase, renderer: str) -> str:
+        """
+        Rendered context for an already loaded knowledge base.
+
+        Raises:
+            ValueError: If the renderer is unknown
+        """
+        render_func = RENDERERS.get(renderer)
+        if render_func is None:
+            raise ValueError(f"Unknown knowledge base renderer: {renderer}")
+
+        key = (kb.project_id, kb.version, renderer)
+        rendered = self._rendered.get(key)
+        if rendered is not None:
+            metrics.increment("kb_context.cache_hits")
+            return rendered
+
+        metrics.increment("kb_context.cache_misses")
+        rendered = render_func(kb.structured_data or {})
+        self._rendered.set(key, rendered)
+        return rendered
+
+    async def _state(self, db: AsyncSession, project_id: UUID) -> Optional[Tuple[int, str]]:
+        """(version, status) of a project's knowledge base, or None if it has none."""
+        state: Optional[Tuple[int, str]] = self._versions.get(project_id)
+        if state is None:
+            result = await db.execute(
+                select(KnowledgeBase.version, KnowledgeBase.status)
+                .where(KnowledgeBase.project_id == project_id)
+            )
+            row = result.one_or_none()
+            if row is None:
+                return None
+            state = (row.version, row.status)
+            self._versions.set(project_id, state)
+        return state
+
+    async def _load(self, db: AsyncSession, project_id: UUID) -> Optional[KnowledgeBase]:
+        result = await db.execute(
+            select(KnowledgeBase).where(KnowledgeBase.project_id == project_id)
+        )
+        kb = result.scalar_one_or_none()
+        if kb is not None:
+            self._versions.set(project_id, (kb.version, kb.status))
+        return kb
+
+    async def get_context(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        renderer: str,
+        confirmed_only: bool = True,
+    ) -> Optional[str]:
+        """
+        Rendered context for a project, loading the knowledge base only on a miss.
+
+        Args:
+            db: Database session
+            project_id: Project ID
+            renderer: Key of RENDERERS
+            confirmed_only: Return None unless the knowledge base is confirmed
+
+        Returns:
+            Context string, or None if there is no (confirmed) knowledge base
+        """
+        state = await self._state(db, project_id)
+        if state is None:
+            return None
+
+        version, kb_status = state
+        if confirmed_only and kb_status != "confirmed":
+            return None
+
+        rendered = self._rendered.get((project_id, version, renderer))
+        if rendered is not None:
+            metrics.increment("kb_context.cache_hits")
+            return rendered
+
+        kb = await self._load(db, project_id)
+        if kb is None:
+            return None
+        if confirmed_only and kb.status != "confirmed":
+            return None
+        return self.render(kb, renderer)
+
+    async def get_relevant_history(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        query: str,
+        top_k: int,
+        max_tokens: int,
+        confirmed_only: bool = True,
+    ) -> Optional[str]:
+        """
+        Archived requirements and features most relevant to a chat message.
+
+        Entries are ranked with the project's BM25 index, which is kept per KB
+        version, so the knowledge base is only loaded when the index is not
+        synced yet. If nothing matches (e.g. "好的，继续"), the most recently
+        completed entries are used instead. At most top_k entries are
+        included, best first, within max_tokens.
+
+        Args:
+            db: Database session
+            project_id: Project ID
+            query: The user's message
+            top_k: Most entries to include
+            max_tokens: Token budget of the whole block
+            confirmed_only: Return None unless the knowledge base is confirmed
+
+        Returns:
+            Markdown block, or None if there is nothing to include
+        """
+        state = await self._state(db, project_id)
+        if state is None:
+            return None
+        version, kb_status = state
+        if confirmed_only and kb_status != "confirmed":
+            return None
+
+        index = search_index_registry.peek(project_id, version)
+        if index is None:
+            kb = await self._load(db, project_id)
+            if kb is None or (confirmed_only and kb.status != "confirmed"):
+                return None
+            index = search_index_registry.get_index(kb)
+
+        matches = [
+            doc for doc, _ in index.search(query, doc_filter=lambda doc: doc.type == "requirement")[:top_k]
+        ]
+        if matches:
+            metrics.increment("kb_context.history_retrieved")
+            heading = "以下是项目中与当前问题最相关的已完成需求，请在设计新需求时参考这些内容，避免冲突或重复："
+        else:
+            metrics.increment("kb_context.history_fallback")
+            # requirement:<i> and feature:<i>:<j> ids follow archive order, so the
+            # sort falls back to it for entries without a timestamp
+            recent = sorted(
+                (doc for doc in index.docs.values() if doc.type == "requirement"),
+                key=lambda doc: (doc.created_at or "", archive_order(doc.doc_id)),
+                reverse=True,
+            )
+            matches = recent[:top_k]
+            heading = "以下是项目中最近完成的需求，请在设计新需求时参考这些内容，避免冲突或重复："
+        if not matches:
+            return None
+
+        header = f"## 相关历史需求\n{heading}\n"
+        assembled = ContextAssembler(max_tokens, provider="gemini").assemble([
+            ContextSlot("header", header, required=True),
+            ContextSlot("entries", [render_history_entry(doc) for doc in matches]),
+        ])
+        if not assembled.items["entries"]:
+            return None
+        return header + "\n" + assembled["entries"]
+
+    def invalidate(self, project_id: UUID) -> None:
+        """Drop a project's cached version and rendered blocks."""
+        self._versions.pop(project_id)
+        self._rendered.invalidate(lambda key: key[0] == project_id)
+
+
+# Global instance
+kb_context_cache = KnowledgeContextCache(
+    maxsize=settings.KB_CONTEXT_CACHE_SIZE,
+    version_ttl=settings.KB_VERSION_CACHE_TTL_SECONDS,
+)
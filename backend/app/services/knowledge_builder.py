@@ -5,6 +5,8 @@ Integrates all file analysis results into a structured knowledge base.
 import logging
 import json
 from typing import List, Dict, Any
+from backend.app.core.config import settings
+from backend.app.services.context_assembler import ContextAssembler, ContextSlot
 from backend.app.services.gemini_service import gemini_service
 
 logger = logging.getLogger(__name__)
@@ -45,8 +47,13 @@ class KnowledgeBuilder:
         project_name: str,
         file_analyses: List[Dict[str, Any]],
     ) -> str:
-        """Prepare context string from all file analyses."""
-        context_parts = [
+        """
+        Prepare context string from all file analyses.
+
+        Files are added in order until KB_BUILD_CONTEXT_TOKENS is spent; the
+        first file that does not fit is cut rather than dropped.
+        """
+        header_parts = [
             f"项目名称：{project_name}",
             f"共分析了 {len(file_analyses)} 个文件",
             "",
@@ -54,7 +61,9 @@ class KnowledgeBuilder:
             ""
         ]
         
+        file_blocks = []
         for i, analysis in enumerate(file_analyses, 1):
+            context_parts = []
             filename = analysis.get('filename', f'文件{i}')
             file_type = analysis.get('file_type', 'unknown')
             result = analysis.get('analysis', {})
@@ -89,15 +98,25 @@ class KnowledgeBuilder:
             
             context_parts.append("---")
             context_parts.append("")
-        
-        return "\n".join(context_parts)
+            file_blocks.append("\n".join(context_parts))
+
+        assembled = ContextAssembler(settings.KB_BUILD_CONTEXT_TOKENS, provider="gemini").assemble([
+            ContextSlot("header", "\n".join(header_parts), required=True),
+            ContextSlot("files", file_blocks),
+        ])
+        if "files" in assembled.truncated:
+            logger.info(
+                f"Knowledge base context holds {len(assembled.items['files'])} of "
+                f"{len(file_blocks)} file analyses within {settings.KB_BUILD_CONTEXT_TOKENS} tokens"
+            )
+        return assembled["header"] + "\n" + assembled["files"]
     
     async def _generate_knowledge_base(self, context: str) -> Dict[str, Any]:
         """Generate structured knowledge base using Gemini."""
         prompt = f"""
 请你作为一个资深的产品分析专家，深入分析以下项目文档，提取尽可能多的有价值信息，构建一个全面、详尽的项目知识库。
 
-{context[:15000]}
+{context}
 
 请以JSON格式返回知识库，包含以下部分（请尽可能详细、全面地填充每个部分）：
 
@@ -353,6 +372,7 @@ class KnowledgeBuilder:
                 prompt=prompt,
                 system_instruction="你是一个专业的产品需求分析助手，擅长整合多个文档的信息，生成结构化的项目知识库。请始终返回有效的JSON格式。",
                 temperature=0.3,
+                cache=True,
             )
             
             # Parse JSON response
@@ -0,0 +1,58 @@
+"""
+Change notifications for knowledge bases.
+
+Caches derived from a knowledge base (search results, rendered context)
+register a listener here. Listeners are called with the project id after
+any session commits an insert, update or delete of a KnowledgeBase row in
+this process, so no write path has to remember to invalidate them. Writes
+from other processes (Celery workers) are not seen; caches bound that
+staleness with a TTL.
+"""
+import logging
+from itertools import chain
+from typing import Callable, List
+from uuid import UUID
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from backend.app.models.knowledge_base import KnowledgeBase
+
+logger = logging.getLogger(__name__)
+
+_SESSION_KEY = "changed_knowledge_base_projects"
+
+_listeners: List[Callable[[UUID], None]] = []
+
+
+def on_knowledge_base_changed(listener: Callable[[UUID], None]) -> Callable[[UUID], None]:
+    """Register a listener (usable as a decorator)."""
+    _listeners.append(listener)
+    return listener
+
+
+def notify_knowledge_base_changed(project_id: UUID) -> None:
+    """Call every listener for a project; a failing listener does not stop the others."""
+    for listener in _listeners:
+        try:
+            listener(project_id)
+        except Exception as e:
+            logger.warning(f"Knowledge base change listener {listener.__name__} failed: {str(e)}")
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context) -> None:
+    # new/dirty/deleted still hold the pre-flush state here
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, KnowledgeBase) and obj.project_id is not None:
+            session.info.setdefault(_SESSION_KEY, set()).add(obj.project_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _fire_changes(session: Session) -> None:
+    # Fire only once the change is visible to other sessions
+    for project_id in session.info.pop(_SESSION_KEY, ()):
+        notify_knowledge_base_changed(project_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session) -> None:
+    session.info.pop(_SESSION_KEY, None)
@@ -10,6 +10,7 @@ from sqlalchemy.orm.attributes import flag_modified
 from backend.app.models.knowledge_base import KnowledgeBase
 from backend.app.models.conversation import Conversation, Message
 from backend.app.services.gemini_service import GeminiService
+from backend.app.services.suggestion_index import suggestion_index_registry
 from datetime import datetime
 import json
 import re
@@ -83,9 +84,13 @@ class KnowledgeEvolutionService:
         # Update knowledge base
         kb.structured_data = data
         flag_modified(kb, "structured_data")
+        kb.version += 1
         await db.commit()
 
-        logger.info(f"Evolved knowledge base for project {project_id}")
+        # Insert the new module/feature/component names into the typeahead index
+        suggestion_index_registry.sync(kb, create=False)
+
+        logger.info(f"Evolved knowledge base for project {project_id} (version {kb.version})")
 
     def _initialize_kb_structure(self, data: Dict[str, Any], req_summary: Dict[str, Any]) -> None:
         """Initialize knowledge base structure if not exists."""
@@ -0,0 +1,406 @@
+"""
+Hybrid knowledge base search.
+
+Knowledge base entries are ranked twice, by BM25 (lexical) and by
+embedding similarity, and the two rankings are merged with reciprocal rank
+fusion: score = sum over rankings of 1 / (RRF_K + rank). RRF needs no score
+calibration between the rankers, so exact keyword hits and paraphrases both
+surface without hand-tuned weights.
+
+Ranked results are cached per (project, KB version, normalized query,
+filters). The current KB version per project is cached as well, so a
+repeated query is answered without touching the database. Both caches are
+invalidated when a knowledge base changes in this process and expire after
+SEARCH_CACHE_TTL_SECONDS otherwise.
+
+Federated search fans a query out over every project's index and merges
+the per-project result lists into one global top-k.
+"""
+import asyncio
+import heapq
+import logging
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.app.core.cache import TTLCache
+from backend.app.core.config import settings
+from backend.app.core.metrics import metrics
+from backend.app.models.knowledge_base import KnowledgeBase
+from backend.app.models.project import Project
+from backend.app.services.embeddings import get_embedder
+from backend.app.services.knowledge_events import on_knowledge_base_changed
+from backend.app.services.search_index import search_index_registry, SearchDocument, normalize_query
+from backend.app.services.semantic_search import semantic_search_service
+from backend.app.services.suggestion_index import suggestion_index_registry, Suggestion
+
+logger = logging.getLogger(__name__)
+
+RRF_K = 60  # Standard RRF damping constant; larger values flatten rank differences
+SEMANTIC_CANDIDATES = 100  # Most similar entries considered from the embedding ranking
+
+# Document types returned for each `type` filter value
+TYPE_FILTERS = {
+    "requirement": {"requirement"},
+    "module": {"module"},
+    "tech": {"tech_pattern"},
+    "ui": {"ui_component", "ui_pattern"},
+}
+_TYPE_FACETS = {doc_type: name for name, doc_types in TYPE_FILTERS.items() for doc_type in doc_types}
+
+
+@dataclass
+class RankedDocument:
+    """A knowledge base entry with its fused score and per-ranker ranks."""
+    doc: SearchDocument
+    score: float
+    lexical_rank: Optional[int] = None
+    lexical_score: float = 0.0  # Raw BM25 score
+    semantic_rank: Optional[int] = None
+
+
+@dataclass
+class KnowledgeSearchResult:
+    """All matches of a query (best first) plus facet counts."""
+    version: int
+    matches: List[RankedDocument]
+    facets: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+
+@dataclass
+class FederatedMatch:
+    """A knowledge base entry found by a cross-project search."""
+    project_id: UUID
+    project_name: str
+    ranked: RankedDocument
+
+
+@dataclass
+class FederatedSearchResult:
+    """Global top-k across projects."""
+    matches: List[FederatedMatch]
+    total: int  # Matches across all projects, before the top-k cut
+    projects_searched: int
+
+
+@dataclass
+class _ProjectVectors:
+    model_name: str
+    fingerprints: Dict[str, str] = field(default_factory=dict)
+    vectors: Dict[str, List[float]] = field(default_factory=dict)
+    doc_ids: List[str] = field(default_factory=list)
+    matrix: Optional[np.ndarray] = None
+
+
+class KnowledgeSearchService:
+    """Ranks, filters, facets and caches knowledge base search results."""
+
+    def __init__(self):
+        self._versions = TTLCache(maxsize=4096, ttl=settings.SEARCH_CACHE_TTL_SECONDS)
+        self._results = TTLCache(maxsize=settings.SEARCH_CACHE_SIZE, ttl=settings.SEARCH_CACHE_TTL_SECONDS)
+        self._vectors: Dict[UUID, _ProjectVectors] = {}
+        self._vector_locks: Dict[UUID, asyncio.Lock] = {}
+        on_knowledge_base_changed(self.invalidate)
+
+    async def _sync_vectors(self, project_id: UUID, docs: Dict[str, SearchDocument]) -> _ProjectVectors:
+        """Embed entries that are new or changed since the last sync."""
+        embedder = get_embedder()
+        lock = self._vector_locks.setdefault(project_id, asyncio.Lock())
+        async with lock:
+            entry = self._vectors.get(project_id)
+            if entry is None or entry.model_name != embedder.name:
+                entry = _ProjectVectors(model_name=embedder.name)
+                self._vectors[project_id] = entry
+
+            fingerprints = {doc_id: doc.fingerprint for doc_id, doc in docs.items()}
+            changed = [doc_id for doc_id, fp in fingerprints.items() if entry.fingerprints.get(doc_id) != fp]
+            removed = [doc_id for doc_id in entry.fingerprints if doc_id not in docs]
+            if not changed and not removed and entry.matrix is not None:
+                return entry
+
+            if changed:
+                texts = [
+                    "\n".join(filter(None, [docs[doc_id].title, docs[doc_id].description, docs[doc_id].content]))
+                    for doc_id in changed
+                ]
+                for doc_id, vector in zip(changed, await embedder.embed_documents(texts)):
+                    entry.vectors[doc_id] = vector
+            for doc_id in removed:
+                entry.vectors.pop(doc_id, None)
+
+            entry.fingerprints = fingerprints
+            entry.doc_ids = list(entry.vectors.keys())
+            entry.matrix = np.asarray([entry.vectors[doc_id] for doc_id in entry.doc_ids], dtype=np.float32)
+            logger.info(
+                f"Synced knowledge base vectors for project {project_id}: "
+                f"{len(changed)} embedded, {len(removed)} removed, {len(entry.doc_ids)} total"
+            )
+            return entry
+
+    async def _semantic_ranking(
+        self,
+        project_id: UUID,
+        docs: Dict[str, SearchDocument],
+        query: str,
+    ) -> List[Tuple[str, float]]:
+        """(doc_id, similarity) of entries above HYBRID_MIN_SIMILARITY, most similar first."""
+        if not docs:
+            return []
+        entry = await self._sync_vectors(project_id, docs)
+        if entry.matrix is None or not len(entry.doc_ids):
+            return []
+
+        query_vector = np.asarray(await semantic_search_service.embed_query(query), dtype=np.float32)
+        # KB entries number in the hundreds: an exact scan is faster than any index
+        similarities = entry.matrix @ query_vector
+        order = np.argsort(-similarities)[:SEMANTIC_CANDIDATES]
+        return [
+            (entry.doc_ids[i], float(similarities[i]))
+            for i in order
+            if similarities[i] >= settings.HYBRID_MIN_SIMILARITY
+        ]
+
+    async def _rank(
+        self,
+        kb: KnowledgeBase,
+        query: str,
+        doc_type: Optional[str],
+        module: Optional[str],
+        hybrid: bool = True,
+    ) -> KnowledgeSearchResult:
+        index = search_index_registry.get_index(kb)
+        fused: Dict[str, RankedDocument] = {}
+
+        for rank, (doc, score) in enumerate(index.search(query), start=1):
+            fused[doc.doc_id] = RankedDocument(
+                doc=doc, score=1 / (RRF_K + rank), lexical_rank=rank, lexical_score=score
+            )
+        rankers = 1
+
+        if hybrid and settings.HYBRID_SEARCH_ENABLED:
+            try:
+                semantic = await self._semantic_ranking(kb.project_id, index.docs, query)
+                rankers += 1
+            except Exception as e:
+                # Embedding provider down or unconfigured: lexical ranking still works
+                logger.warning(f"Semantic ranking unavailable for project {kb.project_id}: {str(e)}")
+                semantic = []
+            for rank, (doc_id, _) in enumerate(semantic, start=1):
+                ranked = fused.get(doc_id)
+                if ranked is None:
+                    ranked = fused[doc_id] = RankedDocument(doc=index.docs[doc_id], score=0.0)
+                ranked.score += 1 / (RRF_K + rank)
+                ranked.semantic_rank = rank
+
+        # Scale so an entry ranked first by every ranker scores 1.0
+        best_possible = rankers / (RRF_K + 1)
+        for ranked in fused.values():
+            ranked.score /= best_possible
+        matches = sorted(fused.values(), key=lambda ranked: ranked.score, reverse=True)
+
+        allowed_types = TYPE_FILTERS.get(doc_type) if doc_type else None
+
+        def type_ok(doc: SearchDocument) -> bool:
+            return allowed_types is None or doc.type in allowed_types
+
+        def module_ok(doc: SearchDocument) -> bool:
+            return not module or doc.module_name == module
+
+        # Each facet counts matches under the other filters, so the UI can show
+        # what switching that one filter would return
+        type_facet: Dict[str, int] = {}
+        module_facet: Dict[str, int] = {}
+        for ranked in matches:
+            doc = ranked.doc
+            if module_ok(doc):
+                facet = _TYPE_FACETS.get(doc.type, doc.type)
+                type_facet[facet] = type_facet.get(facet, 0) + 1
+            if type_ok(doc) and doc.module_name:
+                module_facet[doc.module_name] = module_facet.get(doc.module_name, 0) + 1
+
+        return KnowledgeSearchResult(
+            version=kb.version,
+            matches=[ranked for ranked in matches if type_ok(ranked.doc) and module_ok(ranked.doc)],
+            facets={"type": type_facet, "module": module_facet},
+        )
+
+    def _cached(self, key: tuple) -> Optional[KnowledgeSearchResult]:
+        cached = self._results.get(key)
+        metrics.increment("knowledge_search.cache_hits" if cached is not None else "knowledge_search.cache_misses")
+        return cached
+
+    async def _search_kb(
+        self,
+        kb: KnowledgeBase,
+        normalized: str,
+        doc_type: Optional[str],
+        module: Optional[str],
+        hybrid: bool,
+    ) -> KnowledgeSearchResult:
+        """Rank one loaded knowledge base, through the result cache."""
+        self._versions.set(kb.project_id, kb.version)
+        key = (kb.project_id, kb.version, normalized, doc_type, module, hybrid)
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached
+
+        search_result = await self._rank(kb, normalized, doc_type, module, hybrid=hybrid)
+        self._results.set(key, search_result)
+        return search_result
+
+    async def search(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        query: str,
+        doc_type: Optional[str] = None,
+        module: Optional[str] = None,
+    ) -> Optional[KnowledgeSearchResult]:
+        """
+        Search a project's knowledge base.
+
+        Args:
+            db: Database session (only used on a cache miss)
+            project_id: Project ID
+            query: Search query
+            doc_type: Type filter (a TYPE_FILTERS key)
+            module: Module name filter
+
+        Returns:
+            All matches, best first (callers paginate), or None if the
+            project has no knowledge base
+        """
+        normalized = normalize_query(query)
+
+        version = self._versions.get(project_id)
+        if version is not None:
+            cached = self._cached((project_id, version, normalized, doc_type, module, True))
+            if cached is not None:
+                return cached
+
+        result = await db.execute(
+            select(KnowledgeBase).where(KnowledgeBase.project_id == project_id)
+        )
+        kb = result.scalar_one_or_none()
+        if not kb or not kb.structured_data:
+            return None
+
+        return await self._search_kb(kb, normalized, doc_type, module, hybrid=True)
+
+    async def federated_search(
+        self,
+        db: AsyncSession,
+        query: str,
+        top_k: int = 20,
+        doc_type: Optional[str] = None,
+    ) -> FederatedSearchResult:
+        """
+        Search every project's knowledge base and return the global top-k.
+
+        Uses two queries regardless of the number of projects: one for the
+        (project, KB version, name) list, and one loading only the knowledge
+        bases whose results for this query are not cached. Projects are
+        ranked concurrently and their result lists (already sorted) are
+        k-way merged with a heap, so only top_k entries are materialized.
+
+        Ranking is lexical only: BM25 scores are comparable across
+        projects, whereas fused rank scores give every project's best hit
+        the same score. It also keeps a cold federated search from
+        embedding hundreds of knowledge bases.
+
+        Args:
+            db: Database session
+            query: Search query
+            top_k: Number of results returned
+            doc_type: Type filter (a TYPE_FILTERS key)
+        """
+        normalized = normalize_query(query)
+
+        result = await db.execute(
+            select(KnowledgeBase.project_id, KnowledgeBase.version, Project.name)
+            .join(Project, Project.id == KnowledgeBase.project_id)
+        )
+        projects = result.all()
+        project_names = {project_id: name for project_id, _, name in projects}
+
+        per_project: Dict[UUID, KnowledgeSearchResult] = {}
+        stale = []
+        for project_id, version, _ in projects:
+            cached = self._cached((project_id, version, normalized, doc_type, None, False))
+            if cached is not None:
+                per_project[project_id] = cached
+            else:
+                stale.append(project_id)
+
+        if stale:
+            result = await db.execute(
+                select(KnowledgeBase).where(KnowledgeBase.project_id.in_(stale))
+            )
+            kbs = [kb for kb in result.scalars().all() if kb.structured_data]
+            ranked = await asyncio.gather(*[
+                self._search_kb(kb, normalized, doc_type, None, hybrid=False) for kb in kbs
+            ])
+            per_project.update({kb.project_id: search_result for kb, search_result in zip(kbs, ranked)})
+
+        streams = [
+            [FederatedMatch(project_id=project_id, project_name=project_names[project_id], ranked=ranked)
+             for ranked in search_result.matches[:top_k]]
+            for project_id, search_result in per_project.items()
+        ]
+        merged = heapq.merge(*streams, key=lambda match: match.ranked.lexical_score, reverse=True)
+
+        return FederatedSearchResult(
+            matches=list(islice(merged, top_k)),
+            total=sum(len(search_result.matches) for search_result in per_project.values()),
+            projects_searched=len(per_project),
+        )
+
+    async def suggest(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        prefix: str,
+        limit: int = 10,
+    ) -> List[Suggestion]:
+        """
+        Typeahead suggestions for a project.
+
+        Served from memory while the cached KB version matches the index.
+        Otherwise the version is read (a single-column query) and the KB's
+        structured_data is loaded only if the index is behind it.
+        """
+        version = self._versions.get(project_id)
+        index = suggestion_index_registry.get(project_id, version) if version is not None else None
+
+        if index is None:
+            result = await db.execute(
+                select(KnowledgeBase.version).where(KnowledgeBase.project_id == project_id)
+            )
+            version = result.scalar_one_or_none()
+            if version is None:
+                return []
+            self._versions.set(project_id, version)
+            index = suggestion_index_registry.get(project_id, version)
+
+        if index is None:
+            result = await db.execute(
+                select(KnowledgeBase).where(KnowledgeBase.project_id == project_id)
+            )
+            kb = result.scalar_one_or_none()
+            if kb is None:
+                return []
+            index = suggestion_index_registry.sync(kb)
+
+        return index.suggest(prefix, limit)
+
+    def invalidate(self, project_id: UUID) -> None:
+        """Drop a project's cached version and results."""
+        self._versions.pop(project_id)
+        self._results.invalidate(lambda key: key[0] == project_id)
+
+
+# Global instance
+knowledge_search_service = KnowledgeSearchService()
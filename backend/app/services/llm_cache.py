@@ -0,0 +1,218 @@
+"""
+Exact-match cache of LLM responses.
+
+Some generate_text/chat calls are effectively deterministic and repeat:
+document analysis and the knowledge base build run at a low temperature,
+and requirement summaries and PRDs are regenerated for conversations that
+have not changed. The provider services wrap those methods with
+llm_cache.cached, which keys each call by provider, model, method and its
+arguments (prompts normalized, then hashed) and returns a stored response
+instead of calling the model again.
+
+Two tiers: an in-process LRU bounded by LLM_CACHE_MEMORY_MB, and Redis,
+shared by all API and worker processes, whose entries expire after
+LLM_CACHE_TTL_SECONDS (Redis's maxmemory policy bounds its size). If Redis
+is unreachable only the memory tier is used.
+
+Caching is opt-in: only calls passing cache=True (a keyword the wrapper
+consumes) are cached, since a low temperature alone does not make a repeated
+answer acceptable (a regenerated wireframe should differ). Calls with images
+are never cached.
+"""
+import dataclasses
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+import redis.asyncio as redis
+from backend.app.core.cache import TTLCache
+from backend.app.core.config import settings
+from backend.app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "llmcache:v1:"
+
+# Arguments that do not change the response
+IGNORED_ARGUMENTS = {"self", "timeout"}
+
+# Arguments that make a call uncacheable when set
+IMAGE_ARGUMENTS = {"image_paths", "images"}
+
+# Seconds Redis is skipped after a failure
+REDIS_RETRY_SECONDS = 30
+
+
+def normalize_text(text: str) -> str:
+    """Line endings and trailing whitespace do not change a prompt's meaning."""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return normalize_text(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        value = dataclasses.asdict(value)
+    if isinstance(value, dict):
+        # Cache breakpoints only affect how the provider bills the prompt
+        return {k: _normalize(v) for k, v in sorted(value.items()) if k != "cache"}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, float):
+        return round(value, 4)
+    return value
+
+
+def _has_images(value: Any) -> bool:
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return bool(getattr(value, "images", None))
+    if isinstance(value, dict):
+        return bool(value.get("images"))
+    if isinstance(value, (list, tuple)):
+        return any(_has_images(v) for v in value)
+    return False
+
+
+def call_arguments(signature: inspect.Signature, service: Any, args: tuple, kwargs: dict) -> Dict[str, Any]:
+    """Arguments of a service method call that determine its response, by name."""
+    bound = signature.bind(service, *args, **kwargs)
+    bound.apply_defaults()
+    return {name: value for name, value in bound.arguments.items() if name not in IGNORED_ARGUMENTS}
+
+
+def fingerprint(provider: str, model_name: str, method: str, arguments: Dict[str, Any]) -> str:
+    """Hash identifying a call: identical calls have the same fingerprint."""
+    payload = json.dumps(
+        [provider, model_name, method, _normalize(arguments)],
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Memory and Redis tiers of cached LLM responses."""
+
+    def __init__(self, redis_url: Optional[str], ttl_seconds: int, memory_bytes: int, max_entry_bytes: int):
+        self.redis_url = redis_url
+        self.ttl_seconds = ttl_seconds
+        self.max_entry_bytes = max_entry_bytes
+        self._memory = TTLCache(
+            maxsize=100000,
+            ttl=ttl_seconds,
+            max_weight=memory_bytes,
+            weigher=lambda text: len(text.encode("utf-8")),
+        )
+        self._client: Optional[redis.Redis] = None
+        self._redis_retry_at = 0.0
+
+    def _get_client(self) -> Optional[redis.Redis]:
+        if not self.redis_url or time.monotonic() < self._redis_retry_at:
+            return None
+        if self._client is None:
+            self._client = redis.from_url(self.redis_url, decode_responses=True)
+        return self._client
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"LLM cache Redis tier unavailable, using memory only: {str(e)}")
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+    async def get(self, key: str) -> Optional[str]:
+        """Cached response, or None."""
+        response = self._memory.get(key)
+        if response is not None:
+            metrics.increment("llm_cache.memory_hits")
+            return response
+
+        client = self._get_client()
+        if client is not None:
+            try:
+                response = await client.get(KEY_PREFIX + key)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+            if response is not None:
+                metrics.increment("llm_cache.redis_hits")
+                self._memory.set(key, response)
+                return response
+
+        metrics.increment("llm_cache.misses")
+        return None
+
+    async def set(self, key: str, response: str) -> None:
+        """Store a response in both tiers, unless it is too large."""
+        if len(response.encode("utf-8")) > self.max_entry_bytes:
+            return
+        self._memory.set(key, response)
+
+        client = self._get_client()
+        if client is not None:
+            try:
+                await client.set(KEY_PREFIX + key, response, ex=self.ttl_seconds)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+    def stats(self) -> Dict[str, Any]:
+        """Memory tier size and the hit rate across both tiers."""
+        counters = metrics.snapshot()["counters"]
+        hits = counters.get("llm_cache.memory_hits", 0) + counters.get("llm_cache.redis_hits", 0)
+        lookups = hits + counters.get("llm_cache.misses", 0)
+        return {
+            "memory": self._memory.stats(),
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def clear_memory(self) -> None:
+        """Drop the in-process tier."""
+        self._memory.clear()
+
+    async def close(self) -> None:
+        """Close the Redis connection (e.g. before the event loop shuts down)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def cached(self, func: Callable) -> Callable:
+        """
+        Cache the responses of an AIServiceBase method returning text.
+
+        The wrapped method accepts an extra keyword argument cache; only
+        calls with cache=True are cached.
+        """
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(service, *args, cache: bool = False, **kwargs):
+            if not cache or not settings.LLM_CACHE_ENABLED:
+                return await func(service, *args, **kwargs)
+
+            arguments = call_arguments(signature, service, args, kwargs)
+            if any(arguments.get(name) for name in IMAGE_ARGUMENTS) or _has_images(arguments.get("messages")):
+                return await func(service, *args, **kwargs)
+
+            started = time.perf_counter()
+            key = fingerprint(service.provider_name.lower(), service.model_name, func.__name__, arguments)
+            response = await self.get(key)
+            if response is not None:
+                metrics.observe("llm_cache.hit_ms", (time.perf_counter() - started) * 1000)
+                return response
+
+            response = await func(service, *args, **kwargs)
+            if response:
+                await self.set(key, response)
+            return response
+
+        return wrapper
+
+
+# Global instance
+llm_cache = LLMResponseCache(
+    redis_url=settings.REDIS_URL if settings.LLM_CACHE_REDIS_ENABLED else None,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    memory_bytes=settings.LLM_CACHE_MEMORY_MB * 1024 * 1024,
+    max_entry_bytes=settings.LLM_CACHE_MAX_ENTRY_KB * 1024,
+)
@@ -7,6 +7,10 @@ from backend.app.services.ai_service_base import (
     AIMessage,
     AIUsageStats
 )
+from backend.app.core.config import settings
+from backend.app.services.context_assembler import get_token_counter
+from backend.app.services.llm_cache import llm_cache
+from backend.app.services.single_flight import single_flight
 from typing import Optional, List, Dict, Any, AsyncGenerator
 from datetime import datetime, timezone
 import logging
@@ -42,6 +46,8 @@ class OpenAIService(AIServiceBase):
     def supports_images(self) -> bool:
         return "vision" in self.model_name.lower() or "gpt-4" in self.model_name.lower()
 
+    @llm_cache.cached
+    @single_flight.coalesced
     async def generate_text(
         self,
         prompt: str,
@@ -64,18 +70,8 @@ class OpenAIService(AIServiceBase):
             )
 
             # Record usage
-            usage = response.usage
-            if usage:
-                cost = self.estimate_cost(usage.prompt_tokens, usage.completion_tokens)
-                stats = AIUsageStats(
-                    model_name=self.model_name,
-                    prompt_tokens=usage.prompt_tokens,
-                    completion_tokens=usage.completion_tokens,
-                    total_tokens=usage.total_tokens,
-                    estimated_cost=cost,
-                    timestamp=datetime.now(timezone.utc),
-                )
-                self.record_usage(stats)
+            if response.usage:
+                self._record_response_usage(response.usage)
 
             return response.choices[0].message.content
 
@@ -83,6 +79,8 @@ class OpenAIService(AIServiceBase):
             logger.error(f"Error generating text with OpenAI: {str(e)}")
             raise
 
+    @llm_cache.cached
+    @single_flight.coalesced
     async def chat(
         self,
         messages: List[AIMessage],
@@ -116,18 +114,8 @@ class OpenAIService(AIServiceBase):
             )
 
             # Record usage
-            usage = response.usage
-            if usage:
-                cost = self.estimate_cost(usage.prompt_tokens, usage.completion_tokens)
-                stats = AIUsageStats(
-                    model_name=self.model_name,
-                    prompt_tokens=usage.prompt_tokens,
-                    completion_tokens=usage.completion_tokens,
-                    total_tokens=usage.total_tokens,
-                    estimated_cost=cost,
-                    timestamp=datetime.now(timezone.utc),
-                )
-                self.record_usage(stats)
+            if response.usage:
+                self._record_response_usage(response.usage)
 
             return response.choices[0].message.content
 
@@ -135,6 +123,7 @@ class OpenAIService(AIServiceBase):
             logger.error(f"Error in OpenAI chat: {str(e)}")
             raise
 
+    @single_flight.coalesced
     async def chat_stream(
         self,
         messages: List[AIMessage],
@@ -154,10 +143,14 @@ class OpenAIService(AIServiceBase):
                 temperature=temperature,
                 max_tokens=max_tokens,
                 stream=True,
+                stream_options={"include_usage": True},
             )
 
             async for chunk in stream:
-                if chunk.choices[0].delta.content:
+                # The final chunk carries usage (including cached tokens) and no choices
+                if chunk.usage:
+                    self._record_response_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
                     yield chunk.choices[0].delta.content
 
         except Exception as e:
@@ -176,7 +169,7 @@ class OpenAIService(AIServiceBase):
 
 文档类型：{document_type}
 文档内容：
-{document_content[:8000]}
+{get_token_counter("openai").truncate(document_content, settings.ANALYSIS_DOCUMENT_TOKENS)}
 
 请以JSON格式返回分析结果，包括：
 1. 文档概述（summary）
@@ -252,14 +245,39 @@ class OpenAIService(AIServiceBase):
         except json.JSONDecodeError:
             return {"description": response}
 
-    def estimate_cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+    def _record_response_usage(self, usage: Any) -> None:
+        """Record a response's token usage, including prompt cache hits."""
+        # OpenAI caches stable prompt prefixes automatically; it only reports the hits
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+        cost = self.estimate_cost(usage.prompt_tokens, usage.completion_tokens, cached_tokens=cached_tokens)
+        self.record_usage(AIUsageStats(
+            model_name=self.model_name,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            total_tokens=usage.total_tokens,
+            estimated_cost=cost,
+            timestamp=datetime.now(timezone.utc),
+            cached_prompt_tokens=cached_tokens,
+        ))
+
+    def estimate_cost(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> float:
         """
         Estimate cost for OpenAI API usage.
 
         Pricing (as of Dec 2025):
         - GPT-4-turbo: $0.01/1K prompt, $0.03/1K completion
         - GPT-4: $0.03/1K prompt, $0.06/1K completion
+        - Cached prompt tokens are billed at half the prompt price
         """
+        # Cache hits are part of prompt_tokens
+        prompt_tokens = prompt_tokens - cached_tokens + cached_tokens * 0.5
+
         if "gpt-4-turbo" in self.model_name.lower():
             prompt_cost = (prompt_tokens / 1000) * 0.01
             completion_cost = (completion_tokens / 1000) * 0.03
@@ -0,0 +1,107 @@
+"""
+Rendered PRD markdown, stored per conversation state.
+
+Every export and download used to generate the PRD with the LLM again, so
+downloading one PRD as markdown, Word and HTML cost three generations. The
+markdown is now stored under UPLOAD_DIR/exports/<conversation_id>/<key>.md,
+where the key covers everything the PRD is generated from: the last message
+sequence, the knowledge base version and a hash of the template inputs
+(custom template, prompt revision, titles). Every format converts from the
+stored markdown. Only the newest render of a conversation is kept per
+variant (with and without the knowledge base), so exports that alternate
+include_knowledge_base do not evict each other.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+from uuid import UUID
+import aiofiles
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RenderedPRD:
+    """Stored PRD markdown and the identity of its content."""
+    markdown: str
+    content_hash: str
+
+    def etag(self, format: str) -> str:
+        """
+        ETag of the PRD in an export format.
+
+        Strong for markdown, which is served byte for byte. Weak for the
+        converted formats: their bytes can differ between conversions of the
+        same markdown (e.g. timestamps inside .docx), only the content is equal.
+        """
+        tag = f'"{self.content_hash[:32]}-{format}"'
+        return tag if format == "markdown" else f"W/{tag}"
+
+
+class PRDRenderStore:
+    """Disk store of generated PRD markdown, shared by all processes."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def make_key(last_sequence: int, kb_version: int, template_hash: str) -> str:
+        """
+        Key of a render of one conversation.
+
+        kb_version is -1 when the knowledge base is not included. The key
+        starts with the variant ("kb-" or "base-"), which put() uses to
+        replace only older renders of the same variant.
+        """
+        variant = "base" if kb_version < 0 else "kb"
+        digest = hashlib.sha256(f"{last_sequence}:{kb_version}:{template_hash}".encode("utf-8")).hexdigest()
+        return f"{variant}-{digest}"
+
+    def _path(self, conversation_id: UUID, key: str) -> str:
+        return os.path.join(self.root, str(conversation_id), f"{key}.md")
+
+    async def get(self, conversation_id: UUID, key: str) -> Optional[RenderedPRD]:
+        """Stored render, or None."""
+        path = self._path(conversation_id, key)
+        if not os.path.exists(path):
+            return None
+        async with aiofiles.open(path, "r", encoding="utf-8") as f:
+            markdown = await f.read()
+        return RenderedPRD(markdown, hashlib.sha256(markdown.encode("utf-8")).hexdigest())
+
+    async def put(self, conversation_id: UUID, key: str, markdown: str) -> RenderedPRD:
+        """Store a render, replacing the conversation's older renders of the same variant."""
+        path = self._path(conversation_id, key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+            await f.write(markdown)
+        os.replace(tmp_path, path)
+
+        # Older renders of this variant belong to earlier states of the conversation
+        # (renders stored before keys had a variant have no "-" and are dropped too)
+        variant_prefix = key.split("-", 1)[0] + "-"
+        for name in os.listdir(directory):
+            if not name.endswith(".md") or name == os.path.basename(path):
+                continue
+            if name.startswith(variant_prefix) or "-" not in name:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+        return RenderedPRD(markdown, hashlib.sha256(markdown.encode("utf-8")).hexdigest())
+
+    def invalidate(self, conversation_id: UUID) -> None:
+        """Drop all renders of a conversation."""
+        shutil.rmtree(os.path.join(self.root, str(conversation_id)), ignore_errors=True)
+
+
+# Global instance
+prd_render_store = PRDRenderStore(os.path.join(settings.UPLOAD_DIR, "exports"))
@@ -7,8 +7,11 @@ from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm.attributes import flag_modified
+from backend.app.core.config import settings
 from backend.app.models.conversation import Conversation, Message
+from backend.app.services.context_assembler import ContextAssembler, ContextSlot
 from backend.app.services.gemini_service import GeminiService
+from backend.app.services.kb_context import kb_context_cache
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -228,18 +231,18 @@ class PRDService:
         )
         messages = result.scalars().all()
 
-        conversation_text = "\n".join([
-            f"{'用户' if msg.role == 'user' else 'AI'}: {msg.content}"
-            for msg in messages[-10:]  # Last 10 messages
+        # As much of the recent conversation as fits the budget
+        assembled = ContextAssembler(settings.PRD_SECTION_HISTORY_TOKENS, provider="gemini").assemble([
+            ContextSlot(
+                "conversation",
+                [f"{'用户' if msg.role == 'user' else 'AI'}: {msg.content}" for msg in messages],
+                keep="tail",
+            ),
         ])
+        conversation_text = assembled["conversation"]
 
-        # Get knowledge base
-        from backend.app.models.knowledge_base import KnowledgeBase
-        kb_result = await db.execute(
-            select(KnowledgeBase).where(KnowledgeBase.project_id == project_id)
-        )
-        kb = kb_result.scalar_one_or_none()
-        kb_context = self._build_kb_context(kb)
+        # Get knowledge base context
+        kb_context = await kb_context_cache.get_context(db, project_id, "prd", confirmed_only=False) or ""
 
         # Generate section content
         section_name = self.PRD_SECTIONS[section_key]
@@ -271,26 +274,6 @@ class PRDService:
             }
         }
 
-    def _build_kb_context(self, kb) -> str:
-        """Build knowledge base context string."""
-        if not kb or not kb.structured_data:
-            return ""
-
-        data = kb.structured_data
-        context = "项目背景知识：\n"
-
-        if "system_overview" in data:
-            so = data["system_overview"]
-            context += f"- 产品类型：{so.get('product_type', '未知')}\n"
-            context += f"- 产品描述：{so.get('description', '无')}\n"
-
-        if "tech_conventions" in data:
-            tc = data["tech_conventions"]
-            context += f"- API 风格：{tc.get('api_style', '未知')}\n"
-            context += f"- 命名风格：{tc.get('naming_style', '未知')}\n"
-
-        return context
-
     def _build_section_prompt(self, section_key: str, section_name: str, conversation: str, kb_context: str) -> str:
         """Build prompt for section generation."""
         prompts = {
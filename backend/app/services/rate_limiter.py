@@ -0,0 +1,79 @@
+"""
+Per-provider request rate limiting shared by all API and worker processes.
+
+Uses a fixed one-minute window counter in Redis, so the limit holds across
+every Celery worker and uvicorn process talking to the same provider.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+import redis.asyncio as redis
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+
+
+class ProviderRateLimiter:
+    """Waits until a request to a provider fits in its per-minute budget."""
+
+    def __init__(self, redis_url: str, limits: Dict[str, int]):
+        self.redis_url = redis_url
+        self.limits = limits
+        self._client: Optional[redis.Redis] = None
+
+    def _get_client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.from_url(self.redis_url)
+        return self._client
+
+    async def acquire(self, provider: str) -> None:
+        """
+        Reserve one request slot for a provider, sleeping until the next
+        window if the current one is full.
+
+        Providers without a configured limit (or a limit of 0) are not limited.
+        If Redis is unreachable the request is let through rather than failing
+        the analysis.
+        """
+        limit = self.limits.get(provider, 0)
+        if limit <= 0:
+            return
+
+        while True:
+            window = int(time.time() // WINDOW_SECONDS)
+            key = f"ratelimit:{provider}:{window}"
+            try:
+                client = self._get_client()
+                count = await client.incr(key)
+                if count == 1:
+                    await client.expire(key, WINDOW_SECONDS + 1)
+            except redis.RedisError as e:
+                logger.warning(f"Rate limiter unavailable, not limiting {provider}: {str(e)}")
+                return
+
+            if count <= limit:
+                return
+
+            wait = (window + 1) * WINDOW_SECONDS - time.time()
+            logger.info(f"{provider} rate limit reached ({limit}/min), waiting {wait:.1f}s")
+            await asyncio.sleep(max(wait, 0.1))
+
+    async def close(self) -> None:
+        """Close the Redis connection (e.g. before the event loop shuts down)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Global instance
+rate_limiter = ProviderRateLimiter(
+    redis_url=settings.REDIS_URL,
+    limits={
+        "gemini": settings.GEMINI_REQUESTS_PER_MINUTE,
+        "openai": settings.OPENAI_REQUESTS_PER_MINUTE,
+        "claude": settings.CLAUDE_REQUESTS_PER_MINUTE,
+    },
+)
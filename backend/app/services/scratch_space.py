@@ -0,0 +1,72 @@
+"""
+Managed scratch directories for short-lived files (e.g. images extracted
+from presentations before they are sent to Gemini).
+
+Directories live under UPLOAD_DIR/.scratch instead of the system temp dir,
+are removed by their owner when done, and anything left behind (crashes,
+timeouts) is evicted once it is older than the TTL.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import time
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ScratchSpace:
+    """Creates and evicts scratch directories under one root."""
+
+    def __init__(self, root: str, ttl_seconds: int):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+
+    def create_dir(self, prefix: str = "") -> str:
+        """Create a new empty scratch directory and return its path."""
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.mkdtemp(prefix=prefix, dir=self.root)
+
+    def release(self, path: str) -> None:
+        """Remove a scratch directory (no-op for paths outside the scratch root)."""
+        if not os.path.abspath(path).startswith(os.path.abspath(self.root) + os.sep):
+            logger.warning(f"Refusing to remove non-scratch path: {path}")
+            return
+        shutil.rmtree(path, ignore_errors=True)
+
+    def evict_expired(self) -> int:
+        """
+        Remove scratch directories older than the TTL.
+
+        Returns:
+            Number of directories removed
+        """
+        if not os.path.isdir(self.root):
+            return 0
+
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                # Released concurrently by its owner
+                continue
+
+        if removed:
+            logger.info(f"Evicted {removed} expired scratch entries from {self.root}")
+        return removed
+
+
+# Global instance
+scratch_space = ScratchSpace(
+    root=os.path.join(settings.UPLOAD_DIR, ".scratch"),
+    ttl_seconds=settings.SCRATCH_TTL_MINUTES * 60,
+)
@@ -0,0 +1,314 @@
+"""
+In-memory BM25 search index over project knowledge bases.
+
+Chinese text has no word boundaries, so CJK runs are indexed as character
+unigrams plus bigrams (a bigram match ranks above scattered characters);
+Latin words and numbers are indexed as whole lowercase tokens.
+
+One index is kept per project and synced incrementally: when the KB version
+changes, only documents whose content fingerprint changed are re-indexed.
+"""
+import hashlib
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from uuid import UUID
+from backend.app.models.knowledge_base import KnowledgeBase
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+|[a-z0-9_]+")
+_CJK_PATTERN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+
+# Term weight per field (BM25F-style: a title hit counts three times)
+FIELD_WEIGHTS = {"title": 3, "description": 2, "content": 1}
+
+
+def normalize_query(query: str) -> str:
+    """Canonical query form for ranking and cache keys (NFKC, lowercase, single spaces)."""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    CJK runs become unigrams and bigrams ("用户管理" -> 用, 户, 管, 理, 用户,
+    户管, 管理); other runs become lowercase alphanumeric words.
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def tokenize_query(text: str) -> List[str]:
+    """
+    Split a query into terms.
+
+    Multi-character CJK runs use bigrams only, so "用户" matches documents
+    containing the word rather than any document with a 用 in it.
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.match(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+@dataclass
+class SearchDocument:
+    """One searchable knowledge base entry."""
+    doc_id: str
+    type: str  # requirement, module, tech_pattern, ui_component, ui_pattern
+    title: str
+    description: str = ""
+    content: str = ""
+    conversation_id: Optional[str] = None
+    module_name: Optional[str] = None
+    tags: List[str] = field(default_factory=list)
+    created_at: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of everything that affects indexing and display."""
+        raw = "\x1f".join([
+            self.type, self.title, self.description, self.content,
+            self.conversation_id or "", self.module_name or "",
+            ",".join(self.tags), self.created_at or "",
+        ])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def term_frequencies(self) -> Counter:
+        """Field-weighted term counts."""
+        counts: Counter = Counter()
+        for field_name, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(self, field_name)):
+                counts[token] += weight
+        return counts
+
+
+def extract_documents(structured_data: Dict[str, Any]) -> List[SearchDocument]:
+    """Flatten a knowledge base's structured_data into search documents."""
+    docs = []
+
+    for i, req in enumerate(structured_data.get("completed_requirements", [])):
+        docs.append(SearchDocument(
+            doc_id=f"requirement:{i}",
+            type="requirement",
+            title=req.get("title", ""),
+            description=req.get("description", ""),
+            content=" ".join(req.get("key_points", [])),
+            conversation_id=req.get("conversation_id"),
+            tags=["已完成", "需求"],
+            created_at=req.get("archived_at"),
+        ))
+
+    for i, module in enumerate(structured_data.get("feature_modules", [])):
+        module_name = module.get("module_name", "")
+        features = module.get("features", [])
+        docs.append(SearchDocument(
+            doc_id=f"module:{i}",
+            type="module",
+            title=module_name,
+            description=module.get("description", ""),
+            content=f"包含 {len(features)} 个功能",
+            module_name=module_name,
+            tags=["模块"],
+        ))
+        for j, feature in enumerate(features):
+            docs.append(SearchDocument(
+                doc_id=f"feature:{i}:{j}",
+                type="requirement",
+                title=feature.get("name", ""),
+                description=feature.get("description", ""),
+                content=" ".join(feature.get("key_points", [])),
+                conversation_id=feature.get("conversation_id"),
+                module_name=module_name,
+                tags=["功能", module_name],
+                created_at=feature.get("completed_at"),
+            ))
+
+    for i, pattern in enumerate(structured_data.get("tech_architecture", {}).get("patterns", [])):
+        docs.append(SearchDocument(
+            doc_id=f"tech:{i}",
+            type="tech_pattern",
+            title=pattern,
+            description="技术模式",
+            content=pattern,
+            tags=["技术架构"],
+        ))
+
+    ui_standards = structured_data.get("ui_ux_standards", {})
+    for i, component in enumerate(ui_standards.get("common_components", [])):
+        docs.append(SearchDocument(
+            doc_id=f"ui_component:{i}",
+            type="ui_component",
+            title=component,
+            description="UI 组件",
+            content=component,
+            tags=["UI/UX"],
+        ))
+    for i, pattern in enumerate(ui_standards.get("interaction_patterns", [])):
+        docs.append(SearchDocument(
+            doc_id=f"ui_pattern:{i}",
+            type="ui_pattern",
+            title=pattern,
+            description="交互模式",
+            content=pattern,
+            tags=["UI/UX"],
+        ))
+
+    return docs
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 ranking."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, SearchDocument] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, doc: SearchDocument) -> None:
+        """Index a document (replacing any document with the same id)."""
+        if doc.doc_id in self.docs:
+            self.remove(doc.doc_id)
+
+        frequencies = doc.term_frequencies()
+        for term, tf in frequencies.items():
+            self.postings.setdefault(term, {})[doc.doc_id] = tf
+        length = sum(frequencies.values())
+        self.docs[doc.doc_id] = doc
+        self.doc_lengths[doc.doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id: str) -> None:
+        """Drop a document from the index."""
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for term in doc.term_frequencies():
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(
+        self,
+        query: str,
+        doc_filter: Optional[Callable[[SearchDocument], bool]] = None,
+    ) -> List[Tuple[SearchDocument, float]]:
+        """
+        Rank documents matching any query term.
+
+        Only the postings of the query's terms are visited, so cost grows
+        with the number of matching documents, not the size of the index.
+
+        Returns:
+            (document, score) pairs, best first
+        """
+        if not self.docs:
+            return []
+
+        n = len(self.docs)
+        avg_length = self.total_length / n
+        scores: Dict[str, float] = {}
+
+        for term, query_tf in Counter(tokenize_query(query)).items():
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + query_tf * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        results = [
+            (self.docs[doc_id], score)
+            for doc_id, score in scores.items()
+            if doc_filter is None or doc_filter(self.docs[doc_id])
+        ]
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results
+
+
+@dataclass
+class _ProjectIndex:
+    version: int
+    updated_at: Any
+    index: BM25Index
+    fingerprints: Dict[str, str]
+
+
+class SearchIndexRegistry:
+    """Per-project BM25 indexes kept in sync with knowledge base versions."""
+
+    def __init__(self):
+        self._indexes: Dict[UUID, _ProjectIndex] = {}
+
+    def get_index(self, kb: KnowledgeBase) -> BM25Index:
+        """
+        Index for a project's knowledge base, syncing it if the KB changed.
+
+        Re-indexing is incremental: unchanged documents are left in place.
+        """
+        entry = self._indexes.get(kb.project_id)
+        if entry and entry.version == kb.version and entry.updated_at == kb.updated_at:
+            return entry.index
+
+        if entry is None:
+            entry = _ProjectIndex(version=kb.version, updated_at=kb.updated_at, index=BM25Index(), fingerprints={})
+            self._indexes[kb.project_id] = entry
+
+        docs = {doc.doc_id: doc for doc in extract_documents(kb.structured_data or {})}
+        fingerprints = {doc_id: doc.fingerprint for doc_id, doc in docs.items()}
+
+        removed = [doc_id for doc_id in entry.fingerprints if doc_id not in docs]
+        changed = [doc_id for doc_id, fp in fingerprints.items() if entry.fingerprints.get(doc_id) != fp]
+        for doc_id in removed:
+            entry.index.remove(doc_id)
+        for doc_id in changed:
+            entry.index.add(docs[doc_id])
+
+        entry.fingerprints = fingerprints
+        entry.version = kb.version
+        entry.updated_at = kb.updated_at
+        logger.info(
+            f"Synced search index for project {kb.project_id} to KB v{kb.version}: "
+            f"{len(changed)} updated, {len(removed)} removed, {len(entry.index)} total"
+        )
+        return entry.index
+
+    def peek(self, project_id: UUID, version: int) -> Optional[BM25Index]:
+        """Index for a project if it is already synced to the given KB version."""
+        entry = self._indexes.get(project_id)
+        if entry is None or entry.version != version:
+            return None
+        return entry.index
+
+    def invalidate(self, project_id: UUID) -> None:
+        """Forget a project's index (e.g. when the project is deleted)."""
+        self._indexes.pop(project_id, None)
+
+
+# Global instance
+search_index_registry = SearchIndexRegistry()
@@ -0,0 +1,385 @@
+"""
+Semantic search over uploaded documents.
+
+Extracted text is split into overlapping chunks on paragraph and sentence
+boundaries, embedded, and stored in the document_embeddings table. Queries
+are answered by pgvector's HNSW index (VECTOR_INDEX=pgvector) or by an
+in-process HNSW graph loaded from the same table (VECTOR_INDEX=memory, where
+vectors are stored as plain float arrays and pgvector is not needed), so a
+search never re-reads documents or knowledge base JSON.
+"""
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from backend.app.core.config import settings
+from backend.app.models.file import UploadedFile
+from backend.app.models.knowledge_base import DocumentEmbedding
+from backend.app.services.embeddings import get_embedder
+from backend.app.services.file_processor import file_processor
+from backend.app.services.vector_index import HNSWIndex
+
+logger = logging.getLogger(__name__)
+
+# Split after sentence-ending punctuation (Chinese and Latin) and newlines
+_SENTENCE_SPLIT = re.compile(r"(?<=[。！？；.!?;\n])")
+_PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+
+QUERY_CACHE_SIZE = 256
+
+
+@dataclass
+class TextChunk:
+    """One chunk of a document; page_number is None when the page is unknown."""
+    chunk_index: int
+    text: str
+    page_number: Optional[int] = None
+
+
+@dataclass
+class SemanticMatch:
+    """A chunk returned by a semantic search."""
+    chunk: DocumentEmbedding
+    score: float  # Cosine similarity, 1.0 = identical direction
+
+
+def _sentences(paragraph: str, max_chars: int) -> List[str]:
+    sentences = []
+    for sentence in _SENTENCE_SPLIT.split(paragraph):
+        # Hard-split run-on text (tables, code) that has no sentence breaks
+        while len(sentence) > max_chars:
+            sentences.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if sentence.strip():
+            sentences.append(sentence)
+    return sentences
+
+
+def chunk_text(text: str, max_chars: int, overlap: int) -> List[str]:
+    """
+    Split text into chunks of at most max_chars characters.
+
+    Chunks are packed from whole sentences, so short paragraphs share a
+    chunk and long ones are split between sentences. Up to `overlap`
+    trailing characters of each chunk (whole sentences, as many as still
+    fit in the next chunk) are repeated at the start of the next so a fact
+    split across the boundary stays searchable.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    length = 0
+    carried = 0  # Characters of `current` that are overlap from the previous chunk
+
+    for paragraph in _PARAGRAPH_SPLIT.split(text):
+        for sentence in _sentences(paragraph.strip() + "\n\n", max_chars):
+            if length + len(sentence) > max_chars and length > carried:
+                chunks.append("".join(current).strip())
+                # Carry the tail sentences over as overlap, leaving room for this sentence
+                budget = min(overlap, max_chars - len(sentence))
+                tail: List[str] = []
+                tail_length = 0
+                for previous in reversed(current):
+                    if tail_length + len(previous) > budget:
+                        break
+                    tail.insert(0, previous)
+                    tail_length += len(previous)
+                current, length, carried = tail, tail_length, tail_length
+            current.append(sentence)
+            length += len(sentence)
+
+    if length > carried:
+        chunks.append("".join(current).strip())
+    return chunks
+
+
+class _MemoryIndex:
+    """In-process HNSW index of one project's chunks, synced from the table."""
+
+    def __init__(self):
+        self.index = HNSWIndex(
+            dimension=get_embedder().dimension,
+            ef_search=settings.VECTOR_EF_SEARCH,
+        )
+        self.row_ids: set = set()
+        self.signature: Optional[Tuple[int, Any]] = None
+
+
+class SemanticSearchService:
+    """Indexes document chunks and answers top-k similarity queries."""
+
+    def __init__(self):
+        self._memory_indexes: Dict[UUID, _MemoryIndex] = {}
+        self._query_cache: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+
+    async def _iter_chunks(self, uploaded_file: UploadedFile) -> List[TextChunk]:
+        """Chunk a file's extracted text, page by page for PDFs."""
+        pages = [
+            page async for page in file_processor.iter_text(
+                uploaded_file.file_path,
+                uploaded_file.file_type,
+                content_hash=uploaded_file.content_hash,
+            )
+        ]
+        # Non-PDF formats, and PDF text cached without page boundaries, come back as one page
+        known_pages = uploaded_file.file_type == 'pdf' and len(pages) > 1
+
+        chunks: List[TextChunk] = []
+        for page in pages:
+            for piece in chunk_text(page.text, settings.EMBEDDING_CHUNK_CHARS, settings.EMBEDDING_CHUNK_OVERLAP):
+                chunks.append(TextChunk(
+                    chunk_index=len(chunks),
+                    text=piece,
+                    page_number=page.page_number if known_pages else None,
+                ))
+        return chunks
+
+    async def index_file(self, db: AsyncSession, uploaded_file: UploadedFile) -> int:
+        """
+        (Re)build the embeddings of one file.
+
+        Vectors already computed for identical content with the same
+        embedder (e.g. the same document uploaded to another project) are
+        copied instead of re-embedded. Commits the new rows.
+
+        Returns:
+            Number of chunks stored
+        """
+        embedder = get_embedder()
+        await db.execute(delete(DocumentEmbedding).where(DocumentEmbedding.file_id == uploaded_file.id))
+
+        rows: List[DocumentEmbedding] = []
+        source_file_id = None
+        if uploaded_file.content_hash:
+            result = await db.execute(
+                select(DocumentEmbedding.file_id)
+                .where(DocumentEmbedding.content_hash == uploaded_file.content_hash)
+                .where(DocumentEmbedding.embedding_model == embedder.name)
+                .limit(1)
+            )
+            source_file_id = result.scalar_one_or_none()
+
+        if source_file_id is not None:
+            result = await db.execute(
+                select(DocumentEmbedding)
+                .where(DocumentEmbedding.file_id == source_file_id)
+                .order_by(DocumentEmbedding.chunk_index)
+            )
+            for existing in result.scalars().all():
+                rows.append(DocumentEmbedding(
+                    project_id=uploaded_file.project_id,
+                    file_id=uploaded_file.id,
+                    source_file=uploaded_file.filename,
+                    chunk_text=existing.chunk_text,
+                    chunk_index=existing.chunk_index,
+                    content_hash=uploaded_file.content_hash,
+                    embedding=existing.embedding,
+                    embedding_model=embedder.name,
+                    meta_data=existing.meta_data,
+                ))
+            logger.info(f"Reusing {len(rows)} embeddings of identical content for {uploaded_file.filename}")
+        else:
+            chunks = await self._iter_chunks(uploaded_file)
+            vectors = await embedder.embed_documents([chunk.text for chunk in chunks]) if chunks else []
+            for chunk, vector in zip(chunks, vectors):
+                rows.append(DocumentEmbedding(
+                    project_id=uploaded_file.project_id,
+                    file_id=uploaded_file.id,
+                    source_file=uploaded_file.filename,
+                    chunk_text=chunk.text,
+                    chunk_index=chunk.chunk_index,
+                    content_hash=uploaded_file.content_hash,
+                    embedding=vector,
+                    embedding_model=embedder.name,
+                    meta_data={"page_number": chunk.page_number} if chunk.page_number else {},
+                ))
+            logger.info(f"Embedded {len(rows)} chunks of {uploaded_file.filename} with {embedder.name}")
+
+        db.add_all(rows)
+        await db.commit()
+        return len(rows)
+
+    async def reindex_project(self, db: AsyncSession, project_id: UUID) -> Dict[str, int]:
+        """
+        Re-embed every analyzed file of a project (e.g. after switching embedder).
+
+        Returns:
+            {"files": indexed file count, "chunks": stored chunk count}
+        """
+        result = await db.execute(
+            select(UploadedFile)
+            .where(UploadedFile.project_id == project_id)
+            .where(UploadedFile.status == "completed")
+        )
+        files = result.scalars().all()
+
+        chunks = 0
+        for uploaded_file in files:
+            chunks += await self.index_file(db, uploaded_file)
+        self._memory_indexes.pop(project_id, None)
+        return {"files": len(files), "chunks": chunks}
+
+    async def embed_query(self, query: str) -> List[float]:
+        """Embed a query, caching recent ones (typeahead and paging repeat them)."""
+        embedder = get_embedder()
+        key = (embedder.name, query)
+        vector = self._query_cache.get(key)
+        if vector is not None:
+            self._query_cache.move_to_end(key)
+            return vector
+
+        vector = await embedder.embed_query(query)
+        self._query_cache[key] = vector
+        if len(self._query_cache) > QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        return vector
+
+    async def _search_pgvector(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        query_vector: List[float],
+        top_k: int,
+        file_id: Optional[UUID],
+    ) -> List[SemanticMatch]:
+        # Widen the HNSW candidate list: rows of other projects are filtered out after the scan
+        await db.execute(text(f"SET LOCAL hnsw.ef_search = {int(settings.VECTOR_EF_SEARCH)}"))
+
+        distance = DocumentEmbedding.embedding.cosine_distance(query_vector)
+        stmt = (
+            select(DocumentEmbedding, distance.label("distance"))
+            .options(defer(DocumentEmbedding.embedding))
+            .where(DocumentEmbedding.project_id == project_id)
+            .where(DocumentEmbedding.embedding_model == get_embedder().name)
+            .order_by(distance)
+            .limit(top_k)
+        )
+        if file_id is not None:
+            stmt = stmt.where(DocumentEmbedding.file_id == file_id)
+
+        result = await db.execute(stmt)
+        return [SemanticMatch(chunk=row, score=1 - float(dist)) for row, dist in result.all()]
+
+    async def _get_memory_index(self, db: AsyncSession, project_id: UUID) -> _MemoryIndex:
+        """
+        Project index, synced with the table when its rows changed.
+
+        Other processes (Celery workers) write embeddings too, so a cheap
+        count/latest-timestamp signature is checked on every search and only
+        added or removed rows are applied.
+        """
+        model_name = get_embedder().name
+        project_rows = (
+            (DocumentEmbedding.project_id == project_id)
+            & (DocumentEmbedding.embedding_model == model_name)
+        )
+        result = await db.execute(
+            select(func.count(DocumentEmbedding.id), func.max(DocumentEmbedding.created_at)).where(project_rows)
+        )
+        signature = tuple(result.one())
+
+        entry = self._memory_indexes.get(project_id)
+        if entry is None:
+            entry = _MemoryIndex()
+            self._memory_indexes[project_id] = entry
+        if entry.signature == signature:
+            return entry
+
+        result = await db.execute(select(DocumentEmbedding.id).where(project_rows))
+        row_ids = set(result.scalars().all())
+        added = row_ids - entry.row_ids
+        removed = entry.row_ids - row_ids
+        for row_id in removed:
+            entry.index.remove(row_id)
+        if added:
+            result = await db.execute(
+                select(DocumentEmbedding.id, DocumentEmbedding.embedding)
+                .where(DocumentEmbedding.id.in_(added))
+            )
+            for row_id, vector in result.all():
+                entry.index.add(row_id, vector)
+
+        entry.row_ids = row_ids
+        entry.signature = signature
+        logger.info(
+            f"Synced in-memory vector index for project {project_id}: "
+            f"{len(added)} added, {len(removed)} removed, {len(entry.index)} total"
+        )
+        return entry
+
+    async def _search_memory(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        query_vector: List[float],
+        top_k: int,
+        file_id: Optional[UUID],
+    ) -> List[SemanticMatch]:
+        entry = await self._get_memory_index(db, project_id)
+        # Over-fetch when filtering by file, since the graph is per project
+        hits = entry.index.search(query_vector, k=top_k * 5 if file_id else top_k)
+        if not hits:
+            return []
+
+        result = await db.execute(
+            select(DocumentEmbedding)
+            .options(defer(DocumentEmbedding.embedding))
+            .where(DocumentEmbedding.id.in_([row_id for row_id, _ in hits]))
+        )
+        rows = {row.id: row for row in result.scalars().all()}
+        matches = [
+            SemanticMatch(chunk=rows[row_id], score=score)
+            for row_id, score in hits
+            if row_id in rows and (file_id is None or rows[row_id].file_id == file_id)
+        ]
+        return matches[:top_k]
+
+    async def search(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        query: str,
+        top_k: int = 10,
+        file_id: Optional[UUID] = None,
+    ) -> List[SemanticMatch]:
+        """
+        Find the document chunks most similar to a query.
+
+        Args:
+            db: Database session
+            project_id: Project to search
+            query: Natural-language query
+            top_k: Maximum number of chunks returned
+            file_id: Only search chunks of this file
+
+        Returns:
+            Matches, most similar first
+        """
+        started = time.perf_counter()
+        query_vector = await self.embed_query(query)
+        embedded = time.perf_counter()
+
+        if not settings.use_pgvector:
+            matches = await self._search_memory(db, project_id, query_vector, top_k, file_id)
+        else:
+            matches = await self._search_pgvector(db, project_id, query_vector, top_k, file_id)
+
+        logger.info(
+            f"Semantic search '{query}' in project {project_id}: {len(matches)} results "
+            f"(embed {(embedded - started) * 1000:.1f}ms, "
+            f"search {(time.perf_counter() - embedded) * 1000:.1f}ms)"
+        )
+        return matches
+
+    def invalidate(self, project_id: UUID) -> None:
+        """Forget a project's in-memory index (e.g. when the project is deleted)."""
+        self._memory_indexes.pop(project_id, None)
+
+
+# Global instance
+semantic_search_service = SemanticSearchService()
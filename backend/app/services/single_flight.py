@@ -0,0 +1,178 @@
+"""
+Coalescing of identical in-flight LLM calls.
+
+A double-clicked export or a retried /prd/{id}/outline request used to
+start a second, identical provider call while the first was still running.
+The provider services wrap generate_text, chat and chat_stream with
+single_flight.coalesced: while a call with the same fingerprint (see
+llm_cache.fingerprint) is in flight in this process, later callers wait for
+it and receive its result or exception instead of calling the provider.
+
+Streams are shared too. Every subscriber receives the complete response,
+including chunks produced before it joined. The provider call is cancelled
+once all of its callers have gone away.
+"""
+import asyncio
+import functools
+import inspect
+import logging
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+from backend.app.core.metrics import metrics
+from backend.app.services.llm_cache import call_arguments, fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One in-flight call and the number of callers waiting for it."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _SharedStream:
+    """Chunks of one in-flight stream, replayed to every subscriber."""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        # Replaced after every change, so a subscriber never misses a wakeup
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """Shares in-flight calls and streams between callers with the same key."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Flight] = {}
+        self._streams: Dict[Hashable, _SharedStream] = {}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Result of call(), shared with concurrent callers using the same key.
+
+        Args:
+            key: Identity of the call
+            call: Starts the call; only invoked if none with this key is in flight
+
+        Returns:
+            The call's result (exceptions are raised to every caller)
+        """
+        flight = self._calls.get(key)
+        if flight is None:
+            metrics.increment("single_flight.calls")
+            flight = _Flight(asyncio.create_task(call()))
+            self._calls[key] = flight
+            flight.task.add_done_callback(lambda _, flight=flight: self._finish(self._calls, key, flight))
+        else:
+            metrics.increment("single_flight.coalesced")
+
+        flight.waiters += 1
+        try:
+            # One caller giving up must not cancel the call for the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def stream(self, key: Hashable, start: Callable[[], AsyncIterator[Any]]) -> AsyncGenerator[Any, None]:
+        """
+        Chunks of start()'s stream, shared with concurrent subscribers using the same key.
+
+        Args:
+            key: Identity of the stream
+            start: Opens the stream; only invoked if none with this key is in flight
+
+        Yields:
+            Every chunk of the stream from the beginning
+        """
+        shared = self._streams.get(key)
+        if shared is None:
+            metrics.increment("single_flight.calls")
+            shared = _SharedStream()
+            self._streams[key] = shared
+            shared.task = asyncio.create_task(self._pump(shared, start))
+            shared.task.add_done_callback(lambda _, shared=shared: self._finish(self._streams, key, shared))
+        else:
+            metrics.increment("single_flight.coalesced")
+
+        shared.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(shared.chunks):
+                    index += 1
+                    yield shared.chunks[index - 1]
+                elif shared.done:
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+                else:
+                    await shared.changed.wait()
+        finally:
+            shared.subscribers -= 1
+            if shared.subscribers == 0 and not shared.task.done():
+                shared.task.cancel()
+
+    @staticmethod
+    async def _pump(shared: _SharedStream, start: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async for chunk in start():
+                shared.chunks.append(chunk)
+                shared.notify()
+        except asyncio.CancelledError:
+            shared.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            shared.error = e
+        finally:
+            shared.done = True
+            shared.notify()
+
+    @staticmethod
+    def _finish(registry: Dict[Hashable, Any], key: Hashable, entry: Any) -> None:
+        # Later identical calls start afresh
+        if registry.get(key) is entry:
+            del registry[key]
+
+    def coalesced(self, func: Callable) -> Callable:
+        """
+        Share concurrent identical calls of an AIServiceBase method.
+
+        Works for coroutine methods (generate_text, chat) and async
+        generator methods (chat_stream).
+        """
+        signature = inspect.signature(func)
+
+        def key_of(service: Any, args: tuple, kwargs: dict) -> str:
+            arguments = call_arguments(signature, service, args, kwargs)
+            return fingerprint(service.provider_name.lower(), service.model_name, func.__name__, arguments)
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def stream_wrapper(service, *args, **kwargs):
+                key = key_of(service, args, kwargs)
+                async for chunk in self.stream(key, lambda: func(service, *args, **kwargs)):
+                    yield chunk
+
+            return stream_wrapper
+
+        @functools.wraps(func)
+        async def wrapper(service, *args, **kwargs):
+            key = key_of(service, args, kwargs)
+            return await self.do(key, lambda: func(service, *args, **kwargs))
+
+        return wrapper
+
+
+# Global instance
+single_flight = SingleFlight()
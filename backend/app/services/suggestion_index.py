@@ -0,0 +1,227 @@
+"""
+Prefix index for search-as-you-type suggestions.
+
+Module names, feature names, requirement titles and UI component names are
+kept in a sorted array of keys and looked up with binary search, so a
+keystroke costs O(log n) plus the matches read. Besides the full name,
+each name is also keyed from inside: every CJK character and every Latin
+word start. Typing "管理" therefore finds "用户管理", and "export" finds
+"Order export".
+
+Indexes are per project and synced by diffing suggestion sets, so adding a
+feature inserts a handful of keys instead of rebuilding the array.
+"""
+import bisect
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+from backend.app.models.knowledge_base import KnowledgeBase
+from backend.app.services.search_index import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Display order of suggestion kinds
+KIND_PRIORITY = {"module": 0, "feature": 1, "requirement": 2, "ui_component": 3}
+
+# Prefix matches read per lookup before ranking, keeps one-letter queries fast
+MAX_SCAN = 500
+
+_CJK_PATTERN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+_WORD_START = re.compile(r"(?<![a-z0-9])[a-z0-9]")
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    """One suggestable name."""
+    text: str
+    kind: str  # module, feature, requirement, ui_component
+    module_name: Optional[str] = None
+    conversation_id: Optional[str] = None
+
+
+def _keys(text: str) -> List[Tuple[str, bool]]:
+    """
+    Index keys for a name as (key, is_full_name) pairs.
+
+    Infix keys start at each CJK character and each Latin word start after
+    the first position.
+    """
+    normalized = normalize_query(text)
+    if not normalized:
+        return []
+    keys = [(normalized, True)]
+    starts = {i for i, char in enumerate(normalized) if _CJK_PATTERN.match(char)}
+    starts.update(match.start() for match in _WORD_START.finditer(normalized))
+    for start in sorted(starts):
+        if start > 0:
+            keys.append((normalized[start:], False))
+    return keys
+
+
+def extract_suggestions(structured_data: Dict[str, Any]) -> Set[Suggestion]:
+    """Suggestable names from a knowledge base's structured_data."""
+    suggestions: Set[Suggestion] = set()
+
+    for module in structured_data.get("feature_modules", []):
+        module_name = module.get("module_name", "")
+        if module_name:
+            suggestions.add(Suggestion(text=module_name, kind="module", module_name=module_name))
+        for feature in module.get("features", []):
+            if feature.get("name"):
+                suggestions.add(Suggestion(
+                    text=feature["name"],
+                    kind="feature",
+                    module_name=module_name or None,
+                    conversation_id=feature.get("conversation_id") or None,
+                ))
+
+    for req in structured_data.get("completed_requirements", []):
+        if req.get("title"):
+            suggestions.add(Suggestion(
+                text=req["title"],
+                kind="requirement",
+                conversation_id=req.get("conversation_id") or None,
+            ))
+
+    for component in structured_data.get("ui_ux_standards", {}).get("common_components", []):
+        if isinstance(component, str) and component:
+            suggestions.add(Suggestion(text=component, kind="ui_component"))
+
+    return suggestions
+
+
+class SuggestionIndex:
+    """Sorted (key, suggestion id) array with incremental insert and delete."""
+
+    def __init__(self):
+        self._entries: List[Tuple[str, int]] = []  # Sorted by key
+        self._full_name: Dict[Tuple[str, int], bool] = {}
+        self._suggestions: Dict[int, Suggestion] = {}
+        self._ids: Dict[Suggestion, int] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._suggestions)
+
+    @property
+    def suggestions(self) -> Set[Suggestion]:
+        return set(self._ids)
+
+    def add(self, suggestion: Suggestion) -> None:
+        """Insert a suggestion's keys (no-op if already present)."""
+        if suggestion in self._ids:
+            return
+        suggestion_id = self._next_id
+        self._next_id += 1
+        self._ids[suggestion] = suggestion_id
+        self._suggestions[suggestion_id] = suggestion
+        for key, is_full_name in _keys(suggestion.text):
+            entry = (key, suggestion_id)
+            bisect.insort(self._entries, entry)
+            self._full_name[entry] = is_full_name
+
+    def remove(self, suggestion: Suggestion) -> None:
+        """Delete a suggestion's keys."""
+        suggestion_id = self._ids.pop(suggestion, None)
+        if suggestion_id is None:
+            return
+        del self._suggestions[suggestion_id]
+        for key, _ in _keys(suggestion.text):
+            entry = (key, suggestion_id)
+            i = bisect.bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+            self._full_name.pop(entry, None)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Suggestion]:
+        """
+        Suggestions whose name (or a word/character inside it) starts with prefix.
+
+        Names starting with the prefix come first, then by kind (modules
+        before features, requirements and components), then shorter names.
+        """
+        prefix = normalize_query(prefix)
+        if not prefix:
+            return []
+
+        best: Dict[int, Tuple[int, int, int, str]] = {}
+        i = bisect.bisect_left(self._entries, (prefix,))
+        end = min(len(self._entries), i + MAX_SCAN)
+        while i < end and self._entries[i][0].startswith(prefix):
+            entry = self._entries[i]
+            suggestion = self._suggestions[entry[1]]
+            rank = (
+                0 if self._full_name[entry] else 1,
+                KIND_PRIORITY.get(suggestion.kind, len(KIND_PRIORITY)),
+                len(suggestion.text),
+                suggestion.text,
+            )
+            if entry[1] not in best or rank < best[entry[1]]:
+                best[entry[1]] = rank
+            i += 1
+
+        ordered = sorted(best, key=best.get)
+        return [self._suggestions[suggestion_id] for suggestion_id in ordered[:limit]]
+
+
+@dataclass
+class _ProjectSuggestions:
+    version: int
+    index: SuggestionIndex
+
+
+class SuggestionIndexRegistry:
+    """Per-project suggestion indexes, tagged with the KB version they reflect."""
+
+    def __init__(self):
+        self._indexes: Dict[UUID, _ProjectSuggestions] = {}
+
+    def get(self, project_id: UUID, version: int) -> Optional[SuggestionIndex]:
+        """Index for a project if it is synced to the given KB version."""
+        entry = self._indexes.get(project_id)
+        if entry is None or entry.version != version:
+            return None
+        return entry.index
+
+    def sync(self, kb: KnowledgeBase, create: bool = True) -> Optional[SuggestionIndex]:
+        """
+        Bring a project's index up to date with a knowledge base.
+
+        Only suggestions that appeared or disappeared since the last sync
+        are inserted or deleted.
+
+        Args:
+            kb: Knowledge base (its structured_data must be loaded)
+            create: Build the index if the project has none yet; pass False
+                from write paths so unused projects are not indexed eagerly
+        """
+        entry = self._indexes.get(kb.project_id)
+        if entry is None:
+            if not create:
+                return None
+            entry = _ProjectSuggestions(version=kb.version, index=SuggestionIndex())
+            self._indexes[kb.project_id] = entry
+
+        current = extract_suggestions(kb.structured_data or {})
+        existing = entry.index.suggestions
+        for suggestion in existing - current:
+            entry.index.remove(suggestion)
+        for suggestion in current - existing:
+            entry.index.add(suggestion)
+        entry.version = kb.version
+
+        logger.info(
+            f"Synced suggestion index for project {kb.project_id} to KB v{kb.version}: "
+            f"{len(current - existing)} added, {len(existing - current)} removed, {len(entry.index)} total"
+        )
+        return entry.index
+
+    def invalidate(self, project_id: UUID) -> None:
+        """Forget a project's index."""
+        self._indexes.pop(project_id, None)
+
+
+# Global instance
+suggestion_index_registry = SuggestionIndexRegistry()
@@ -0,0 +1,216 @@
+"""
+Resumable upload sessions for large files.
+
+A client creates a session with the expected total size, sends the file in
+parts (each part states the byte offset it starts at), can ask how many bytes
+the server already has after a dropped connection, and finally completes the
+session to turn the assembled file into a normal upload.
+
+Session state lives on disk under UPLOAD_DIR/.upload_sessions so it survives
+restarts and is shared by all worker processes on the host. Appending and
+completing hold an flock on the session's metadata file, so parts sent to
+different workers at once are still applied one at a time.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator
+from uuid import UUID
+import aiofiles
+from backend.app.core.config import settings
+from backend.app.services.blob_store import UploadTooLargeError
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSessionError(ValueError):
+    """Raised when a part does not fit the session (wrong offset, too much data)."""
+
+
+class UploadSessionManager:
+    """Creates, appends to and completes resumable upload sessions."""
+
+    def __init__(self, root: str, ttl_seconds: int):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, f"{upload_id}.json")
+
+    def data_path(self, upload_id: str) -> str:
+        """Path of the partially assembled file."""
+        return os.path.join(self.root, f"{upload_id}.part")
+
+    @asynccontextmanager
+    async def _locked(self, upload_id: str):
+        """
+        Hold an exclusive lock on a session, across processes.
+
+        Raises:
+            KeyError: If the session does not exist
+        """
+        try:
+            fd = os.open(self._meta_path(upload_id), os.O_RDONLY)
+        except FileNotFoundError:
+            raise KeyError(upload_id)
+        try:
+            # flock blocks, so wait for it off the event loop
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    def _received_bytes(self, upload_id: str) -> int:
+        path = self.data_path(upload_id)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    async def create(self, project_id: UUID, filename: str, total_size: int) -> Dict[str, Any]:
+        """
+        Start a new session.
+
+        Raises:
+            UploadTooLargeError: If total_size exceeds the upload size limit
+        """
+        if total_size > settings.max_file_size_bytes:
+            raise UploadTooLargeError(f"File size exceeds limit ({settings.MAX_FILE_SIZE_MB}MB)")
+
+        os.makedirs(self.root, exist_ok=True)
+        self.expire_stale()
+
+        session = {
+            "upload_id": str(uuid.uuid4()),
+            "project_id": str(project_id),
+            "filename": filename,
+            "total_size": total_size,
+            "created_at": time.time(),
+        }
+        async with aiofiles.open(self._meta_path(session["upload_id"]), "w", encoding="utf-8") as f:
+            await f.write(json.dumps(session))
+        # Create the empty data file so offsets start at 0
+        async with aiofiles.open(self.data_path(session["upload_id"]), "wb"):
+            pass
+
+        logger.info(f"Created upload session {session['upload_id']} for {filename} ({total_size} bytes)")
+        return {**session, "received_bytes": 0}
+
+    async def get(self, upload_id: str) -> Dict[str, Any]:
+        """
+        Load a session with its current received_bytes offset.
+
+        Raises:
+            KeyError: If the session does not exist (or has expired)
+        """
+        meta_path = self._meta_path(upload_id)
+        if not os.path.exists(meta_path):
+            raise KeyError(upload_id)
+        async with aiofiles.open(meta_path, "r", encoding="utf-8") as f:
+            session = json.loads(await f.read())
+        session["received_bytes"] = self._received_bytes(upload_id)
+        return session
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        Append one part to the session.
+
+        Args:
+            upload_id: Session ID
+            offset: Byte offset this part starts at; must equal the bytes received so far
+            chunks: Async iterator over the part body
+
+        Returns:
+            Updated session
+
+        Raises:
+            KeyError: If the session does not exist
+            UploadSessionError: If the offset is wrong or the part overruns total_size
+        """
+        # Parts of one session are appended one at a time; a concurrent part
+        # (e.g. a client retrying while the first request is still running,
+        # possibly in another worker) waits and is then checked against the
+        # new offset
+        async with self._locked(upload_id):
+            # Re-read under the lock: the session may have been completed meanwhile
+            session = await self.get(upload_id)
+            if offset != session["received_bytes"]:
+                raise UploadSessionError(
+                    f"Offset mismatch: expected {session['received_bytes']}, got {offset}"
+                )
+
+            written = 0
+            remaining = session["total_size"] - offset
+            async with aiofiles.open(self.data_path(upload_id), "ab") as f:
+                async for chunk in chunks:
+                    written += len(chunk)
+                    if written > remaining:
+                        # Drop the partial part so the client can retry from the same offset
+                        await f.truncate(offset)
+                        raise UploadSessionError("Part exceeds the declared total size")
+                    await f.write(chunk)
+
+            session["received_bytes"] = offset + written
+            return session
+
+    async def take_completed(self, upload_id: str) -> Dict[str, Any]:
+        """
+        Close a fully received session.
+
+        The assembled file stays at data_path(upload_id) for the caller to move
+        into the blob store; the session metadata is removed.
+
+        Raises:
+            KeyError: If the session does not exist
+            UploadSessionError: If not all bytes have been received
+        """
+        # Wait for a part that is still being written
+        async with self._locked(upload_id):
+            session = await self.get(upload_id)
+            if session["received_bytes"] != session["total_size"]:
+                raise UploadSessionError(
+                    f"Upload incomplete: {session['received_bytes']}/{session['total_size']} bytes received"
+                )
+            os.remove(self._meta_path(upload_id))
+            return session
+
+    def abort(self, upload_id: str) -> None:
+        """Discard a session and any data received for it."""
+        for path in (self._meta_path(upload_id), self.data_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        logger.info(f"Aborted upload session {upload_id}")
+
+    def expire_stale(self) -> int:
+        """
+        Remove sessions that have been idle for longer than the TTL.
+
+        Returns:
+            Number of sessions removed
+        """
+        if not os.path.isdir(self.root):
+            return 0
+
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            # Appending a part refreshes the data file's mtime
+            data_path = self.data_path(upload_id)
+            activity_path = data_path if os.path.exists(data_path) else os.path.join(self.root, name)
+            if os.path.getmtime(activity_path) < cutoff:
+                self.abort(upload_id)
+                removed += 1
+        return removed
+
+
+# Global instance
+upload_sessions = UploadSessionManager(
+    root=os.path.join(settings.UPLOAD_DIR, ".upload_sessions"),
+    ttl_seconds=settings.UPLOAD_SESSION_TTL_HOURS * 3600,
+)
@@ -0,0 +1,159 @@
+"""
+In-process HNSW index, used for semantic search when the database cannot
+serve approximate nearest neighbour queries itself (VECTOR_INDEX=memory,
+e.g. pgvector older than 0.5 without HNSW support).
+
+Vectors are expected to be L2-normalized; similarity is the dot product.
+"""
+import heapq
+import math
+import random
+import threading
+from typing import Dict, Hashable, List, Optional, Tuple
+import numpy as np
+
+
+class HNSWIndex:
+    """
+    Hierarchical Navigable Small World graph (Malkov & Yashunin).
+
+    Each node lives on layers 0..level; upper layers are sparse "express
+    lanes" used to find a good entry point, layer 0 holds every node.
+    Search cost grows roughly logarithmically with the number of vectors.
+    """
+
+    def __init__(self, dimension: int, m: int = 16, ef_construction: int = 64, ef_search: int = 64, seed: int = 42):
+        self.dimension = dimension
+        self.m = m
+        self.m0 = 2 * m  # More links on the dense bottom layer
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_mult = 1 / math.log(m)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._keys: List[Hashable] = []
+        self._key_to_id: Dict[Hashable, int] = {}
+        self._deleted: set = set()
+        self._graph: List[Dict[int, List[int]]] = []  # per layer: node -> neighbours
+        self._entry_point: Optional[int] = None
+        self._max_level = -1
+
+    def __len__(self) -> int:
+        return len(self._keys) - len(self._deleted)
+
+    def _similarity(self, query: np.ndarray, ids: List[int]) -> np.ndarray:
+        return self._vectors[ids] @ query
+
+    def _search_layer(self, query: np.ndarray, entry_points: List[int], ef: int, layer: int) -> List[Tuple[float, int]]:
+        """Best-first search on one layer; returns up to ef (similarity, id) pairs."""
+        visited = set(entry_points)
+        sims = self._similarity(query, entry_points)
+        candidates = [(-float(s), i) for s, i in zip(sims, entry_points)]  # max-heap by similarity
+        heapq.heapify(candidates)
+        results = [(float(s), i) for s, i in zip(sims, entry_points)]  # min-heap by similarity
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        graph = self._graph[layer]
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if -neg_sim < results[0][0] and len(results) >= ef:
+                break
+            neighbours = [n for n in graph.get(node, ()) if n not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+            for sim, neighbour in zip(self._similarity(query, neighbours), neighbours):
+                sim = float(sim)
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbour))
+                    heapq.heappush(results, (sim, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _prune(self, node: int, layer: int, max_links: int) -> None:
+        neighbours = self._graph[layer][node]
+        if len(neighbours) <= max_links:
+            return
+        sims = self._similarity(self._vectors[node], neighbours)
+        keep = np.argsort(-sims)[:max_links]
+        self._graph[layer][node] = [neighbours[i] for i in keep]
+
+    def add(self, key: Hashable, vector: List[float]) -> None:
+        """Insert a vector (re-adding an existing key replaces it)."""
+        with self._lock:
+            if key in self._key_to_id:
+                self._remove_locked(key)
+
+            node = len(self._keys)
+            if node == len(self._vectors):
+                # Grow storage geometrically so inserts stay amortized O(1)
+                grown = np.zeros((max(64, 2 * node), self.dimension), dtype=np.float32)
+                grown[:node] = self._vectors[:node]
+                self._vectors = grown
+            self._vectors[node] = np.asarray(vector, dtype=np.float32)
+            self._keys.append(key)
+            self._key_to_id[key] = node
+            query = self._vectors[node]
+
+            level = int(-math.log(1 - self._random.random()) * self._level_mult)
+            while len(self._graph) <= level:
+                self._graph.append({})
+            for layer in range(level + 1):
+                self._graph[layer][node] = []
+
+            if self._entry_point is None:
+                self._entry_point, self._max_level = node, level
+                return
+
+            entry = [self._entry_point]
+            for layer in range(self._max_level, level, -1):
+                entry = [self._search_layer(query, entry, 1, layer)[0][1]]
+
+            for layer in range(min(level, self._max_level), -1, -1):
+                found = self._search_layer(query, entry, self.ef_construction, layer)
+                max_links = self.m0 if layer == 0 else self.m
+                neighbours = [i for _, i in found[:max_links]]
+                self._graph[layer][node] = neighbours
+                for neighbour in neighbours:
+                    self._graph[layer][neighbour].append(node)
+                    self._prune(neighbour, layer, max_links)
+                entry = [i for _, i in found]
+
+            if level > self._max_level:
+                self._entry_point, self._max_level = node, level
+
+    def _remove_locked(self, key: Hashable) -> None:
+        node = self._key_to_id.pop(key, None)
+        if node is not None:
+            # Tombstone: the node keeps routing searches but is never returned
+            self._deleted.add(node)
+
+    def remove(self, key: Hashable) -> None:
+        """Remove a vector by key."""
+        with self._lock:
+            self._remove_locked(key)
+
+    def search(self, vector: List[float], k: int = 10) -> List[Tuple[Hashable, float]]:
+        """
+        Approximate k nearest neighbours.
+
+        Returns:
+            (key, cosine similarity) pairs, most similar first
+        """
+        with self._lock:
+            if self._entry_point is None or not len(self):
+                return []
+
+            query = np.asarray(vector, dtype=np.float32)
+            entry = [self._entry_point]
+            for layer in range(self._max_level, 0, -1):
+                entry = [self._search_layer(query, entry, 1, layer)[0][1]]
+
+            ef = min(max(self.ef_search, k + len(self._deleted)), len(self._keys))
+            found = self._search_layer(query, entry, ef, 0)
+            return [(self._keys[i], sim) for sim, i in found if i not in self._deleted][:k]
@@ -11,6 +11,7 @@ from backend.app.models.knowledge_base import KnowledgeBase
 from backend.app.models.project import Project
 from backend.app.models.file import UploadedFile
 from backend.app.services.gemini_service import GeminiService
+from backend.app.services.kb_context import kb_context_cache
 import os
 
 logger = logging.getLogger(__name__)
@@ -672,30 +673,8 @@ function showPage(pageId) {{
         return "\n".join(lines)
 
     def _format_knowledge_base(self, kb: KnowledgeBase) -> str:
-        """Format knowledge base as text."""
-        data = kb.structured_data
-        lines = []
-
-        # Extract key information from knowledge base
-        if data.get("project_overview"):
-            overview = data["project_overview"]
-            lines.append("## 项目概览")
-            if overview.get("product_type"):
-                lines.append(f"- 产品类型：{overview['product_type']}")
-            if overview.get("target_users"):
-                lines.append(f"- 目标用户：{overview['target_users']}")
-            lines.append("")
-
-        if data.get("ui_ux_design"):
-            ui = data["ui_ux_design"]
-            lines.append("## UI/UX 设计")
-            if ui.get("design_system"):
-                lines.append(f"- 设计系统：{ui['design_system']}")
-            if ui.get("color_scheme"):
-                lines.append(f"- 配色方案：{ui['color_scheme']}")
-            lines.append("")
-
-        return "\n".join(lines)
+        """Format knowledge base as text (cached per KB version)."""
+        return kb_context_cache.render(kb, "wireframe")
 
     def _clean_html_response(self, html_content: str) -> str:
         """
@@ -1,22 +1,41 @@
 """
 Celery tasks for asynchronous file analysis
+
+Start a worker with:
+    celery -A backend.app.tasks.file_analysis worker --loglevel=info
+and the periodic cleanup with:
+    celery -A backend.app.tasks.file_analysis beat --loglevel=info
 """
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional
+from uuid import UUID
+
+import redis
 from celery import Celery
-from sqlalchemy.ext.asyncio import create_async_session
-from backend.app.core.config import get_settings
-from backend.app.services.gemini_service import GeminiService
-from backend.app.services.file_processor import FileProcessor
+from celery.signals import worker_process_init
+from sqlalchemy import select
+
+from backend.app.core.config import settings
+from backend.app.core.database import AsyncSessionLocal, engine
 from backend.app.models.file import UploadedFile
-import logging
+from backend.app.models.project import Project
+from backend.app.models.knowledge_base import KnowledgeBase
+from backend.app.services.file_analysis_service import file_analysis_service
+from backend.app.services.scratch_space import scratch_space
+from backend.app.services.upload_sessions import upload_sessions
 
-settings = get_settings()
 logger = logging.getLogger(__name__)
 
 # Initialize Celery
 celery_app = Celery(
     'prdsherpa',
-    broker=settings.celery_broker_url,
-    backend=settings.celery_result_backend
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND
 )
 
 celery_app.conf.update(
@@ -26,10 +45,104 @@ celery_app.conf.update(
     timezone='Asia/Shanghai',
     enable_utc=True,
     task_track_started=True,
-    task_time_limit=300,  # 5分钟超时
-    task_soft_time_limit=240,  # 4分钟软超时
+    task_time_limit=600,  # 10分钟超时（包含限流等待）
+    task_soft_time_limit=540,  # 9分钟软超时
+    worker_concurrency=settings.CELERY_WORKER_CONCURRENCY,
+    worker_prefetch_multiplier=1,  # 分析耗时长，避免单个进程囤积任务
+    task_acks_late=True,  # 进程崩溃时任务重新入队
+    task_reject_on_worker_lost=True,
+    beat_schedule={
+        'cleanup-temp-files': {
+            'task': 'backend.app.tasks.file_analysis.cleanup_temp_files_task',
+            'schedule': 15 * 60,  # 每15分钟（需启动 celery beat）
+        },
+    },
 )
 
+# One event loop per worker process: the async engine's pooled connections
+# are bound to the loop that opened them, so every task must reuse it.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def run_async(coro):
+    """Run a coroutine on this worker process's event loop."""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
+
+@worker_process_init.connect
+def _reset_connections_after_fork(**kwargs):
+    """Drop database connections inherited from the parent process."""
+    engine.sync_engine.dispose(close=False)
+
+
+def _kb_build_lock_key(project_id: str) -> str:
+    return f"kb_build_scheduled:{project_id}"
+
+
+async def _analyze_file(file_id: str) -> dict:
+    async with AsyncSessionLocal() as db:
+        uploaded_file = await db.get(UploadedFile, UUID(file_id))
+        if not uploaded_file:
+            logger.warning(f"File {file_id} no longer exists, skipping analysis")
+            return {'status': 'skipped', 'file_id': file_id}
+
+        if uploaded_file.status == "completed":
+            return {'status': 'completed', 'file_id': file_id}
+
+        analysis = await file_analysis_service.analyze(db, uploaded_file)
+        return {
+            'status': 'completed',
+            'file_id': file_id,
+            'analysis': analysis or {},
+        }
+
+
+async def _requeue_file(file_id: str) -> None:
+    """Put a failed file back in the queue while a retry is pending."""
+    async with AsyncSessionLocal() as db:
+        uploaded_file = await db.get(UploadedFile, UUID(file_id))
+        if uploaded_file and uploaded_file.status == "failed":
+            uploaded_file.status = "queued"
+            await db.commit()
+
+
+async def _project_settled(project_id: str) -> bool:
+    async with AsyncSessionLocal() as db:
+        return await file_analysis_service.count_in_flight(db, UUID(project_id)) == 0
+
+
+def schedule_knowledge_base_build(project_id: str) -> None:
+    """
+    Queue an automatic knowledge base build for a project whose files have
+    all finished analyzing.
+
+    Builds are debounced: files finishing close together schedule one build.
+    """
+    if not settings.KB_AUTO_BUILD:
+        return
+
+    if not run_async(_project_settled(project_id)):
+        return
+
+    delay = settings.KB_AUTO_BUILD_DELAY_SECONDS
+    client = redis.from_url(settings.REDIS_URL)
+    try:
+        if not client.set(_kb_build_lock_key(project_id), 1, nx=True, ex=delay + 60):
+            logger.info(f"Knowledge base build already scheduled for project_id={project_id}")
+            return
+    except redis.RedisError as e:
+        logger.warning(f"Could not take KB build lock, scheduling anyway: {str(e)}")
+    finally:
+        client.close()
+
+    build_knowledge_base_task.apply_async(args=[project_id], kwargs={'auto': True}, countdown=delay)
+    logger.info(f"Scheduled knowledge base build for project_id={project_id} in {delay}s")
+
+
 @celery_app.task(bind=True, max_retries=3)
 def analyze_file_task(self, file_id: str, project_id: str):
     """
@@ -44,40 +157,77 @@ def analyze_file_task(self, file_id: str, project_id: str):
     """
     try:
         logger.info(f"Starting file analysis for file_id={file_id}")
-
-        # TODO: 实现异步数据库查询和AI分析
-        # 1. 从数据库获取文件信息
-        # 2. 使用 GeminiService 分析
-        # 3. 更新数据库中的分析结果
-        # 4. 触发知识库更新
-
+        result = run_async(_analyze_file(file_id))
         logger.info(f"Completed file analysis for file_id={file_id}")
-        return {
-            'status': 'completed',
-            'file_id': file_id,
-            'analysis': {}
-        }
+        schedule_knowledge_base_build(project_id)
+        return result
 
     except Exception as e:
         logger.error(f"Error analyzing file {file_id}: {str(e)}")
-        # 重试机制
+        if self.request.retries >= self.max_retries:
+            # Give up: the file stays failed, and the rest of the project can still build
+            schedule_knowledge_base_build(project_id)
+            raise
+        # 重试机制（重试前保持 queued，避免项目被误判为已分析完）
+        run_async(_requeue_file(file_id))
         raise self.retry(exc=e, countdown=60)  # 60秒后重试
 
+
 @celery_app.task
-def build_knowledge_base_task(project_id: str):
+def schedule_knowledge_base_build_task(project_id: str):
+    """
+    检查项目文件是否全部分析完成，是则安排知识库构建
+    """
+    schedule_knowledge_base_build(project_id)
+
+
+async def _build_knowledge_base(project_id: str, force_rebuild: bool, auto: bool) -> dict:
+    async with AsyncSessionLocal() as db:
+        project = await db.get(Project, UUID(project_id))
+        if not project:
+            return {'status': 'skipped', 'project_id': project_id, 'reason': 'project not found'}
+
+        if auto and await file_analysis_service.count_in_flight(db, project.id) > 0:
+            # More uploads arrived; the last of them schedules the build
+            return {'status': 'skipped', 'project_id': project_id, 'reason': 'files still analyzing'}
+
+        kb_result = await db.execute(select(KnowledgeBase).where(KnowledgeBase.project_id == project.id))
+        existing_kb = kb_result.scalar_one_or_none()
+
+        if existing_kb and auto and existing_kb.status == "confirmed":
+            # Never overwrite a knowledge base the PM has confirmed without being asked
+            return {'status': 'skipped', 'project_id': project_id, 'reason': 'knowledge base confirmed'}
+
+        if existing_kb and not (auto or force_rebuild):
+            return {'status': 'skipped', 'project_id': project_id, 'reason': 'knowledge base exists'}
+
+        kb = await file_analysis_service.build_knowledge_base(db, project, existing_kb)
+        return {'status': 'completed', 'project_id': project_id, 'version': kb.version}
+
+
+@celery_app.task
+def build_knowledge_base_task(project_id: str, force_rebuild: bool = False, auto: bool = False):
     """
     异步构建或更新知识库
 
     Args:
         project_id: 项目UUID
+        force_rebuild: 已有知识库时是否重建
+        auto: 由文件分析完成自动触发（不会覆盖已确认的知识库）
     """
+    if auto:
+        try:
+            client = redis.from_url(settings.REDIS_URL)
+            client.delete(_kb_build_lock_key(project_id))
+            client.close()
+        except redis.RedisError as e:
+            logger.warning(f"Could not release KB build lock: {str(e)}")
+
     try:
         logger.info(f"Building knowledge base for project_id={project_id}")
-
-        # TODO: 实现知识库构建逻辑
-
-        logger.info(f"Completed knowledge base build for project_id={project_id}")
-        return {'status': 'completed', 'project_id': project_id}
+        result = run_async(_build_knowledge_base(project_id, force_rebuild, auto))
+        logger.info(f"Knowledge base build for project_id={project_id}: {result['status']}")
+        return result
 
     except Exception as e:
         logger.error(f"Error building knowledge base for {project_id}: {str(e)}")
@@ -90,7 +240,19 @@ def cleanup_temp_files_task():
     """
     try:
         logger.info("Starting temp file cleanup")
-        # TODO: 清理 PPTX 图片提取的临时目录
-        logger.info("Completed temp file cleanup")
+        removed = scratch_space.evict_expired()
+        removed += upload_sessions.expire_stale()
+
+        # PPTX 图片曾经直接解压到系统临时目录（pptx_images_*），一并清理遗留目录
+        cutoff = time.time() - scratch_space.ttl_seconds
+        temp_root = tempfile.gettempdir()
+        for name in os.listdir(temp_root):
+            path = os.path.join(temp_root, name)
+            if name.startswith("pptx_images_") and os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+
+        logger.info(f"Completed temp file cleanup ({removed} entries removed)")
+        return {'status': 'completed', 'removed': removed}
     except Exception as e:
         logger.error(f"Error in temp file cleanup: {str(e)}")
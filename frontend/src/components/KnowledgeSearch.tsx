@@ -1,5 +1,6 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import {
+  AutoComplete,
   Input,
   Select,
   Card,
@@ -42,6 +43,35 @@ const KnowledgeSearch = ({ projectId, availableModules = [] }: KnowledgeSearchPr
   const [total, setTotal] = useState(0);
   const [typeFilter, setTypeFilter] = useState<string | undefined>(undefined);
   const [moduleFilter, setModuleFilter] = useState<string | undefined>(undefined);
+  const [suggestions, setSuggestions] = useState<{ value: string }[]>([]);
+  const suggestTimer = useRef<ReturnType<typeof setTimeout>>();
+  const suggestSeq = useRef(0);
+
+  // 卸载时清除未触发的联想请求
+  useEffect(() => () => clearTimeout(suggestTimer.current), []);
+
+  // 输入时获取联想词（防抖，不触发完整搜索）
+  const handleInputChange = (value: string) => {
+    setSearchQuery(value);
+    clearTimeout(suggestTimer.current);
+    // 递增序号，使已发出的旧请求结果失效
+    const seq = ++suggestSeq.current;
+    if (!value.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    suggestTimer.current = setTimeout(async () => {
+      try {
+        const response = await searchApi.suggest(projectId, value);
+        // 丢弃晚于新输入返回的旧结果
+        if (seq !== suggestSeq.current) return;
+        setSuggestions(response.suggestions.map((s) => ({ value: s.text })));
+      } catch (error) {
+        if (seq !== suggestSeq.current) return;
+        setSuggestions([]);
+      }
+    }, 150);
+  };
 
   // 执行搜索
   const handleSearch = async (query: string) => {
@@ -97,16 +127,22 @@ const KnowledgeSearch = ({ projectId, availableModules = [] }: KnowledgeSearchPr
     <Card>
       <Space orientation="vertical" size="large" style={{ width: '100%' }}>
         {/* 搜索输入框 */}
-        <Search
-          placeholder="搜索需求、模块、技术模式、UI组件..."
-          size="large"
-          allowClear
-          enterButton={<SearchOutlined />}
-          loading={searching}
-          onSearch={handleSearch}
-          onChange={(e) => setSearchQuery(e.target.value)}
+        <AutoComplete
+          style={{ width: '100%' }}
+          options={suggestions}
           value={searchQuery}
-        />
+          onChange={handleInputChange}
+          onSelect={(value: string) => handleSearch(value)}
+        >
+          <Search
+            placeholder="搜索需求、模块、技术模式、UI组件..."
+            size="large"
+            allowClear
+            enterButton={<SearchOutlined />}
+            loading={searching}
+            onSearch={handleSearch}
+          />
+        </AutoComplete>
 
         {/* 筛选器 */}
         <Space wrap>
@@ -3,6 +3,7 @@ import type {
   Project,
   ProjectCreate,
   UploadedFile,
+  BatchAnalysisResult,
   KnowledgeBase,
   Conversation,
   ConversationDetail,
@@ -12,6 +13,9 @@ import type {
   ConversationStatusUpdate,
   PRDDraft,
   SearchResponse,
+  SemanticSearchResponse,
+  FederatedSearchResponse,
+  SuggestResponse,
   AIProvider,
   ProvidersListResponse,
   CurrentProviderResponse,
@@ -142,6 +146,19 @@ export const fileApi = {
     return response.data;
   },
 
+  // 并行分析项目中所有待分析文件
+  analyzeProject: async (
+    projectId: string,
+    includeFailed = false
+  ): Promise<BatchAnalysisResult> => {
+    const response = await api.post<BatchAnalysisResult>(
+      `/api/files/project/${projectId}/analyze`,
+      null,
+      { params: { include_failed: includeFailed } }
+    );
+    return response.data;
+  },
+
   // 获取项目文件列表
   listByProject: async (projectId: string): Promise<UploadedFile[]> => {
     const response = await api.get<UploadedFile[]>(`/api/files/project/${projectId}`);
@@ -341,11 +358,15 @@ export const searchApi = {
     filters?: {
       module?: string;
       type?: 'requirement' | 'module' | 'tech' | 'ui';
+      limit?: number;
+      offset?: number;
     }
   ): Promise<SearchResponse> => {
     const params: any = { q: query };
     if (filters?.module) params.module = filters.module;
     if (filters?.type) params.type = filters.type;
+    if (filters?.limit) params.limit = filters.limit;
+    if (filters?.offset) params.offset = filters.offset;
 
     const response = await api.get<SearchResponse>(
       `/api/search/knowledge/${projectId}`,
@@ -353,6 +374,45 @@ export const searchApi = {
     );
     return response.data;
   },
+
+  // 搜索框联想词
+  suggest: async (projectId: string, prefix: string, limit = 8): Promise<SuggestResponse> => {
+    const response = await api.get<SuggestResponse>(
+      `/api/search/suggest/${projectId}`,
+      { params: { q: prefix, limit } }
+    );
+    return response.data;
+  },
+
+  // 跨所有项目搜索知识库
+  searchAllProjects: async (
+    query: string,
+    options?: { type?: 'requirement' | 'module' | 'tech' | 'ui'; topK?: number }
+  ): Promise<FederatedSearchResponse> => {
+    const params: any = { q: query };
+    if (options?.type) params.type = options.type;
+    if (options?.topK) params.top_k = options.topK;
+
+    const response = await api.get<FederatedSearchResponse>('/api/search/federated', { params });
+    return response.data;
+  },
+
+  // 已上传文档的语义搜索
+  searchDocuments: async (
+    projectId: string,
+    query: string,
+    options?: { topK?: number; fileId?: string }
+  ): Promise<SemanticSearchResponse> => {
+    const params: any = { q: query };
+    if (options?.topK) params.top_k = options.topK;
+    if (options?.fileId) params.file_id = options.fileId;
+
+    const response = await api.get<SemanticSearchResponse>(
+      `/api/search/semantic/${projectId}`,
+      { params }
+    );
+    return response.data;
+  },
 };
 
 // ============ AI Models API ============
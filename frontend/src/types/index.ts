@@ -21,11 +21,28 @@ export interface UploadedFile {
   file_path: string;
   file_type: string;
   file_size: number;
-  status: 'pending' | 'analyzing' | 'completed' | 'failed';
+  status: 'pending' | 'queued' | 'analyzing' | 'completed' | 'failed';
   analysis_result?: any;
   created_at: string;
 }
 
+export interface BatchAnalysisItem {
+  file_id: string;
+  filename: string | null;
+  status: 'completed' | 'failed';
+  error?: string | null;
+  duration_ms?: number | null;
+}
+
+export interface BatchAnalysisResult {
+  project_id: string;
+  total: number;
+  completed: number;
+  failed: number;
+  duration_ms: number;
+  results: BatchAnalysisItem[];
+}
+
 export interface SystemOverview {
   product_type?: string;
   core_modules?: string[];
@@ -202,6 +219,54 @@ export interface SearchResponse {
   results: SearchResult[];
   total: number;
   query: string;
+  offset: number;
+  limit: number;
+  facets: {
+    type?: Record<string, number>;
+    module?: Record<string, number>;
+  };
+}
+
+export interface FederatedSearchResult extends SearchResult {
+  project_id: string;
+  project_name: string;
+}
+
+export interface FederatedSearchResponse {
+  results: FederatedSearchResult[];
+  total: number;
+  projects_searched: number;
+  query: string;
+  took_ms: number;
+}
+
+export interface Suggestion {
+  text: string;
+  kind: 'module' | 'feature' | 'requirement' | 'ui_component';
+  module_name?: string;
+  conversation_id?: string;
+}
+
+export interface SuggestResponse {
+  suggestions: Suggestion[];
+  query: string;
+}
+
+export interface SemanticSearchResult {
+  file_id?: string;
+  source_file: string;
+  chunk_index: number;
+  page_number?: number;
+  text: string;
+  score: number;
+}
+
+export interface SemanticSearchResponse {
+  results: SemanticSearchResult[];
+  total: number;
+  query: string;
+  embedding_model: string;
+  took_ms: number;
 }
 
 // AI 模型管理类型
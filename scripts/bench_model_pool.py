@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of Gemini model and service construction.
+
+Compares building a GenerativeModel per call (what generate_text used to
+do) with the pooled instances from GeminiService._get_model, and
+constructing GeminiService per request with the shared instance from the
+AI service factory. Reports time and allocated bytes per call. No API
+requests are made, but settings are loaded from .env as usual.
+
+Usage (from the repository root):
+    python scripts/bench_model_pool.py [iterations]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google.generativeai as genai
+from backend.app.services.ai_service_factory import get_gemini_service
+from backend.app.services.conversation_service import CHAT_SYSTEM_PROMPT
+from backend.app.services.gemini_service import GeminiService
+
+GENERATION_CONFIG = {"temperature": 0.3, "max_output_tokens": 4096}
+
+
+def measure(label: str, func, iterations: int) -> None:
+    func()  # Warm up
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed_us = (time.perf_counter() - started) / iterations * 1e6
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(iterations):
+        func()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{label:<40} {elapsed_us:>10.1f} us/call  "
+        f"{(peak - before) / iterations:>10.0f} B peak/call  {(after - before) / iterations:>8.0f} B retained/call"
+    )
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    service = get_gemini_service()
+    model_name = service.model_name
+
+    print(f"{iterations} iterations, model {model_name}\n")
+    measure(
+        "GenerativeModel per call",
+        lambda: genai.GenerativeModel(
+            model_name,
+            system_instruction=CHAT_SYSTEM_PROMPT,
+            generation_config=GENERATION_CONFIG,
+        ),
+        iterations,
+    )
+    measure(
+        "Pooled model (GeminiService._get_model)",
+        lambda: service._get_model(CHAT_SYSTEM_PROMPT, GENERATION_CONFIG),
+        iterations,
+    )
+    measure("GeminiService() per request", GeminiService, iterations // 10 or 1)
+    measure("Shared service (get_gemini_service)", get_gemini_service, iterations)
+
+
+if __name__ == "__main__":
+    main()
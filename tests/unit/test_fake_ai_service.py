@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Offline test of FakeAIService's prompt cache accounting.
+
+Drives the fake provider with an injected clock: the first call with a
+cacheable prefix writes it, a call within the TTL reads it, and a call
+after the TTL writes it again. No server or API key is needed.
+
+Usage:
+    python -m pytest tests/unit/test_fake_ai_service.py
+    python tests/unit/test_fake_ai_service.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app.core.metrics import estimate_tokens
+from backend.app.services.ai_service_base import AIMessage
+from backend.app.services.fake_ai_service import FakeAIService
+
+# Long enough to pass min_cache_tokens
+SYSTEM_PROMPT = "知识库内容" * 400
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def expected_cost(prompt: int, completion: int, cached: int, written: int) -> float:
+    """Sonnet prices: input $0.003/1K, output $0.015/1K, cache reads 0.1x, writes 1.25x."""
+    billed_prompt = prompt - cached - written + cached * 0.1 + written * 1.25
+    return billed_prompt / 1000 * 0.003 + completion / 1000 * 0.015
+
+
+def test_prompt_cache_write_hit_and_expiry():
+    clock = FakeClock()
+    service = FakeAIService(min_cache_tokens=1024, cache_ttl=300.0, clock=clock)
+    system = AIMessage(role="system", content=SYSTEM_PROMPT, cache=True)
+    prefix_tokens = estimate_tokens(f"system:{SYSTEM_PROMPT}")
+    assert prefix_tokens >= 1024
+
+    async def run():
+        await service.chat([system, AIMessage(role="user", content="第一轮")])
+        clock.now = 299.0
+        await service.chat([system, AIMessage(role="user", content="第二轮")])
+        # Expires 300s after its last use (the second call)
+        clock.now = 299.0 + 301.0
+        await service.chat([system, AIMessage(role="user", content="第三轮")])
+
+    asyncio.run(run())
+    first, second, third = service.get_usage_stats()
+
+    print(f"write: {first.cache_write_tokens}, hit: {second.cached_prompt_tokens}, rewrite: {third.cache_write_tokens}")
+    assert (first.cached_prompt_tokens, first.cache_write_tokens) == (0, prefix_tokens)
+    assert (second.cached_prompt_tokens, second.cache_write_tokens) == (prefix_tokens, 0)
+    assert (third.cached_prompt_tokens, third.cache_write_tokens) == (0, prefix_tokens)
+
+    for stats in (first, second, third):
+        assert stats.prompt_tokens > prefix_tokens
+        cost = expected_cost(
+            stats.prompt_tokens,
+            stats.completion_tokens,
+            stats.cached_prompt_tokens,
+            stats.cache_write_tokens,
+        )
+        assert abs(stats.estimated_cost - cost) < 1e-12
+    # Reading the prefix costs a tenth of sending it; writing it a quarter more
+    assert second.estimated_cost < first.estimated_cost
+    assert service.get_total_cached_tokens() == prefix_tokens
+
+
+def test_short_prefix_is_not_cached():
+    service = FakeAIService(min_cache_tokens=1024, clock=FakeClock())
+    system = AIMessage(role="system", content="短提示", cache=True)
+
+    async def run():
+        for _ in range(2):
+            await service.chat([system, AIMessage(role="user", content="你好")])
+
+    asyncio.run(run())
+    for stats in service.get_usage_stats():
+        assert (stats.cached_prompt_tokens, stats.cache_write_tokens) == (0, 0)
+
+
+if __name__ == "__main__":
+    test_prompt_cache_write_hit_and_expiry()
+    test_short_prefix_is_not_cached()
+    print("✅ All tests completed!")
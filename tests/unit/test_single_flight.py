@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Offline test of single-flight coalescing of LLM calls and streams.
+
+Uses a fake coroutine and async generator in place of provider calls:
+concurrent callers share one call, a caller that gives up does not cancel
+it for the others, and a late stream subscriber still receives the chunks
+produced before it joined.
+
+Usage:
+    python -m pytest tests/unit/test_single_flight.py
+    python tests/unit/test_single_flight.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app.services.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", call) for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert results == ["result"] * 10
+    assert len(calls) == 1
+    assert not flight._calls
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        first = asyncio.create_task(flight.do("key", call))
+        second = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await second
+        assert first.cancelled()
+        return result
+
+    assert asyncio.run(run()) == "result"
+    assert len(calls) == 1
+
+
+def test_last_caller_leaving_cancels_the_call():
+    flight = SingleFlight()
+    finished = []
+
+    async def call():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+
+    async def run():
+        caller = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert not finished
+    assert not flight._calls
+
+
+def test_late_stream_subscriber_receives_missed_chunks():
+    flight = SingleFlight()
+    starts = []
+
+    async def start():
+        starts.append(1)
+        for chunk in ("a", "b", "c", "d"):
+            yield chunk
+            await asyncio.sleep(0.02)
+
+    async def collect(delay: float):
+        await asyncio.sleep(delay)
+        return [chunk async for chunk in flight.stream("key", start)]
+
+    async def run():
+        # The second subscriber joins after "a" and "b" have been produced
+        return await asyncio.gather(collect(0), collect(0.03))
+
+    early, late = asyncio.run(run())
+    assert early == late == ["a", "b", "c", "d"]
+    assert len(starts) == 1
+    assert not flight._streams
+
+
+def test_stream_errors_reach_every_subscriber():
+    flight = SingleFlight()
+
+    async def start():
+        yield "a"
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider failed")
+
+    async def collect():
+        chunks = []
+        try:
+            async for chunk in flight.stream("key", start):
+                chunks.append(chunk)
+        except RuntimeError as e:
+            return chunks, str(e)
+        return chunks, None
+
+    async def run():
+        return await asyncio.gather(collect(), collect())
+
+    for chunks, error in asyncio.run(run()):
+        assert chunks == ["a"]
+        assert error == "provider failed"
+
+
+if __name__ == "__main__":
+    test_concurrent_callers_share_one_call()
+    test_cancelled_caller_does_not_cancel_the_others()
+    test_last_caller_leaving_cancels_the_call()
+    test_late_stream_subscriber_receives_missed_chunks()
+    test_stream_errors_reach_every_subscriber()
+    print("✅ All tests completed!")